@@ -1,67 +1,52 @@
 # agent.py
 
-from typing import Any, TypedDict
+import time
+from typing import Any, Iterable, Iterator, Optional, TypedDict
+import numpy as np
 import pandas as pd
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
-from utils import call_chatglm
-from stock_utils import fetch_us_stock, fetch_tw_stock, compute_technical_indicators, get_fundamental_data, generate_analysis_summary
+from utils import stream_chatglm
+from llm_cache import llm_cache, make_key
+from llm_queue import llm_queue, LLMQueueFullError, LLMQueueTimeout
+from metrics import instrument_node, metrics
+from bars import Bars
+from config import DEFAULT_PERIOD, DEFAULT_INTERVAL, LLM_QUEUE_DEADLINE
+from price_store import describe_period
+from ticker_resolver import resolver
+from query_stats import query_stats
+from stock_utils import fetch_us_stock, fetch_tw_stock, compute_technical_indicators, compute_indicators_inplace, get_fundamental_data, generate_analysis_summary
 
 def query_understanding_node(state):
     """
-    修改後的查詢理解節點：自動判斷市場類型，只需要股票代號
+    查詢理解節點：以離線股票主檔解析代號或公司名稱（台股 / 美股）
     """
-    user_query: str = state["query"].strip()
-    
-    # 自動判斷市場類型
-    market = None
-    ticker = None
-    
-    # 判斷是否為台股代碼（4位數字）
-    if user_query.isdigit() and len(user_query) == 4:
-        market = "tw"
-        ticker = user_query
-    # 判斷是否為美股代碼（字母組合）
-    elif user_query.replace('.', '').isalpha() and len(user_query) <= 5:
-        market = "us"
-        ticker = user_query.upper()
-    else:
-        # 如果不符合標準格式，嘗試解析
-        import re
-        
-        # 嘗試提取台股代碼
-        tw_match = re.search(r'\b(\d{4})\b', user_query)
-        if tw_match:
-            market = "tw"
-            ticker = tw_match.group(1)
-        else:
-            # 嘗試提取美股代碼
-            us_match = re.search(r'\b([A-Z]{1,5})\b', user_query.upper())
-            if us_match:
-                market = "us"
-                ticker = us_match.group(1)
-            else:
-                # 無法識別，預設為基本分析
-                market = "unknown"
-                ticker = user_query.upper()
+    resolution = resolver.resolve(state["query"])
+    market = resolution.market
+    ticker = resolution.ticker
     
     # 分析意圖固定為基本分析（因為只有股票代號）
     intent = "basic"
     
-    print(f"解析結果: market={market}, ticker={ticker}, intent={intent}")
+    print(f"解析結果: market={market}, ticker={ticker}, name={resolution.name}, intent={intent}")
     
-    return {**state, "market": market, "ticker": ticker, "intent": intent}
+    return {"market": market, "ticker": ticker, "name": resolution.name, "intent": intent}
 
 def stock_api_tool(state):
+    """
+    股價資料節點：與 fundamental_function 平行執行，只回傳本節點負責的欄位
+    """
     market = state["market"]
     ticker = state["ticker"]
+    period = state.get("period") or DEFAULT_PERIOD
+    interval = state.get("interval") or DEFAULT_INTERVAL
     
     # 檢查是否能識別市場類型
     if market == "unknown":
-        error_msg = f"無法識別股票代號 '{ticker}'，請確認輸入正確的台股代號（4位數字）或美股代號（字母）"
+        error_msg = f"無法識別股票代號 '{ticker}'，請確認輸入正確的台股代號（4位數字）、美股代號（字母）或公司名稱"
         return {
-            **state, 
             "error": error_msg, 
-            "df": pd.DataFrame(), 
+            "bars": None, 
             "current_price": 0, 
             "previous_close": 0,
             "period_high": 0,
@@ -74,9 +59,8 @@ def stock_api_tool(state):
     if not ticker:
         error_msg = f"請提供有效的{'台股' if market == 'tw' else '美股'}代碼"
         return {
-            **state, 
             "error": error_msg, 
-            "df": pd.DataFrame(), 
+            "bars": None, 
             "current_price": 0, 
             "previous_close": 0,
             "period_high": 0,
@@ -87,39 +71,42 @@ def stock_api_tool(state):
     
     try:
         if market == "us":
-            df = fetch_us_stock(ticker)
+            df = fetch_us_stock(ticker, period=period, interval=interval)
         else:
-            df = fetch_tw_stock(ticker)
+            df = fetch_tw_stock(ticker, period=period, interval=interval)
         
         if len(df) < 1:
             raise ValueError("資料不足，無法進行分析")
+        
+        # 轉成陣列容器，之後各節點共用同一份資料，指標也寫在同一塊緩衝區
+        bars = Bars.from_frame(df)
+        del df
+        closes = bars["Close"]
             
-        current_price = df["Close"].iloc[-1]
-        prev_close = df["Close"].iloc[-2] if len(df) > 1 else current_price
+        current_price = closes[-1]
+        prev_close = closes[-2] if len(bars) > 1 else current_price
         
-        # 計算兩個月期間的統計資料
-        max_price = df["Close"].max()
-        min_price = df["Close"].min()
-        avg_volume = df["Volume"].mean()
+        # 計算查詢期間的統計資料
+        max_price = np.nanmax(closes)
+        min_price = np.nanmin(closes)
+        avg_volume = np.nanmean(bars["Volume"])
         
         return {
-            **state, 
-            "df": df, 
+            "bars": bars, 
             "current_price": current_price, 
             "previous_close": prev_close,
             "period_high": max_price,
             "period_low": min_price,
             "avg_volume": avg_volume,
-            "data_points": len(df)
+            "data_points": len(bars)
         }
         
     except Exception as e:
         error_msg = f"取得股票資料失敗：{str(e)}"
         print(f"API 錯誤: {error_msg}")
         return {
-            **state, 
             "error": error_msg, 
-            "df": pd.DataFrame(), 
+            "bars": None, 
             "current_price": 0, 
             "previous_close": 0,
             "period_high": 0,
@@ -128,47 +115,55 @@ def stock_api_tool(state):
             "data_points": 0
         }
 
+def fundamental_fetcher(state):
+    """
+    基本面資料節點：與股價資料抓取平行執行
+    只回傳本節點負責的欄位，避免與平行節點的更新衝突
+    """
+    market = state["market"]
+    ticker = state["ticker"]
+    if market == "unknown" or not ticker:
+        return {"fundamental_data": {}}
+    return {"fundamental_data": get_fundamental_data(ticker, market)}
+
+
 def financial_analyzer(state):
     """
     金融分析節點：計算技術指標並進行基本面分析
     """
     # 檢查是否有錯誤
     if "error" in state:
-        return state
+        return {}
     
-    df = state["df"]
-    market = state["market"]
-    ticker = state["ticker"]
+    bars = state["bars"]
     intent = state["intent"]
     
     try:
-        # 計算技術指標
-        df_with_indicators = compute_technical_indicators(df)
+        # 計算技術指標（直接寫入 bars 預留的欄位，不複製資料），另加呼叫端選擇的進階指標
+        compute_indicators_inplace(bars, state.get("indicators") or ())
         
-        # 獲取基本面資料
-        fundamental_data = get_fundamental_data(ticker, market)
+        # 基本面資料由 fundamental_function 節點平行取得
+        fundamental_data = state.get("fundamental_data", {})
         
         # 生成分析摘要
-        analysis_summary = generate_analysis_summary(df_with_indicators, intent, fundamental_data)
+        analysis_summary = generate_analysis_summary(bars, intent, fundamental_data)
         
         return {
-            **state,
-            "df_ind": df_with_indicators,
-            "fundamental_data": fundamental_data,
+            "bars": bars,
             "analysis_summary": analysis_summary
         }
         
     except Exception as e:
         error_msg = f"分析過程發生錯誤：{str(e)}"
         print(f"分析錯誤: {error_msg}")
-        return {**state, "error": error_msg}
+        return {"error": error_msg}
 
 
 
 def response_generator(state):
     # 檢查是否有錯誤
     if "error" in state:
-        return {**state, "response_text": f"很抱歉，{state['error']}"}
+        return {"response_text": f"很抱歉，{state['error']}"}
     
     market_name = "美股" if state['market'] == 'us' else "台股"
     current_price = state['current_price']
@@ -176,6 +171,10 @@ def response_generator(state):
     price_change = current_price - previous_close
     price_change_pct = (price_change / previous_close * 100) if previous_close != 0 else 0
     data_points = state.get('data_points', 0)
+    period = state.get('period') or DEFAULT_PERIOD
+    interval = state.get('interval') or DEFAULT_INTERVAL
+    data_points_line = (f"📅 資料天數：{data_points} 個交易日\n" if interval == "1d"
+                        else f"📅 資料筆數：{data_points} 根K棒\n")
     
     # 安全格式化函數
     def safe_format_price(value, decimal_places=2):
@@ -195,12 +194,12 @@ def response_generator(state):
     
     # 建構基本回應，不依賴 LLM
     basic_info = (
-        f"📊 {market_name} {state['ticker']} 股票資訊（近兩個月資料）\n"
+        f"📊 {market_name} {state['ticker']} 股票資訊（{describe_period(period, interval)}）\n"
         f"\n"
         f"💰 目前價格：{safe_format_price(current_price)}\n"
         f"📈 前日收盤：{safe_format_price(previous_close)}\n"
         f"📊 漲跌幅：{price_change_str} ({price_change_pct_str}%)\n"
-        f"📅 資料天數：{data_points} 個交易日\n"
+        f"{data_points_line}"
         f"\n"
         f"🔍 綜合分析：{state['analysis_summary']}\n"
     )
@@ -242,9 +241,9 @@ def response_generator(state):
 
     # 根據RSI給出額外建議
     try:
-        df_ind = state.get('df_ind')
-        if df_ind is not None and not df_ind.empty:
-            latest_rsi = df_ind.iloc[-1]['RSI_14']
+        bars = state.get('bars')
+        if bars is not None and not bars.empty:
+            latest_rsi = bars["RSI_14"][-1]
             if pd.notna(latest_rsi):
                 if latest_rsi > 70:
                     suggestion += "，RSI顯示超買狀態，短期可能回調"
@@ -256,99 +255,266 @@ def response_generator(state):
     # 嘗試使用 LLM 生成更詳細的回應
     final_response = basic_info + "\n" + suggestion
 
+    # 串流模式下先送出不依賴 LLM 的報告，再逐字送出 AI 分析
+    writer = get_stream_writer()
+    report_text = final_response
+    if state.get('llm') is False:
+        # 呼叫端不需要 AI 分析（例如 API 的 llm=0）
+        writer({"report": final_response})
+        return {"response_text": final_response, "report_text": report_text}
+    llm_header = "\n\n🤖 AI分析：\n "
+    writer({"report": final_response + llm_header})
+    streamed = []  # 已送出的 AI 分析片段
+
+    def on_token(token):
+        streamed.append(token)
+        writer({"token": token})
+
     try:
-        llm_prompt = (
-            f"你是一位專業的股票分析師，請根據以下資訊給出投資建議。 使用繁體中文回答\n"
-            f"請分析 {state['ticker']} 的股票資訊：\n"
-            f"目前價格：{current_price}\n"
-            f"漲跌幅：{price_change_pct}%\n"
-            f"技術指標：{state['analysis_summary']}\n"
-            f"基本面資訊：{fundamental_data}\n"
-            f"請給出專業的投資建議，字數控制在150字內。"
+        # 互動查詢優先，批次 / 預熱不限等候時間
+        priority = state.get('priority') or "interactive"
+        deadline = LLM_QUEUE_DEADLINE if priority == "interactive" else None
+        if state.get('expires') is not None:
+            remaining = max(0.0, state['expires'] - time.monotonic())
+            deadline = remaining if deadline is None else min(deadline, remaining)
+        llm_response = generate_llm_analysis(
+            state['ticker'], current_price, price_change_pct, state['analysis_summary'], fundamental_data,
+            priority, deadline, on_token=on_token
         )
-        llm_response = call_chatglm(llm_prompt)
-        final_response += f"\n\n🤖 AI分析：\n {llm_response}"
+        final_response += f"{llm_header}{llm_response}"
+    except (LLMQueueFullError, LLMQueueTimeout) as e:
+        # 佇列壅塞時直接回傳不含 AI 分析的報告，不讓使用者無限等待
+        print(f"LLM 佇列忙碌: {e}")
+        metrics.inc("llm_degraded_total", reason=type(e).__name__)
+        notice = "目前查詢量較大，AI 分析暫時無法提供，請稍後再試。"
+        writer({"token": notice})
+        final_response += f"{llm_header}{notice}"
+        llm_response = None
     except Exception as e:
+        # 標題與已送出的部分內容保留在最終報告中（與串流畫面一致），再附上錯誤說明
         print(f"LLM 回應生成失敗: {e}")
-    return {**state, "response_text": final_response}
+        metrics.inc("llm_degraded_total", reason=type(e).__name__)
+        partial = "".join(streamed)
+        notice = ("\n\n（AI 分析中斷，以上內容可能不完整）" if partial
+                  else "AI 分析暫時無法提供，請稍後再試。")
+        writer({"token": notice})
+        final_response += f"{llm_header}{partial}{notice}"
+        llm_response = None
+    return {"response_text": final_response, "report_text": report_text, "llm_text": llm_response}
+
+
+def generate_llm_analysis(ticker, current_price, price_change_pct, analysis_summary, fundamental_data,
+                          priority: str = "interactive", deadline=None, on_token=None) -> str:
+    """
+    產生 AI 分析：相同的分析輸入直接使用 LLM 快取，否則經由 LLM 工作佇列（依 priority 排隊）產生並寫入快取
+    on_token 依序收到串流的片段（命中快取時為整段回應）；佇列壅塞時拋出 LLMQueueFullError / LLMQueueTimeout
+    """
+    cache_key = make_key(ticker, current_price, price_change_pct, analysis_summary, fundamental_data)
+    response = llm_cache.get(cache_key)
+    if response is not None:
+        if on_token is not None:
+            on_token(response)
+        return response
+    prompt = build_llm_prompt(ticker, current_price, price_change_pct, analysis_summary, fundamental_data)
+    tokens = []
+    for token in llm_queue.stream(prompt, priority, deadline, generate=stream_chatglm):
+        tokens.append(token)
+        if on_token is not None:
+            on_token(token)
+    response = "".join(tokens).strip()
+    if response:
+        llm_cache.set(cache_key, response)
+    return response
+
+
+def build_llm_prompt(ticker, current_price, price_change_pct, analysis_summary, fundamental_data) -> str:
+    """
+    組合給 LLM 的提示詞
+    """
+    return (
+        f"你是一位專業的股票分析師，請根據以下資訊給出投資建議。 使用繁體中文回答\n"
+        f"請分析 {ticker} 的股票資訊：\n"
+        f"目前價格：{current_price}\n"
+        f"漲跌幅：{price_change_pct}%\n"
+        f"技術指標：{analysis_summary}\n"
+        f"基本面資訊：{fundamental_data}\n"
+        f"請給出專業的投資建議，字數控制在150字內。"
+    )
 
 
 class StockState(TypedDict):
     query: str
     market: str
     ticker: str
+    name: str
     intent: str
-    df: Any
+    period: str
+    interval: str
+    priority: str  # LLM 佇列優先順序："interactive"（預設）或 "batch"
+    indicators: list  # 另外計算的進階指標（見 indicator_kernels）
+    llm: bool  # 是否產生 AI 分析（預設 True）
+    expires: float  # 呼叫端的期限（time.monotonic()），AI 分析最多等候到此時
+    bars: Any
     current_price: float
     previous_close: float
     period_high: float
     period_low: float
     avg_volume: float
     data_points: int
-    df_ind: Any
     analysis_summary: str
     fundamental_data: dict
     response_text: str
+    report_text: str  # 不含 AI 分析的報告
+    llm_text: str  # AI 分析（未產生時為 None）
     error: str
 
 
 def build_stock_agent():
     workflow = StateGraph(StockState)
 
-    workflow.add_node("query_function", query_understanding_node)
-    workflow.add_node("fetch_function", stock_api_tool)
-    workflow.add_node("analyze_function", financial_analyzer)
-    workflow.add_node("respond", response_generator)
+    # 每個節點都包上指標記錄（停用時不包裝）
+    workflow.add_node("query_function", instrument_node("query_function", query_understanding_node))
+    workflow.add_node("fetch_function", instrument_node("fetch_function", stock_api_tool))
+    workflow.add_node("fundamental_function", instrument_node("fundamental_function", fundamental_fetcher))
+    workflow.add_node("analyze_function", instrument_node("analyze_function", financial_analyzer))
+    workflow.add_node("respond", instrument_node("respond", response_generator))
 
     workflow.set_entry_point("query_function")
+    # 股價與基本面平行抓取，兩者完成後才進行分析
     workflow.add_edge("query_function", "fetch_function")
-    workflow.add_edge("fetch_function", "analyze_function")
+    workflow.add_edge("query_function", "fundamental_function")
+    workflow.add_edge(["fetch_function", "fundamental_function"], "analyze_function")
     workflow.add_edge("analyze_function", "respond")
     workflow.add_edge("respond", END)
 
     return workflow.compile()
 
 
+def build_report_graph():
+    """
+    只有回應節點的圖：已有分析結果時（例如即時模式的技術訊號改變）重新產生報告，不重新抓資料
+    """
+    workflow = StateGraph(StockState)
+    workflow.add_node("respond", instrument_node("respond", response_generator))
+    workflow.set_entry_point("respond")
+    workflow.add_edge("respond", END)
+    return workflow.compile()
+
+
+def _record_query(state: dict):
+    # 成功的查詢才計入熱門股票統計（收盤後預熱使用）
+    if "error" not in state:
+        query_stats.record(state.get("ticker"), state.get("market"))
+
+
 class StockAgent:
     def __init__(self):
         self.graph = build_stock_agent()
-    def call(self, ticker: str) -> str:
+        self.report_graph = build_report_graph()
+    def analyze(self, ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL,
+                indicators: Iterable[str] = (), llm: bool = True, deadline: Optional[float] = None) -> dict:
+        """
+        執行股票分析查詢，回傳完整的最終狀態
+        Args:
+            ticker: 股票代號（台股4位數字或美股字母代碼）
+            period: 資料期間（yfinance 格式，例如 2mo、1y、10y、60d）
+            interval: K 線週期（例如 1d、1h、5m、1m）
+            indicators: 另外計算的進階指標，例如 ["MACD", "KDJ"]（見 indicator_kernels）
+            llm: False 時不產生 AI 分析，只回傳技術面與基本面報告
+            deadline: 呼叫端剩餘的秒數；AI 分析在此時間內未開始產生時改回傳不含 AI 分析的報告
+        Returns:
+            dict: 圖的最終狀態，包含 response_text、bars（含技術指標）、market 及價格統計
+        """
+        inputs = {"query": ticker, "period": period, "interval": interval, "indicators": list(indicators),
+                  "llm": llm}
+        if deadline is not None:
+            inputs["expires"] = time.monotonic() + deadline
+        try:
+            result = self.graph.invoke(inputs)
+            _record_query(result)
+            return result
+        except Exception as e:
+            error_msg = f"Agent 執行失敗：{str(e)}"
+            return {"query": ticker, "error": error_msg, "response_text": error_msg}
+
+    def call(self, ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL) -> str:
         """
         執行股票分析查詢
         Args:
             ticker: 股票代號（台股4位數字或美股字母代碼）
+            period: 資料期間（yfinance 格式）
+            interval: K 線週期
         Returns:
             分析結果字串
         """
-        inputs = {"query": ticker}
+        return self.analyze(ticker, period, interval)["response_text"]
+
+    def stream(self, ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL,
+               indicators: Iterable[str] = ()) -> Iterator[dict]:
+        """
+        以串流模式執行股票分析查詢，逐步回傳事件
+        Args:
+            ticker: 股票代號
+            period: 資料期間（yfinance 格式）
+            interval: K 線週期
+            indicators: 另外計算的進階指標
+        Yields:
+            dict: 事件，依 "event" 欄位區分
+                - {"event": "node", "node": 節點名稱, "state": 目前累積的狀態}
+                - {"event": "report", "text": 不含 AI 分析的報告}
+                - {"event": "token", "text": AI 分析的一段文字}
+        """
+        state = {"query": ticker, "period": period, "interval": interval, "indicators": list(indicators)}
+        yield from self._stream(self.graph, state, record=True)
+
+    def stream_report(self, state: dict) -> Iterator[dict]:
+        """
+        以既有的分析狀態（需含價格統計、analysis_summary 與 bars）重新產生報告，事件格式同 stream
+        """
+        yield from self._stream(self.report_graph, dict(state))
+
+    def _stream(self, graph, state: dict, record: bool = False) -> Iterator[dict]:
         try:
-            outputs = self.graph.invoke(inputs)
-            return outputs["response_text"]
+            for mode, chunk in graph.stream(state, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    if "report" in chunk:
+                        yield {"event": "report", "text": chunk["report"]}
+                    elif "token" in chunk:
+                        yield {"event": "token", "text": chunk["token"]}
+                    continue
+                for node, update in chunk.items():
+                    state = {**state, **(update or {})}
+                    yield {"event": "node", "node": node, "state": state}
+            if record:
+                _record_query(state)
         except Exception as e:
-            return f"Agent 執行失敗：{str(e)}"
+            error_msg = f"Agent 執行失敗：{str(e)}"
+            state = {**state, "error": error_msg, "response_text": error_msg}
+            yield {"event": "node", "node": "respond", "state": state}
     
-    def get_stock_data(self, ticker: str):
+    def get_stock_data(self, ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL,
+                       indicators: Iterable[str] = ()):
         """
         獲取股票資料用於前端圖表顯示
         Args:
             ticker: 股票代號
+            period: 資料期間（yfinance 格式）
+            interval: K 線週期
+            indicators: 另外計算的進階指標
         Returns:
             tuple: (df, market) - 股票資料DataFrame和市場類型
         """
-        ticker = ticker.strip()
-        
-        # 判斷市場類型
-        if ticker.isdigit() and len(ticker) == 4:
-            market = "tw"
-            df = fetch_tw_stock(ticker)
-        elif ticker.replace('.', '').isalpha() and len(ticker) <= 5:
-            market = "us"
-            df = fetch_us_stock(ticker.upper())
+        resolution = resolver.resolve(ticker)
+        market = resolution.market
+        if market == "tw":
+            df = fetch_tw_stock(resolution.ticker, period=period, interval=interval)
+        elif market == "us":
+            df = fetch_us_stock(resolution.ticker, period=period, interval=interval)
         else:
             raise ValueError(f"無法識別股票代號 '{ticker}'")
         
         # 計算技術指標
-        df_with_indicators = compute_technical_indicators(df)
+        df_with_indicators = compute_technical_indicators(df, indicators)
         
         return df_with_indicators, market
 # -------------------------------
@@ -0,0 +1,365 @@
+# api_server.py
+"""
+StockAgent 的非同步 HTTP API（JSON），與 Streamlit 介面並行，供其他服務直接呼叫
+- GET  /v1/analyze?ticker=2330&period=2mo&interval=1d&indicators=MACD,KDJ&llm=1&deadline=10
+- POST /v1/analyze  {"ticker": "2330", "period": "1y", "indicators": ["MACD"], "llm": false}
+- POST /v1/batch    {"tickers": ["2330", "AAPL"], "period": "2mo", "llm": false}
+- GET  /healthz
+
+事件迴圈只負責連線與快取：抓取與分析在有上限的執行緒池執行，需要 AI 分析的請求另用一個池
+（實際的模型呼叫數由 llm_queue 限制）；排隊與執行中的工作過多時回傳 503，超過期限回傳 504
+剩餘的期限也會交給 agent：AI 分析在期限內排不到模型時，回傳不含 AI 分析的報告
+逾時回傳 504 時已開始的工作不會中斷，完成後仍寫入快取，重試可直接命中
+相同參數的結果快取 API_CACHE_TTL 秒，同時進行的相同請求只執行一次
+
+執行：python api_server.py --port 8000
+沒有驗證，預設只監聽 127.0.0.1；對外提供時以 --host 0.0.0.0 開放，並置於反向代理或防火牆之後
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from config import (API_BATCH_LIMIT, API_CACHE_TTL, API_DEADLINE, API_HOST, API_LLM_WORKERS, API_MAX_PENDING,
+                    API_WORKERS, DEFAULT_INTERVAL, DEFAULT_PERIOD)
+from indicator_kernels import output_columns
+from llm_queue import llm_queue
+from metrics import metrics
+from price_store import period_to_offset
+from stock_utils import technical_signals
+
+MAX_BODY_BYTES = 1 << 20
+MAX_HEADERS = 100
+KEEPALIVE_TIMEOUT = 15.0
+CACHE_ENTRIES = 4096
+_INTERVAL = re.compile(r"\d+(m|h|d|wk|mo)")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 502: "Bad Gateway",
+            503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class APIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _error(status: int, message: str, **extra) -> Tuple[int, bytes]:
+    return status, _json({"error": message, **extra})
+
+
+def _number(value):
+    """numpy 數值轉為 Python 型別，NaN / inf 轉為 None"""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _flag(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def parse_request(params: dict) -> dict:
+    """
+    驗證並整理查詢參數（GET 查詢字串或 POST JSON 共用），錯誤時拋出 APIError(400)
+    """
+    indicators = params.get("indicators") or []
+    if isinstance(indicators, str):
+        indicators = [name.strip() for name in indicators.split(",") if name.strip()]
+    period = str(params.get("period") or DEFAULT_PERIOD)
+    interval = str(params.get("interval") or DEFAULT_INTERVAL)
+    try:
+        period_to_offset(period)
+        output_columns(indicators)
+        deadline = float(params.get("deadline") or API_DEADLINE)
+    except (TypeError, ValueError) as e:
+        raise APIError(400, str(e)) from None
+    if not math.isfinite(deadline):
+        raise APIError(400, f"deadline 必須是有限的秒數：{deadline}")
+    if not _INTERVAL.fullmatch(interval):
+        raise APIError(400, f"不支援的 interval 格式：{interval}")
+    return {
+        "period": period,
+        "interval": interval,
+        "indicators": tuple(indicators),
+        "llm": _flag(params.get("llm", False)),
+        "deadline": min(max(deadline, 0.001), API_DEADLINE),
+    }
+
+
+def analysis_payload(state: dict) -> dict:
+    """將 StockAgent 的最終狀態轉為 API 回應"""
+    bars = state["bars"]
+    latest = bars.row(-1)
+    current = _number(state.get("current_price"))
+    previous = _number(state.get("previous_close"))
+    change = current - previous if current is not None and previous is not None else None
+    return {
+        "query": state.get("query"),
+        "ticker": state.get("ticker"),
+        "name": state.get("name"),
+        "market": state.get("market"),
+        "period": state.get("period"),
+        "interval": state.get("interval"),
+        "as_of": bars.date_index()[-1].isoformat(),
+        "stats": {
+            "current_price": current,
+            "previous_close": previous,
+            "change": change,
+            "change_pct": change / previous * 100 if change is not None and previous else None,
+            "period_high": _number(state.get("period_high")),
+            "period_low": _number(state.get("period_low")),
+            "avg_volume": _number(state.get("avg_volume")),
+            "data_points": int(state.get("data_points") or 0),
+        },
+        "indicators": {name: _number(value) for name, value in latest.items()
+                       if name not in ("Open", "High", "Low", "Close", "Volume")},
+        "signals": technical_signals(latest),
+        "summary": state.get("analysis_summary"),
+        "fundamentals": {k: (v if isinstance(v, str) else _number(v))
+                         for k, v in (state.get("fundamental_data") or {}).items()},
+        "report": state.get("report_text"),
+        "llm_text": state.get("llm_text"),
+    }
+
+
+class _Pool:
+    """有上限的執行緒池；pending 為排隊與執行中的工作數，只在事件迴圈中增減"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"api-{name}")
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+
+
+class APIServer:
+    """
+    分析 API；agent 預設為 StockAgent()（第一次使用時建立）
+    """
+
+    def __init__(self, agent=None, workers: int = API_WORKERS, llm_workers: int = API_LLM_WORKERS,
+                 max_pending: int = API_MAX_PENDING, cache_ttl: float = API_CACHE_TTL):
+        self._agent = agent
+        self.pools = {
+            "analysis": _Pool("analysis", workers, max_pending),
+            "llm": _Pool("llm", llm_workers, max_pending),
+        }
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()  # key -> (到期時間, status, body)
+        self._inflight = {}
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from agent import StockAgent
+            self._agent = StockAgent()
+        return self._agent
+
+    # ---- 分析 ----
+    def _analyze_sync(self, ticker: str, request: dict, expires: float) -> Tuple[int, bytes]:
+        """
+        在執行緒池中執行；排隊超過期限的工作直接放棄，剩餘時間交給 agent 作為 AI 分析的等候期限
+        """
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            return _error(504, "等候逾時", ticker=ticker)
+        state = self.agent.analyze(ticker, request["period"], request["interval"],
+                                   request["indicators"], llm=request["llm"], deadline=remaining)
+        if "error" in state:
+            status = 404 if state.get("market") == "unknown" else 502
+            return _error(status, state["error"], ticker=ticker)
+        return 200, _json(analysis_payload(state))
+
+    async def _run(self, pool: _Pool, key: tuple, ticker: str, request: dict, expires: float) -> Tuple[int, bytes]:
+        try:
+            loop = asyncio.get_running_loop()
+            status, body = await loop.run_in_executor(pool.executor, self._analyze_sync, ticker, request, expires)
+        except Exception as e:
+            print(f"API 分析失敗（{ticker}）：{e}")
+            status, body = _error(500, f"分析失敗：{e}", ticker=ticker)
+        finally:
+            pool.pending -= 1
+            metrics.set_gauge("api_pending", pool.pending, pool=pool.name)
+        if status == 200 and self.cache_ttl > 0:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, status, body)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return status, body
+
+    async def analyze(self, ticker: str, request: dict) -> Tuple[int, bytes]:
+        """
+        單檔分析：先查快取，相同參數進行中的請求共用結果，否則排入執行緒池並等候到期限為止
+        期限只限制等候與 AI 分析的排隊時間：已開始的抓取與分析逾時後仍會跑完並寫入快取，
+        共用結果的請求沿用第一個請求的期限
+        """
+        ticker = str(ticker or "").strip()
+        if not ticker:
+            return _error(400, "缺少 ticker")
+        key = (ticker.upper(), request["period"], request["interval"], request["indicators"], request["llm"])
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires, status, body = cached
+            if time.monotonic() < expires:
+                self._cache.move_to_end(key)
+                metrics.inc("cache_requests_total", cache="api", result="hit")
+                return status, body
+            del self._cache[key]
+        metrics.inc("cache_requests_total", cache="api", result="miss")
+
+        expires = time.monotonic() + request["deadline"]
+        task = self._inflight.get(key)
+        if task is None:
+            pool = self.pools["llm" if request["llm"] else "analysis"]
+            if pool.pending >= pool.max_pending:
+                metrics.inc("api_rejected_total", pool=pool.name)
+                return _error(503, "服務忙碌中，請稍後再試", ticker=ticker)
+            # 加入時即計數（排隊與執行中皆算），同一輪事件中湧入的請求也會受限
+            pool.pending += 1
+            metrics.set_gauge("api_pending", pool.pending, pool=pool.name)
+            task = asyncio.ensure_future(self._run(pool, key, ticker, request, expires))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            # shield：單一請求逾時不影響其他等候同一結果的請求
+            return await asyncio.wait_for(asyncio.shield(task), max(0.0, expires - time.monotonic()))
+        except asyncio.TimeoutError:
+            return _error(504, f"超過期限 {request['deadline']:g} 秒", ticker=ticker)
+
+    async def batch(self, body: dict) -> Tuple[int, bytes]:
+        tickers = body.get("tickers")
+        if not isinstance(tickers, list) or not tickers:
+            return _error(400, "tickers 必須為非空的清單")
+        if len(tickers) > API_BATCH_LIMIT:
+            return _error(400, f"一次最多 {API_BATCH_LIMIT} 檔")
+        request = parse_request(body)
+        results = await asyncio.gather(*(self.analyze(t, request) for t in tickers))
+        items = b",".join(b'{"status":%d,"result":%s}' % (status, item) for status, item in results)
+        return 200, b'{"results":[' + items + b"]}"
+
+    def health(self) -> Tuple[int, bytes]:
+        return 200, _json({
+            "status": "ok",
+            "pending": {name: pool.pending for name, pool in self.pools.items()},
+            "cache_entries": len(self._cache),
+            "llm_queue": llm_queue.stats(),
+        })
+
+    # ---- HTTP ----
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, bytes]:
+        url = urlsplit(target)
+        try:
+            if url.path == "/healthz":
+                return self.health()
+            if url.path not in ("/v1/analyze", "/v1/batch"):
+                return _error(404, f"找不到 {url.path}")
+            if method == "GET" and url.path == "/v1/analyze":
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            elif method == "POST":
+                try:
+                    params = json.loads(body or b"{}")
+                except ValueError:
+                    return _error(400, "請求內容不是有效的 JSON")
+                if not isinstance(params, dict):
+                    return _error(400, "請求內容必須為 JSON 物件")
+            else:
+                return _error(405, f"不支援 {method} {url.path}")
+            if url.path == "/v1/batch":
+                return await self.batch(params)
+            return await self.analyze(params.get("ticker"), parse_request(params))
+        except APIError as e:
+            return _error(e.status, str(e))
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, keep_alive: bool):
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """一條連線（HTTP/1.1，支援 keep-alive）"""
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not line.strip():
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._send(writer, *_error(400, "無效的請求"), keep_alive=False)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    if len(headers) >= MAX_HEADERS:
+                        raise ValueError("標頭過多")
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, *_error(413, "請求內容過大"), keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                started = time.perf_counter()
+                status, payload = await self.dispatch(method.upper(), target, body)
+                await self._send(writer, status, payload, keep_alive)
+                route = urlsplit(target).path
+                metrics.inc("api_requests_total", route=route, status=str(status))
+                metrics.observe("api_request_seconds", time.perf_counter() - started, route=route)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = API_HOST, port: int = 8000, ready: Optional[asyncio.Event] = None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"API 服務啟動：http://{host}:{self.port}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StockAgent HTTP API")
+    parser.add_argument("--host", default=API_HOST, help="監聽位址（預設只接受本機連線，0.0.0.0 對外開放）")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="分析用執行緒數")
+    parser.add_argument("--llm-workers", type=int, default=API_LLM_WORKERS, help="等候 AI 分析的執行緒數")
+    args = parser.parse_args()
+    try:
+        asyncio.run(APIServer(workers=args.workers, llm_workers=args.llm_workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 # app.py
 
+import os
 import streamlit as st
-import matplotlib.pyplot as plt
 from agent import StockAgent
+from charts import render_chart, has_chart
+from config import LIVE_REFRESH_SECONDS
+from live_session import LiveSession, NO_UPDATE
+from llm_cache import llm_cache
+from metrics import serve_metrics
+from prewarm import PrewarmScheduler
 
 st.set_page_config(page_title="AI 股票查詢系統", layout="wide")
 st.title("📈 AI股票查詢")
@@ -10,157 +16,201 @@ st.title("📈 AI股票查詢")
 # 初始化 Agent
 @st.cache_resource
 def get_agent():
-    return StockAgent()
+    # 設定 FINANCE_AGENT_METRICS_PORT 時提供 /metrics，需在建立圖之前啟用才會包裝節點
+    # 預設只接受本機連線，FINANCE_AGENT_METRICS_HOST=0.0.0.0 才對外開放
+    metrics_port = os.environ.get("FINANCE_AGENT_METRICS_PORT")
+    if metrics_port:
+        serve_metrics(int(metrics_port), os.environ.get("FINANCE_AGENT_METRICS_HOST", "127.0.0.1"))
+    agent = StockAgent()
+    # 設定 FINANCE_AGENT_PREWARM=1 時在背景於收盤後預熱熱門股票（_LLM=1 一併產生 AI 分析）
+    if os.environ.get("FINANCE_AGENT_PREWARM") == "1":
+        llm = os.environ.get("FINANCE_AGENT_PREWARM_LLM") == "1"
+        PrewarmScheduler(agent=agent if llm else None).start()
+    return agent
 
 agent = get_agent()
 
+# 資料範圍選項：顯示名稱 -> (period, interval)
+DATA_RANGES = {
+    "近兩個月（日線）": ("2mo", "1d"),
+    "近一年（日線）": ("1y", "1d"),
+    "近五年（日線）": ("5y", "1d"),
+    "近十年（日線）": ("10y", "1d"),
+    "近六十天（5分鐘線）": ("60d", "5m"),
+    "近五天（1分鐘線）": ("5d", "1m"),
+}
+
+with st.sidebar:
+    live_refresh = st.number_input("⏱️ 即時更新間隔（秒）", min_value=5, value=int(LIVE_REFRESH_SECONDS), step=5,
+                                   help="開啟即時更新時，每隔幾秒檢查一次新的 K 棒")
+
+def render_charts(bars, ticker):
+    """
+    顯示技術分析圖表（圖片由 charts 模組繪製並快取）
+    """
+    if not bars.empty:
+        st.subheader("📊 技術分析圖表")
+
+        # 創建三欄布局
+        col1, col2 ,col3= st.columns(3)
+
+        # 左邊：股價走勢與移動平均線
+        with col1:
+            st.image(render_chart(bars, ticker, "price"), use_container_width=True)
+            st.caption("股價走勢與移動平均線")
+
+        # 中間：RSI 指標
+        with col2:
+            if has_chart(bars, "rsi"):
+                st.image(render_chart(bars, ticker, "rsi"), use_container_width=True)
+                st.caption("RSI 技術指標")
+            else:
+                st.info("RSI 指標資料不足，需要更多歷史資料計算")
+        with col3:
+            # 額外的布林通道圖表
+            if has_chart(bars, "bollinger"):
+                st.image(render_chart(bars, ticker, "bollinger"), use_container_width=True)
+                st.caption("布林通道（20日移動平均 ± 2標準差）")
+
+
+def render_stats(result):
+    """
+    顯示基本統計資訊
+    """
+    if not result["bars"].empty:
+        st.subheader("📊 基本統計資訊")
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("目前價格", f"{result['current_price']:.2f}")
+
+        with col2:
+            price_change = result['current_price'] - result['previous_close']
+            st.metric("日漲跌", f"{price_change:.2f}", f"{price_change:.2f}")
+
+        with col3:
+            st.metric("期間最高", f"{result['period_high']:.2f}")
+
+        with col4:
+            st.metric("期間最低", f"{result['period_low']:.2f}")
+
+
+def stream_events(events, report_box, on_node=None):
+    """
+    依序顯示串流事件：報告與 AI 分析逐字附加在 report_box，回傳最終狀態
+    """
+    report_text = ""
+    result = {}
+    for event in events:
+        if event["event"] == "node":
+            result = event["state"]
+            if "error" in result:
+                raise ValueError(result["error"])
+            if on_node is not None:
+                on_node(event["node"], result)
+        elif event["event"] == "report":
+            report_text = event["text"]
+            report_box.markdown(report_text)
+        elif event["event"] == "token":
+            report_text += event["text"]
+            report_box.markdown(report_text)
+    report_box.markdown(result["response_text"])
+    return result
+
+
+def render_live():
+    """
+    即時更新區塊（fragment，每 live_refresh 秒只重跑這一段）：
+    只補抓新的 K 棒、增量更新指標與統計；圖表只有用到的欄位變動時才重畫（見 charts.CHART_COLUMNS），
+    技術訊號改變時才重新產生 AI 報告
+    """
+    live = st.session_state.get("live")
+    if live is None:
+        return
+    try:
+        update = live.poll()
+    except Exception as e:
+        st.warning(f"即時更新失敗，稍後重試：{e}")
+        update = NO_UPDATE
+
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.caption(f"🔴 即時更新中：{live.ticker}，最後一根 K 棒 {live.last_bar:%Y-%m-%d %H:%M}，"
+                   f"每 {live.refresh_seconds:g} 秒檢查一次")
+    with col2:
+        if st.button("⏹ 停止即時更新", use_container_width=True):
+            st.session_state.pop("live", None)
+            st.rerun()
+
+    render_stats(live.state)
+    render_charts(live.bars, live.ticker)
+
+    st.subheader("🤖 AI 分析報告")
+    report_box = st.empty()
+    if update.signals_changed:
+        st.toast(f"📢 {live.ticker} 技術訊號改變：{'、'.join(live.signals) or '無'}")
+        try:
+            live.set_report(stream_events(agent.stream_report(live.state), report_box))
+        except Exception as e:
+            st.warning(f"重新產生報告失敗：{e}")
+    report_box.markdown(live.state["response_text"])
+
+
 # 使用者輸入區
 with st.form(key="query_form"):
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3, col4 = st.columns([3, 1.2, 0.8, 1])
     with col1:
         user_query = st.text_input(
             "請輸入股票代號：", 
-            placeholder="台股請輸入4位數字（如：2330），美股請輸入代碼（如：AAPL）",
+            placeholder="輸入股票代號或公司名稱（如：2330、台積電、AAPL、Apple）",
             label_visibility="collapsed",
-            help="支援台股4位數字代碼和美股字母代碼"
+            help="支援台股代碼（上櫃可加 .TWO）、美股代碼及中英文公司名稱"
         )
     with col2:
+        data_range = st.selectbox("資料範圍", list(DATA_RANGES), label_visibility="collapsed")
+    with col3:
+        live_mode = st.toggle("即時更新", help="定時檢查新的 K 棒，只更新指標、統計與圖表")
+    with col4:
         submit = st.form_submit_button("🔍 查詢", use_container_width=True)
 
+if submit:
+    st.session_state.pop("live", None)
+
 if submit and user_query:
     ticker = user_query.strip()
     
     # 簡單驗證輸入格式
     if not ticker:
         st.error("請輸入股票代號")
-    elif len(ticker) > 7:
+    elif len(ticker) > 30:
         st.error("股票代號格式不正確")
     else:
         with st.spinner("🤖 AI 代理人分析中..."):
             try:
-                # 使用 AI Agent 生成分析報告
-                response_text = agent.call(ticker)
-                # 獲取股票資料用於圖表顯示
-                df_ind, market = agent.get_stock_data(ticker)
-                # 顯示 AI 分析結果
+                # 串流執行：資料與圖表先顯示，AI 分析逐字附加在報告後
                 st.subheader("🤖 AI 分析報告")
-                st.markdown(response_text)
-                # 顯示圖表
-                if not df_ind.empty:
-                    st.subheader("📊 技術分析圖表")
-                    
-                    # 創建兩欄布局
-                    col1, col2 ,col3= st.columns(3)
-                    
-                    # 左邊：股價走勢與移動平均線
-                    with col1:
-                        fig1, ax1 = plt.subplots(figsize=(10, 6))
-                        
-                        # 繪製股價和移動平均線
-                        ax1.plot(df_ind.index, df_ind["Close"], 
-                                label="Closing Price", linewidth=2, color='#1f77b4')
-                        
-                        if "MA_5" in df_ind.columns:
-                            ax1.plot(df_ind.index, df_ind["MA_5"], 
-                                    label="MA5", linestyle="--", alpha=0.8, color='orange')
-                        
-                        if "MA_20" in df_ind.columns:
-                            ax1.plot(df_ind.index, df_ind["MA_20"], 
-                                    label="MA20", linestyle="--", alpha=0.8, color='green')
-                        
-                        if "MA_60" in df_ind.columns:
-                            ax1.plot(df_ind.index, df_ind["MA_60"], 
-                                    label="MA60", linestyle="--", alpha=0.8, color='red')
-                        
-                        ax1.set_title(f"{ticker}", 
-                                     fontsize=14, fontweight='bold')
-                        ax1.set_xlabel("Date")
-                        ax1.set_ylabel("Price")
-                        ax1.legend()
-                        ax1.grid(True, alpha=0.3)
-                        
-                        # 自動調整日期標籤角度
-                        plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
-                        
-                        st.pyplot(fig1)
-                        st.caption("股價走勢與移動平均線")
-                    
-                    # 右邊：RSI 指標
-                    with col2:
-                        if "RSI_14" in df_ind.columns and not df_ind["RSI_14"].isna().all():
-                            fig2, ax2 = plt.subplots(figsize=(10, 6))
-                            
-                            ax2.plot(df_ind.index, df_ind["RSI_14"], 
-                                    label="RSI(14)", linewidth=2, color='purple')
-                            
-                            # 超買超賣線
-                            ax2.axhline(70, color="red", linestyle="--", alpha=0.7, label="Overbought Line(70)")
-                            ax2.axhline(30, color="green", linestyle="--", alpha=0.7, label="Oversold Line(30)")
-                            
-                            ax2.set_title("RSI", fontsize=14, fontweight='bold')
-                            ax2.set_xlabel("Date")
-                            ax2.set_ylabel("RSI")
-                            ax2.set_ylim(0, 100)
-                            ax2.legend()
-                            ax2.grid(True, alpha=0.3)
-                            
-                            # 自動調整日期標籤角度
-                            plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45)
-                            
-                            st.pyplot(fig2)
-                            st.caption("RSI 技術指標")
-                        else:
-                            st.info("RSI 指標資料不足，需要更多歷史資料計算")
-                    with col3:
-                        # 額外的布林通道圖表
-                        if all(col in df_ind.columns for col in ["BB_Upper", "BB_Middle", "BB_Lower"]):                            
-                            fig3, ax3 = plt.subplots(figsize=(12, 6))
-                            # 繪製布林通道
-                            ax3.plot(df_ind.index, df_ind["Close"], 
-                                    label="Closing Price", linewidth=2, color='blue')
-                            ax3.plot(df_ind.index, df_ind["BB_Upper"], 
-                                    label="Upper Band", linestyle="--", alpha=0.8, color='red')
-                            ax3.plot(df_ind.index, df_ind["BB_Middle"], 
-                                    label="Middle Band(MA20)", linestyle="-", alpha=0.8, color='orange')
-                            ax3.plot(df_ind.index, df_ind["BB_Lower"], 
-                                    label="Lower Band", linestyle="--", alpha=0.8, color='green')
-                            # 填充布林通道
-                            ax3.fill_between(df_ind.index, df_ind["BB_Upper"], df_ind["BB_Lower"], 
-                                            alpha=0.1, color='gray')
-                            ax3.set_title("Bollinger Bands", fontsize=14, fontweight='bold')
-                            ax3.set_xlabel("Day")
-                            ax3.set_ylabel("Price")
-                            ax3.legend()
-                            ax3.grid(True, alpha=0.3)
-
-                            plt.setp(ax3.xaxis.get_majorticklabels(), rotation=45)
-
-                            st.pyplot(fig3)
-                            st.caption("布林通道（20日移動平均 ± 2標準差）")
-                
-                # 顯示資料統計
-                if not df_ind.empty:
-                    st.subheader("📊 基本統計資訊")
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        st.metric("目前價格", f"{df_ind['Close'].iloc[-1]:.2f}")
-                    
-                    with col2:
-                        price_change = df_ind['Close'].iloc[-1] - df_ind['Close'].iloc[-2] if len(df_ind) > 1 else 0
-                        st.metric("日漲跌", f"{price_change:.2f}", f"{price_change:.2f}")
-                    
-                    with col3:
-                        period_high = df_ind['Close'].max()
-                        st.metric("期間最高", f"{period_high:.2f}")
-                    
-                    with col4:
-                        period_low = df_ind['Close'].min()
-                        st.metric("期間最低", f"{period_low:.2f}")
+                report_box = st.empty()
+                period, interval = DATA_RANGES[data_range]
+
+                def on_node(node, state):
+                    if node == "analyze_function":
+                        render_charts(state["bars"], state["ticker"])
+                        render_stats(state)
+
+                result = stream_events(agent.stream(ticker, period, interval), report_box, on_node)
+                if live_mode:
+                    # 之後由即時更新區塊接手顯示，不再重新抓整段資料
+                    st.session_state["live"] = LiveSession(result, live_refresh)
+                    st.rerun()
 
             except Exception as e:
                 st.error(f"❌ 發生錯誤：{str(e)}")
-                st.info("請檢查股票代號是否正確：\n- 台股：4位數字（例如：2330）\n- 美股：字母代碼（例如：AAPL）")
+                st.info("請檢查股票代號是否正確：\n- 台股：4位數字（例如：2330、6488.TWO）\n- 美股：字母代碼（例如：AAPL）\n- 公司名稱（例如：台積電、Apple）")
+
+elif "live" in st.session_state:
+    live = st.session_state["live"]
+    live.refresh_seconds = live_refresh
+    st.fragment(render_live, run_every=live_refresh)()
 
 # 側邊欄說明
 with st.sidebar:
@@ -170,12 +220,19 @@ with st.sidebar:
     1. 輸入股票代號
     2. 點擊查詢按鈕
     3. 查看 AI 分析報告和圖表
+    4. 開啟「即時更新」可持續追蹤最新報價（技術訊號改變時才重新產生 AI 分析）
     
     ### 📊 支援的市場
-    - **台股**：4位數字代碼（如 2330）
+    - **台股**：4位數字代碼（如 2330，上櫃如 6488.TWO）
     - **美股**：字母代碼（如 AAPL）
+    - 也可輸入公司名稱（如 台積電、Apple）
     """)
-    
+
+    cache_stats = llm_cache.stats()
+    st.caption(
+        f"🗄️ AI 回應快取：命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}"
+        f"（共 {cache_stats['size']} 筆）"
+    )
 
 
 # 頁尾
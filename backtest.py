@@ -0,0 +1,396 @@
+# backtest.py
+"""
+技術訊號回測：把 generate_analysis_summary 使用的訊號規則（見 stock_utils.signal_masks）套用到整段歷史，
+一次計算多檔股票與多組參數的報酬、最大回落與勝率
+- ma：短期趨勢向上（收盤 > 短均線 > 長均線）時持有，趨勢不成立時賣出
+- rsi：RSI 超賣時買進，超買時賣出（對應「超賣可能反彈、超買可能回調」的建議）
+- bb：突破布林上軌時買進，跌破下軌時賣出
+只做多；訊號以當日收盤判斷並以收盤價成交，cost 為每次買進或賣出的成本比例
+
+計算方式：只記錄訊號開始成立的日期，配對成一筆筆交易；交易報酬由累積報酬相減取得，
+交易期間的最高、最低與回落以預先建好的區間表（sparse table）查詢，每組參數不需逐日模擬
+
+例：
+python backtest.py 2330 2317 AAPL --rule rsi --rsi-low 20 25 30 --rsi-high 70 75 80
+python backtest.py 2330 --rule ma --ma-fast 5 10 --ma-slow 20 60 --period 10y --cost 0.002
+"""
+
+import argparse
+import itertools
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from indicator_engine import BB_NUM_STD, BB_WINDOW
+from panel_indicators import align_closes, compute_panel_indicators, rolling_mean, rolling_mean_std, series_lengths
+
+RULES = ("ma", "rsi", "bb")
+METRICS = ("total_return", "buy_hold_return", "max_drawdown", "hit_rate", "trades", "exposure")
+
+
+class BacktestParams(NamedTuple):
+    rule: str
+    ma_fast: int = 5
+    ma_slow: int = 20
+    rsi_low: float = 30
+    rsi_high: float = 70
+    bb_std: float = BB_NUM_STD
+
+    def label(self) -> str:
+        if self.rule == "ma":
+            return f"MA {self.ma_fast}/{self.ma_slow}"
+        if self.rule == "rsi":
+            return f"RSI {self.rsi_low:g}/{self.rsi_high:g}"
+        return f"BB {BB_WINDOW}±{self.bb_std:g}σ"
+
+
+_RULE_FIELDS = {"ma": ("ma_fast", "ma_slow"), "rsi": ("rsi_low", "rsi_high"), "bb": ("bb_std",)}
+
+
+def param_grid(rule: str, **ranges: Sequence) -> List[BacktestParams]:
+    """
+    參數組合，例：param_grid("rsi", rsi_low=[20, 30], rsi_high=[70, 80])
+    未指定的參數使用預設值；短均線不小於長均線、超賣門檻不小於超買門檻的組合會略過
+    """
+    if rule not in RULES:
+        raise ValueError(f"未知的回測規則 '{rule}'，可用：{', '.join(RULES)}")
+    unknown = set(ranges) - set(_RULE_FIELDS[rule])
+    if unknown:
+        raise ValueError(f"規則 {rule} 沒有參數：{', '.join(sorted(unknown))}")
+    fields = list(ranges)
+    grid = []
+    for values in itertools.product(*(ranges[f] for f in fields)):
+        params = BacktestParams(rule, **dict(zip(fields, values)))
+        if params.ma_fast >= params.ma_slow or params.rsi_low >= params.rsi_high:
+            continue
+        grid.append(params)
+    return grid
+
+
+class Trades(NamedTuple):
+    """依股票、日期排序的交易；entry / exit 為買進、賣出（或期末）的日期列"""
+    ticker: np.ndarray
+    entry: np.ndarray
+    exit: np.ndarray
+    closed: np.ndarray  # False 表示期末仍持有
+
+
+class _Panel:
+    """
+    一段股票（欄）的收盤價與共用的指標、訊號；不同參數用到的均線與門檻訊號只計算一次
+    訊號只記錄開始成立的日期，以鍵值（欄 × 日期數 + 日期列）表示，依股票、日期排序
+    """
+
+    def __init__(self, close: np.ndarray):
+        self.close = close
+        self.rows, self.cols = close.shape
+        self.valid = ~np.isnan(close)
+        self.lengths = series_lengths(close)
+        base = compute_panel_indicators(close)
+        self._ma = {int(k[3:]): v for k, v in base.items() if k.startswith("MA_")}
+        self.rsi = base["RSI_14"]
+        self.rsi[~self.valid] = np.nan  # 停牌日（收盤為缺值）不產生訊號
+        self._bb = None
+        self._onsets = {}
+        self._levels = None
+
+        # 累積對數報酬：停牌或尚未上市的日期沿用前一筆收盤，報酬為 0
+        idx = np.where(self.valid, np.arange(self.rows)[:, None], 0)
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        filled = np.take_along_axis(close, idx, axis=0)
+        self.growth = np.zeros_like(close)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.log(filled[1:] / filled[:-1], out=self.growth[1:])
+        np.nan_to_num(self.growth, copy=False, nan=0.0)
+        np.cumsum(self.growth, axis=0, out=self.growth)
+
+    # ---- 訊號 ----
+    def ma(self, window: int) -> np.ndarray:
+        if window not in self._ma:
+            self._ma[window] = rolling_mean(self.close, window)
+        return self._ma[window]
+
+    def _bands(self):
+        if self._bb is None:
+            # 同 compute_panel_indicators：資料不足 BB_WINDOW 筆的股票整欄為 NaN
+            middle, std = rolling_mean_std(self.close, BB_WINDOW)
+            short = self.lengths < BB_WINDOW
+            middle[:, short] = np.nan
+            std[:, short] = np.nan
+            self._bb = (self.close - middle, middle - self.close, std)
+        return self._bb
+
+    def _onset_keys(self, mask: np.ndarray) -> np.ndarray:
+        """mask 由 False 轉為 True 的日期（連續成立只記第一天）"""
+        onset = mask.copy()
+        onset[1:] &= ~mask[:-1]
+        t, n = np.nonzero(onset)
+        keys = n.astype(np.int64) * self.rows + t
+        keys.sort()
+        return keys
+
+    def _cached(self, key, make_mask) -> np.ndarray:
+        if key not in self._onsets:
+            self._onsets[key] = self._onset_keys(make_mask())
+        return self._onsets[key]
+
+    def events(self, params: BacktestParams):
+        """
+        回傳 (買進, 賣出) 訊號開始成立的鍵值；規則同 signal_masks，指標缺值（NaN）時不產生訊號
+        """
+        with np.errstate(invalid="ignore"):
+            if params.rule == "ma":
+                fast = self.ma(params.ma_fast)
+                trend_up = self.close > fast
+                trend_up &= fast > self.ma(params.ma_slow)
+                return self._onset_keys(trend_up), self._onset_keys(self.valid & ~trend_up)
+            if params.rule == "rsi":
+                return (self._cached(("rsi<", params.rsi_low), lambda: self.rsi < params.rsi_low),
+                        self._cached(("rsi>", params.rsi_high), lambda: self.rsi > params.rsi_high))
+            # 突破上軌：收盤 - 中軌 > k 倍標準差；跌破下軌：中軌 - 收盤 > k 倍標準差
+            above, below, std = self._bands()
+            width = std * params.bb_std
+            return self._onset_keys(above > width), self._onset_keys(below > width)
+
+    def trades(self, params: BacktestParams) -> Trades:
+        """
+        將訊號配對成交易：空手時遇到買進訊號進場，持有時遇到賣出訊號出場，其餘訊號忽略
+        最後一天才出現的買進訊號不計
+        """
+        entry, exit = self.events(params)
+        keys = np.concatenate((entry, exit))
+        is_entry = np.zeros(len(keys), dtype=bool)
+        is_entry[:len(entry)] = True
+        order = np.argsort(keys, kind="stable")
+        keys, is_entry = keys[order], is_entry[order]
+        ticker = keys // self.rows
+
+        # 前一個訊號（同一檔股票）為買進時表示持有中
+        holding = np.zeros(len(keys), dtype=bool)
+        holding[1:] = is_entry[:-1] & (ticker[1:] == ticker[:-1])
+        turns = np.flatnonzero(is_entry != holding)  # 進場或出場；同一檔股票內必定交替，且由進場開始
+        starts = np.flatnonzero(is_entry[turns])
+        following = np.minimum(starts + 1, len(turns) - 1)
+        closed = (starts + 1 < len(turns)) & ~is_entry[turns[following]]
+
+        entry_key = keys[turns[starts]]
+        ticker = ticker[turns[starts]]
+        exit_key = np.where(closed, keys[turns[following]], ticker * self.rows + self.rows - 1)
+        keep = entry_key - ticker * self.rows < self.rows - 1
+        return Trades(ticker[keep], (entry_key - ticker * self.rows)[keep],
+                      (exit_key - ticker * self.rows)[keep], closed[keep])
+
+    # ---- 交易期間的最高、最低與回落 ----
+    def _range_levels(self):
+        """
+        區間表：第 k 層為每個起點往後 2^k 天累積報酬的 (最高, 最低, 最大回落)，只建一次供所有參數查詢
+        """
+        if self._levels is None:
+            high, low, drop = self.growth, self.growth, np.zeros_like(self.growth)
+            levels = [(high, low, drop)]
+            half = 1
+            while 2 * half <= self.rows:
+                drop = np.maximum(np.maximum(drop[:-half], drop[half:]), high[:-half] - low[half:])
+                high = np.maximum(high[:-half], high[half:])
+                low = np.minimum(low[:-half], low[half:])
+                levels.append((high, low, drop))
+                half *= 2
+            self._levels = levels
+        return self._levels
+
+    def range_stats(self, ticker: np.ndarray, start: np.ndarray, stop: np.ndarray):
+        """每個區間 [start, stop]（含）內累積報酬的最高、最低與最大回落"""
+        levels = self._range_levels()
+        length = stop - start + 1
+        pos = start.copy()
+        high = np.full(len(start), -np.inf)
+        low = np.full(len(start), np.inf)
+        drop = np.zeros(len(start))
+        # 區間長度拆成 2 的次方，由長到短依序合併
+        for k in range(len(levels) - 1, -1, -1):
+            take = np.flatnonzero((length >> k) & 1)
+            if not take.size:
+                continue
+            level_high, level_low, level_drop = levels[k]
+            p, n = pos[take], ticker[take]
+            block_low = level_low[p, n]
+            drop[take] = np.maximum(np.maximum(drop[take], level_drop[p, n]), high[take] - block_low)
+            high[take] = np.maximum(high[take], level_high[p, n])
+            low[take] = np.minimum(low[take], block_low)
+            pos[take] += 1 << k
+        return high, low, drop
+
+    # ---- 績效 ----
+    def evaluate(self, trades: Trades, cost: float = 0.0) -> Dict[str, np.ndarray]:
+        """
+        依交易計算每檔股票的績效，每個值皆為 (股票數,) 陣列
+            total_return: 累積報酬
+            max_drawdown: 最大回落（正值，0.2 表示 -20%）
+            hit_rate: 獲利交易（含成本）的比例，期末未平倉的交易以最後收盤計算；沒有交易時為 NaN
+            trades: 交易次數
+            exposure: 持有天數佔上市後天數的比例
+        """
+        n, entry, exit = trades.ticker, trades.entry, trades.exit
+        fee = np.log1p(-cost)
+        growth = self.growth[entry, n]
+        returns = self.growth[exit, n] - growth + fee + trades.closed * fee
+
+        count = np.bincount(n, minlength=self.cols)
+        wins = np.bincount(n, weights=returns > 0, minlength=self.cols)
+        held = np.bincount(n, weights=exit - entry, minlength=self.cols)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hit_rate = np.where(count > 0, wins / count, np.nan)
+        result = {
+            "total_return": np.expm1(np.bincount(n, weights=returns, minlength=self.cols)),
+            "max_drawdown": np.zeros(self.cols),
+            "hit_rate": hit_rate,
+            "trades": count,
+            "exposure": held / np.maximum(self.lengths - 1, 1),
+        }
+        if not len(n):
+            return result
+
+        # 淨值（對數）：每筆交易前的累積報酬 base，交易中為 base + 買進成本 + 區間內累積報酬的變化
+        high, low, drop = self.range_stats(n, entry, exit)
+        first = np.flatnonzero(np.r_[True, n[1:] != n[:-1]])
+        group = np.repeat(np.arange(len(first)), np.diff(np.r_[first, len(n)]))
+        before = np.cumsum(returns) - returns
+        base = before - before[first][group]
+        peak = base + fee + high - growth
+
+        # 每筆交易之前的淨值高點（含起始的 0）：分組累積最大值，每組加上遞增的位移避免跨股票
+        shift = group * (peak.max() - peak.min() + 1.0)
+        running = np.maximum.accumulate(peak + shift) - shift
+        prior = np.empty_like(peak)
+        prior[1:] = running[:-1]
+        prior[first] = 0.0
+        np.maximum(prior, 0.0, out=prior)
+
+        # 回落候選：先前高點到交易中的最低點、交易內部的回落、扣除賣出成本後
+        candidate = np.maximum(prior - (base + fee + low - growth), drop)
+        np.maximum(candidate, np.maximum(prior, peak) - (base + returns), out=candidate)
+        result["max_drawdown"][n[first]] = -np.expm1(-np.maximum.reduceat(candidate, first))
+        return result
+
+    def positions(self, trades: Trades) -> np.ndarray:
+        """每日是否持有（當日報酬計入）：買進隔天起至賣出當天"""
+        change = np.zeros((self.rows + 1, self.cols), dtype=np.int32)
+        np.add.at(change, (trades.entry + 1, trades.ticker), 1)
+        np.add.at(change, (trades.exit + 1, trades.ticker), -1)
+        return np.cumsum(change[:-1], axis=0) > 0
+
+
+def positions(close: np.ndarray, params: BacktestParams) -> np.ndarray:
+    """
+    依規則得到整段歷史的持倉陣列：(日期數, 股票數) 布林值，True 表示當日報酬計入
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 1:
+        close = close[:, None]
+    panel = _Panel(close)
+    return panel.positions(panel.trades(params))
+
+
+def run_backtest(close: np.ndarray, grid: Iterable[BacktestParams], tickers: Optional[Sequence[str]] = None,
+                 cost: float = 0.0, chunk_size: int = 128) -> pd.DataFrame:
+    """
+    對收盤價矩陣執行整組參數的回測
+    Args:
+        close: (日期數, 股票數) 收盤價（見 panel_indicators.align_closes），缺值為 NaN
+        grid: 參數組合（見 param_grid）
+        tickers: 股票代號，預設為欄位編號
+        cost: 每次買進或賣出的成本比例，例如台股手續費加證交稅約 0.002
+        chunk_size: 每次計算的股票檔數（限制指標與區間表的記憶體）
+    Returns:
+        DataFrame: 每組參數 × 每檔股票一列，欄位為 rule、params、ticker 與 METRICS
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 1:
+        close = close[:, None]
+    grid = list(grid)
+    tickers = list(tickers) if tickers is not None else list(range(close.shape[1]))
+    if len(tickers) != close.shape[1]:
+        raise ValueError("tickers 數量與收盤價欄數不符")
+
+    columns = {name: [] for name in ("rule", "params", "ticker", *METRICS)}
+    for start in range(0, close.shape[1], max(1, chunk_size)):
+        panel = _Panel(close[:, start:start + chunk_size])
+        names = tickers[start:start + chunk_size]
+        buy_hold = np.expm1(panel.growth[-1]) if panel.rows else np.zeros(panel.cols)
+        for params in grid:
+            result = panel.evaluate(panel.trades(params), cost)
+            result["buy_hold_return"] = buy_hold
+            columns["rule"].append([params.rule] * len(names))
+            columns["params"].append([params.label()] * len(names))
+            columns["ticker"].append(names)
+            for name in METRICS:
+                columns[name].append(result[name])
+    return pd.DataFrame({name: np.concatenate(parts) if parts else [] for name, parts in columns.items()})
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    每組參數跨股票的彙總：報酬中位數、平均最大回落、整體勝率（獲利交易 / 全部交易）
+    """
+    wins = results["hit_rate"].fillna(0) * results["trades"]
+    grouped = results.assign(wins=wins).groupby(["rule", "params"], sort=False)
+    summary = grouped.agg(
+        tickers=("ticker", "size"),
+        median_return=("total_return", "median"),
+        mean_return=("total_return", "mean"),
+        buy_hold_median=("buy_hold_return", "median"),
+        mean_drawdown=("max_drawdown", "mean"),
+        trades=("trades", "sum"),
+        wins=("wins", "sum"),
+        exposure=("exposure", "mean"),
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        summary.insert(5, "hit_rate", np.where(summary["trades"] > 0, summary["wins"] / summary["trades"], np.nan))
+    return summary.drop(columns="wins").reset_index()
+
+
+def backtest_frames(frames: Mapping[str, pd.DataFrame], grid: Iterable[BacktestParams],
+                    cost: float = 0.0) -> pd.DataFrame:
+    """對 {代號: 歷史資料 DataFrame} 執行回測（依交易日對齊）"""
+    _, tickers, close = align_closes(frames)
+    return run_backtest(close, grid, tickers, cost)
+
+
+def main():
+    from batch_scan import resolve_ticker
+    from stock_utils import fetch_tw_stock, fetch_us_stock
+
+    parser = argparse.ArgumentParser(description="技術訊號回測")
+    parser.add_argument("tickers", nargs="+", help="股票代號（台股、美股可混合）")
+    parser.add_argument("--rule", choices=RULES, default="rsi")
+    parser.add_argument("--period", default="5y", help="回測期間（yfinance period 格式）")
+    parser.add_argument("--ma-fast", type=int, nargs="+")
+    parser.add_argument("--ma-slow", type=int, nargs="+")
+    parser.add_argument("--rsi-low", type=float, nargs="+")
+    parser.add_argument("--rsi-high", type=float, nargs="+")
+    parser.add_argument("--bb-std", type=float, nargs="+")
+    parser.add_argument("--cost", type=float, default=0.0, help="每次買進或賣出的成本比例")
+    parser.add_argument("--detail", action="store_true", help="列出每檔股票的結果")
+    args = parser.parse_args()
+
+    ranges = {f: getattr(args, f) for f in _RULE_FIELDS[args.rule] if getattr(args, f)}
+    grid = param_grid(args.rule, **ranges)
+    frames = {}
+    for text in args.tickers:
+        ticker, market = resolve_ticker(text)
+        fetch = fetch_tw_stock if market == "tw" else fetch_us_stock
+        try:
+            frames[ticker] = fetch(ticker, period=args.period)
+        except ValueError as e:
+            print(f"{e}，略過")
+    if not frames:
+        return
+    results = backtest_frames(frames, grid, cost=args.cost)
+    table = results if args.detail else summarize(results)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(table.round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# bar_archive.py
+"""
+以記憶體映射檔案儲存長序列 K 棒（例如 10 年日線、60 天分鐘線）
+每檔股票（每種 interval）一個目錄：每個欄位一個原始二進位檔，另有 meta.json 記錄筆數、時區，
+上游是否已沒有更早的資料（complete），以及價格基準等版本標記（tag）
+讀取時只映射檔案、以日期二分搜尋後複製需要的區段，不會把整段歷史載入記憶體
+"""
+
+import json
+import os
+import re
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from bars import INDICATOR_COLUMNS, PRICE_COLUMNS, Bars
+
+
+def _utc_ns(ts) -> int:
+    ts = pd.Timestamp(ts)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.as_unit("ns").value
+
+
+class BarArchive:
+    """
+    欄位式 K 棒檔案庫
+    - 日期為 int64（UTC 奈秒），價格與成交量為 float64
+    - 筆數與欄位檔的版本（gen）以 meta.json 為準，資料寫完後才原子替換 meta
+    - 新 K 棒只寫在已發布的筆數之後；會改動已發布的 K 棒時（修正最後一根、整段重寫）
+      寫到新版本的欄位檔再切換 meta，其他行程讀到的一定是某一版完整的資料
+    - 同一檔股票同時有多個行程寫入時以最後替換 meta 者為準
+    - tag 不同的既有資料（例如改變價格基準之前寫入的）視為沒有資料，下次寫入時整段取代
+    """
+
+    def __init__(self, root: str, tag: Optional[str] = None):
+        self.root = root
+        self.tag = tag
+
+    def path(self, symbol: str, interval: str = "1d") -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper())
+        return os.path.join(self.root, f"{safe}_{interval}")
+
+    def _meta_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.path(symbol, interval), "meta.json")
+
+    def meta(self, symbol: str, interval: str = "1d") -> Optional[dict]:
+        try:
+            with open(self._meta_path(symbol, interval), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("tag") == self.tag else None
+
+    def rows(self, symbol: str, interval: str = "1d") -> int:
+        meta = self.meta(symbol, interval)
+        return meta["rows"] if meta else 0
+
+    def mtime(self, symbol: str, interval: str = "1d") -> Optional[float]:
+        try:
+            return os.path.getmtime(self._meta_path(symbol, interval))
+        except OSError:
+            return None
+
+    def touch(self, symbol: str, interval: str = "1d"):
+        """記錄本次檢查時間（沒有新資料時使用）"""
+        os.utime(self._meta_path(symbol, interval))
+
+    def _column_path(self, symbol: str, interval: str, column: str, gen: str = "") -> str:
+        # 第一版（以及舊版檔案）為 Close.bin，之後為 Close.<gen>.bin
+        return os.path.join(self.path(symbol, interval), f"{column}.{gen}.bin" if gen else f"{column}.bin")
+
+    def _map(self, symbol: str, interval: str, column: str, rows: int, dtype, gen: str = "") -> np.memmap:
+        return np.memmap(self._column_path(symbol, interval, column, gen), dtype=dtype, mode="r", shape=(rows,))
+
+    def _published(self, symbol: str, interval: str, read):
+        """
+        以目前發布的 meta 執行 read(meta)；讀取途中舊版欄位檔被寫入者刪除時，改讀新版
+        """
+        for attempt in range(3):
+            meta = self.meta(symbol, interval)
+            if not meta or not meta["rows"]:
+                return None
+            try:
+                return read(meta)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def bounds(self, symbol: str, interval: str = "1d"):
+        """
+        回傳 (第一根, 最後一根) K 棒的時間（交易所時區），沒有資料時回傳 None
+        """
+        def read(meta):
+            dates = self._map(symbol, interval, "Date", meta["rows"], np.int64, meta.get("gen", ""))
+            first, last = (pd.Timestamp(int(dates[i]), tz="UTC") for i in (0, -1))
+            tz = meta.get("tz")
+            return (first.tz_convert(tz), last.tz_convert(tz)) if tz else (first.tz_localize(None), last.tz_localize(None))
+
+        return self._published(symbol, interval, read)
+
+    def write(self, symbol: str, df: pd.DataFrame, interval: str = "1d", complete: Optional[bool] = None):
+        """
+        寫入 K 棒（第一欄為日期）；與既有資料重疊的部分（含之後的全部）以新資料為準
+        complete 為 True 表示上游沒有比第一根 K 棒更早的資料（新上市、或已抓過全部歷史），None 沿用原值
+        """
+        date_col = df.columns[0]
+        df = df.drop_duplicates(subset=date_col, keep="last").sort_values(date_col)
+        if df.empty:
+            return
+        dates = pd.DatetimeIndex(df[date_col])
+        tz = str(dates.tz) if dates.tz is not None else None
+        if tz is not None:
+            dates = dates.tz_convert("UTC").tz_localize(None)
+        dates = dates.as_unit("ns").asi8
+
+        columns = {"Date": dates}
+        for col in PRICE_COLUMNS:
+            columns[col] = (df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                            if col in df.columns else np.full(len(df), np.nan))
+
+        os.makedirs(self.path(symbol, interval), exist_ok=True)
+        meta = self.meta(symbol, interval) or {"rows": 0, "tz": tz}
+        rows, gen = meta["rows"], meta.get("gen", "")
+        pos = 0
+        if rows:
+            existing = {col: self._map(symbol, interval, col, rows, values.dtype, gen)
+                        for col, values in columns.items()}
+            pos = int(np.searchsorted(existing["Date"], dates[0], side="left"))
+            # 與已發布資料相同的重疊部分略過（增量補抓從最後一根開始，收盤後通常沒有變動），只附加新的 K 棒
+            same = min(rows - pos, len(dates))
+            if same and all(np.array_equal(existing[col][pos:pos + same], values[:same], equal_nan=col != "Date")
+                            for col, values in columns.items()):
+                columns = {col: values[same:] for col, values in columns.items()}
+                pos += same
+            if pos < rows:
+                # 會改動已發布的 K 棒：保留前段，寫成新版本的欄位檔
+                columns = {col: np.concatenate([existing[col][:pos], values]) for col, values in columns.items()}
+            del existing
+
+        if pos < rows:
+            new_gen = f"{os.getpid()}_{time.time_ns()}"
+            for col, values in columns.items():
+                with open(self._column_path(symbol, interval, col, new_gen), "wb") as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+            pos = 0
+        else:
+            # 只寫在已發布的筆數之後，讀取端只會讀到 meta 記錄的筆數
+            new_gen = gen
+            for col, values in columns.items():
+                path = self._column_path(symbol, interval, col, gen)
+                with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                    f.seek(pos * values.itemsize)
+                    f.write(np.ascontiguousarray(values).tobytes())
+
+        meta = {"rows": pos + len(columns["Date"]), "tz": meta.get("tz") or tz, "updated": time.time(),
+                "complete": bool(meta.get("complete")) if complete is None else complete, "tag": self.tag,
+                "gen": new_gen}
+        tmp_path = f"{self._meta_path(symbol, interval)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(symbol, interval))
+        if new_gen != gen:
+            # 已映射舊版檔案的讀取端不受影響（檔案在解除映射後才真正釋放）
+            for col in columns:
+                try:
+                    os.remove(self._column_path(symbol, interval, col, gen))
+                except OSError:
+                    pass
+
+    def read(self, symbol: str, interval: str = "1d", start=None,
+             extra_columns: Iterable[str] = INDICATOR_COLUMNS) -> Optional[Bars]:
+        """
+        讀取 start（含）之後的 K 棒為 Bars，並預留指標欄位；沒有資料時回傳 None
+        只有這段區間會被複製到記憶體
+        """
+        extra = [c for c in extra_columns if c not in PRICE_COLUMNS]
+        names = list(PRICE_COLUMNS) + extra
+
+        def read(meta):
+            rows, gen = meta["rows"], meta.get("gen", "")
+            dates = self._map(symbol, interval, "Date", rows, np.int64, gen)
+            i = int(np.searchsorted(dates, _utc_ns(start), side="left")) if start is not None else 0
+            data = np.full((len(names), rows - i), np.nan)
+            for j, col in enumerate(PRICE_COLUMNS):
+                data[j] = self._map(symbol, interval, col, rows, np.float64, gen)[i:]
+            return Bars(np.array(dates[i:]), meta.get("tz"), data, names)
+
+        return self._published(symbol, interval, read)
+
+    def frame(self, symbol: str, interval: str = "1d", start=None) -> pd.DataFrame:
+        """
+        同 read，但回傳 DataFrame（Date 與開高低收量）
+        """
+        bars = self.read(symbol, interval, start, extra_columns=())
+        return bars.to_frame() if bars is not None else pd.DataFrame()
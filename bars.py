@@ -0,0 +1,147 @@
+# bars.py
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+INDICATOR_COLUMNS = ("MA_5", "MA_20", "MA_60", "RSI_14", "BB_Middle", "BB_Upper", "BB_Lower")
+
+
+class Bars:
+    """
+    以陣列儲存的 K 棒容器，取代在各節點之間傳遞的 DataFrame
+    - 日期為 int64（UTC 奈秒），時區另外記錄
+    - 價格與指標共用同一塊連續的二維緩衝區，每個欄位是其中一列的檢視（不複製）
+    - 預留指標欄位的空間，計算指標時直接寫入，不需複製整張表
+    """
+
+    __slots__ = ("dates", "tz", "_data", "_index")
+
+    def __init__(self, dates: np.ndarray, tz: Optional[str], data: np.ndarray, names: Sequence[str]):
+        self.dates = dates
+        self.tz = tz
+        self._data = data
+        self._index = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str = "Date",
+                   extra_columns: Iterable[str] = INDICATOR_COLUMNS, dtype=np.float64) -> "Bars":
+        """
+        由 DataFrame 建立，並預留 extra_columns 的空間（初始為 NaN）
+        """
+        price_cols = [c for c in PRICE_COLUMNS if c in df.columns]
+        extra = [c for c in extra_columns if c not in price_cols]
+        names = price_cols + extra
+        data = np.full((len(names), len(df)), np.nan, dtype=dtype)
+        for i, col in enumerate(price_cols):
+            data[i] = df[col].to_numpy(dtype=dtype, na_value=np.nan)
+
+        if date_col in df.columns:
+            dates = pd.DatetimeIndex(df[date_col])
+        else:
+            dates = pd.DatetimeIndex(df.index)
+        tz = str(dates.tz) if dates.tz is not None else None
+        if tz is not None:
+            dates = dates.tz_convert("UTC").tz_localize(None)
+        return cls(dates.as_unit("ns").asi8.copy(), tz, data, names)
+
+    # ---- 類 DataFrame 介面（讀取） ----
+    def __len__(self) -> int:
+        return self._data.shape[1]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index or name == "Date"
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name == "Date":
+            return self.date_index().to_numpy()
+        return self._data[self._index[name]]
+
+    @property
+    def columns(self) -> list:
+        return ["Date"] + list(self._index)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def index(self) -> np.ndarray:
+        return np.arange(len(self))
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self.dates.nbytes
+
+    def date_index(self) -> pd.DatetimeIndex:
+        dates = pd.DatetimeIndex(self.dates.view("datetime64[ns]"))
+        return dates.tz_localize("UTC").tz_convert(self.tz) if self.tz else dates
+
+    def row(self, i: int) -> Dict[str, float]:
+        """
+        取得單一列（例如 row(-1) 為最新一根 K 棒），回傳 {欄位: 值}
+        """
+        return {name: float(self._data[j, i]) for name, j in self._index.items()}
+
+    # ---- 寫入 ----
+    def set_column(self, name: str, values):
+        """
+        寫入欄位；已預留空間時直接寫入緩衝區，否則擴充緩衝區
+        """
+        if name not in self._index:
+            grown = np.full((self._data.shape[0] + 1, len(self)), np.nan, dtype=self._data.dtype)
+            grown[:-1] = self._data
+            self._data = grown
+            self._index[name] = self._data.shape[0] - 1
+        np.copyto(self._data[self._index[name]], values, casting="unsafe")
+
+    def reserve(self, names: Iterable[str]):
+        """
+        預留多個欄位（初始為 NaN），缺少的欄位一次擴充緩衝區
+        """
+        missing = [name for name in dict.fromkeys(names) if name not in self._index]
+        if not missing:
+            return
+        grown = np.full((self._data.shape[0] + len(missing), len(self)), np.nan, dtype=self._data.dtype)
+        grown[:self._data.shape[0]] = self._data
+        for name in missing:
+            self._index[name] = len(self._index)
+        self._data = grown
+
+    def set_row(self, i: int, values: Dict[str, float]):
+        """
+        寫入單一列的多個欄位（例如更新最後一根尚未收盤的 K 棒），未預留的欄位略過
+        """
+        for name, value in values.items():
+            j = self._index.get(name)
+            if j is not None:
+                self._data[j, i] = np.nan if value is None else value
+
+    def append(self, date_ns: int, values: Dict[str, float]):
+        """
+        在最後加入一根 K 棒（date_ns 為 UTC 奈秒，values 以外的欄位為 NaN）
+        每次擴充一欄緩衝區，供即時模式逐根加入少量 K 棒
+        """
+        grown = np.full((self._data.shape[0], len(self) + 1), np.nan, dtype=self._data.dtype)
+        grown[:, :-1] = self._data
+        self._data = grown
+        self.dates = np.append(self.dates, np.int64(date_ns))
+        self.set_row(-1, values)
+
+    def drop_head(self, n: int):
+        """
+        捨棄最舊的 n 根 K 棒（檢視，不複製）
+        """
+        if n > 0:
+            self.dates = self.dates[n:]
+            self._data = self._data[:, n:]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        轉回 DataFrame（會複製資料，僅在需要 pandas 功能時使用）
+        """
+        frame = pd.DataFrame({name: self._data[i] for name, i in self._index.items()})
+        frame.insert(0, "Date", self.date_index())
+        return frame
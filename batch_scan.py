@@ -0,0 +1,192 @@
+# batch_scan.py
+"""
+整批股票分析（不經過 Streamlit）：抓取 → 技術指標 → 分析摘要（LLM 可選）
+以多行程平行處理，進度寫入檢查點檔，中斷後重新執行會從中斷處繼續
+結果輸出為 Parquet
+
+例：
+python batch_scan.py --market tw --file twse.txt --output data/scan_tw.parquet
+python batch_scan.py AAPL MSFT NVDA --workers 8 --llm
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_DIR, DEFAULT_PERIOD, DEFAULT_INTERVAL, UPSTREAM_BURST, UPSTREAM_RATE
+from fetch_gateway import SharedTokenBucket
+from ticker_resolver import resolver
+
+INDICATOR_FIELDS = ["MA_5", "MA_20", "MA_60", "RSI_14", "BB_Middle", "BB_Upper", "BB_Lower"]
+
+
+def resolve_ticker(text: str, market: str = "auto") -> Tuple[str, str]:
+    """
+    與 query_understanding_node 相同，以股票主檔將代號、名稱或別名解析為 (代號, 市場)
+    例：台積電 -> ("2330", "tw")、2330.TW -> ("2330", "tw")、Apple -> ("AAPL", "us")
+    無法辨識時當作美股代號；market 不是 "auto" 時以指定的市場為準
+    """
+    result = resolver.resolve(text)
+    if result.market == "unknown":
+        return text.strip().upper(), "us" if market == "auto" else market
+    return result.ticker, result.market if market == "auto" else market
+
+
+def analyze_ticker(ticker: str, market: str, with_fundamentals: bool = False, with_llm: bool = False,
+                   period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL) -> dict:
+    """
+    單檔股票的分析流程，在子行程中執行，回傳一列結果（可 JSON 序列化）
+    """
+    from agent import generate_llm_analysis
+    from bars import Bars
+    from stock_utils import (fetch_us_stock, fetch_tw_stock, compute_indicators_inplace,
+                             get_fundamental_data, generate_analysis_summary)
+
+    row = {"ticker": ticker, "market": market, "error": None}
+    try:
+        fetch = fetch_us_stock if market == "us" else fetch_tw_stock
+        df = fetch(ticker, period=period, interval=interval)
+        bars = compute_indicators_inplace(Bars.from_frame(df))
+        fundamental_data = get_fundamental_data(ticker, market) if with_fundamentals else {}
+
+        closes = bars["Close"]
+        current_price = float(closes[-1])
+        previous_close = float(closes[-2]) if len(bars) > 1 else current_price
+        change_pct = (current_price - previous_close) / previous_close * 100 if previous_close else 0.0
+        latest = bars.row(-1)
+
+        row.update({
+            "date": str(bars.date_index()[-1].date() if interval == "1d" else bars.date_index()[-1]),
+            "close": current_price,
+            "previous_close": previous_close,
+            "change_pct": change_pct,
+            "volume": latest.get("Volume"),
+            **{field: latest.get(field) for field in INDICATOR_FIELDS},
+            "summary": generate_analysis_summary(bars, "basic", fundamental_data),
+        })
+        if with_fundamentals:
+            row.update({f"f_{k}": (v if isinstance(v, (int, float)) else None)
+                        for k, v in fundamental_data.items() if k not in ("sector", "industry")})
+            row["sector"] = fundamental_data.get("sector")
+        if with_llm:
+            # 與互動查詢共用 LLM 快取；經由 LLM 工作佇列以 batch 優先順序執行，不限等候時間
+            row["llm_text"] = generate_llm_analysis(ticker, current_price, change_pct, row["summary"],
+                                                    fundamental_data, priority="batch")
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    # NaN 轉為 None，方便寫入 JSON 檢查點
+    return {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()}
+
+
+def _init_worker(bucket):
+    """子行程初始化：所有行程共用同一個權杖桶，速率與突發次數都不會超過設定值"""
+    from fetch_gateway import gateway
+    gateway.bucket = bucket
+
+
+def load_checkpoint(path: str) -> dict:
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中斷時可能留下寫一半的最後一行
+                done[row["ticker"]] = row
+    return done
+
+
+def run_scan(tickers, output: str, market: str = "auto", workers: int = None,
+             with_fundamentals: bool = False, with_llm: bool = False, retry_errors: bool = False,
+             period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL) -> dict:
+    """
+    執行整批分析，回傳統計資訊
+    tickers 可為代號、名稱或別名，先以股票主檔解析（見 resolve_ticker），檢查點與輸出都以解析後的代號為準
+    """
+    checkpoint_path = output + ".progress.jsonl"
+    done = load_checkpoint(checkpoint_path)
+    if retry_errors:
+        done = {t: r for t, r in done.items() if not r.get("error")}
+    resolved = dict(resolve_ticker(t, market) for t in tickers)  # 代號 -> 市場，重複的股票只保留一次
+    todo = [t for t in resolved if t not in done]
+    print(f"共 {len(resolved)} 檔，已完成 {len(resolved) - len(todo)} 檔，本次處理 {len(todo)} 檔")
+
+    started = time.time()
+    completed = 0
+    workers = workers or os.cpu_count() or 1
+    with open(checkpoint_path, "a+", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(SharedTokenBucket(UPSTREAM_RATE, UPSTREAM_BURST),)) as pool:
+        # 上次中斷時最後一行可能沒寫完，先補上換行避免與新資料黏在一起
+        if checkpoint.tell() > 0:
+            checkpoint.seek(checkpoint.tell() - 1)
+            if checkpoint.read(1) != "\n":
+                checkpoint.write("\n")
+        futures = {
+            pool.submit(analyze_ticker, t, resolved[t], with_fundamentals, with_llm, period, interval): t
+            for t in todo
+        }
+        for future in as_completed(futures):
+            row = future.result()
+            done[row["ticker"]] = row
+            checkpoint.write(json.dumps(row, ensure_ascii=False) + "\n")
+            checkpoint.flush()
+            completed += 1
+            if completed % 50 == 0 or completed == len(todo):
+                elapsed = time.time() - started
+                print(f"  {completed}/{len(todo)}，{completed / elapsed:.1f} 檔/秒")
+
+    elapsed = time.time() - started
+    results = pd.DataFrame([done[t] for t in resolved if t in done])
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    results.to_parquet(output, index=False)
+    os.remove(checkpoint_path)  # 全部完成才移除檢查點
+
+    failed = int(results["error"].notna().sum()) if not results.empty else 0
+    return {
+        "total": len(results),
+        "processed": completed,
+        "failed": failed,
+        "seconds": elapsed,
+        "tickers_per_second": completed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整批股票技術分析")
+    parser.add_argument("tickers", nargs="*", help="股票代號")
+    parser.add_argument("--file", help="股票代號清單檔（每行一檔）")
+    parser.add_argument("--market", choices=["auto", "us", "tw"], default="auto")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "scan.parquet"), help="輸出的 Parquet 檔")
+    parser.add_argument("--period", default=DEFAULT_PERIOD, help="資料期間（yfinance 格式，例如 2mo、10y）")
+    parser.add_argument("--interval", default=DEFAULT_INTERVAL, help="K 線週期（例如 1d、5m）")
+    parser.add_argument("--workers", type=int, default=None, help="行程數（預設為 CPU 核心數）")
+    parser.add_argument("--fundamentals", action="store_true", help="一併抓取基本面資料")
+    parser.add_argument("--llm", action="store_true", help="為每檔股票產生 AI 分析（很慢）")
+    parser.add_argument("--retry-errors", action="store_true", help="重新處理檢查點中失敗的股票")
+    args = parser.parse_args()
+
+    tickers = [t.strip() for t in args.tickers]
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            tickers += [line.strip() for line in f if line.strip()]
+    if not tickers:
+        parser.error("請提供股票代號或 --file")
+
+    summary = run_scan(tickers, args.output, market=args.market, workers=args.workers,
+                       with_fundamentals=args.fundamentals, with_llm=args.llm,
+                       retry_errors=args.retry_errors, period=args.period, interval=args.interval)
+    print(f"完成 {summary['total']} 檔（失敗 {summary['failed']} 檔），"
+          f"耗時 {summary['seconds']:.1f} 秒，{summary['tickers_per_second']:.1f} 檔/秒")
+    print(f"結果：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_agent.py
+"""
+離線量測 StockAgent 各節點與整體的延遲分布及記憶體用量（不連網、不呼叫 Ollama）
+執行：python -m benchmarks.bench_agent [--iterations 50] [--output result.json]
+輸出為 JSON，可在不同 commit 之間比較
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+
+import numpy as np
+
+from benchmarks.fakes import FakeLLM, FakeMarketData, patched_agent
+
+# agent 模組中的節點函式 -> 圖中的節點名稱
+NODE_FUNCTIONS = {
+    "query_understanding_node": "query_function",
+    "stock_api_tool": "fetch_function",
+    "fundamental_fetcher": "fundamental_function",
+    "financial_analyzer": "analyze_function",
+    "response_generator": "respond",
+}
+
+
+def summarize(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def state_nbytes(state: dict) -> int:
+    """最終狀態中保留的資料表／陣列大小（位元組）"""
+    total = 0
+    for value in state.values():
+        if hasattr(value, "memory_usage"):
+            total += int(value.memory_usage(deep=True).sum())
+        elif hasattr(value, "nbytes"):
+            total += int(value.nbytes)
+    return total
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+@contextlib.contextmanager
+def timed_nodes(agent_module, timings):
+    """暫時將節點函式包上計時器"""
+    originals = {name: getattr(agent_module, name) for name in NODE_FUNCTIONS}
+
+    def wrap(fn, node):
+        @wraps(fn)
+        def inner(state):
+            start = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                timings[node].append(time.perf_counter() - start)
+        return inner
+
+    for name, node in NODE_FUNCTIONS.items():
+        setattr(agent_module, name, wrap(originals[name], node))
+    try:
+        yield
+    finally:
+        for name, fn in originals.items():
+            setattr(agent_module, name, fn)
+
+
+def run(args) -> dict:
+    market_data = FakeMarketData(rows=args.rows, fetch_latency=args.fetch_latency,
+                                 info_latency=args.info_latency)
+    llm = FakeLLM(first_token_latency=args.llm_first_token, token_latency=args.llm_token_latency)
+    timings = defaultdict(list)
+    end_to_end = []
+
+    with patched_agent(market_data, llm) as agent_module:
+        from llm_cache import LLMResponseCache
+        original_cache = agent_module.llm_cache
+        # 預設停用 LLM 快取（TTL 為 0），才量得到模型呼叫的成本
+        agent_module.llm_cache = LLMResponseCache(":memory:", ttl_seconds=3600 if args.llm_cache else 0)
+        try:
+            with timed_nodes(agent_module, timings), contextlib.redirect_stdout(io.StringIO()):
+                stock_agent = agent_module.StockAgent()
+                for i in range(args.warmup):
+                    stock_agent.analyze(args.tickers[i % len(args.tickers)])
+                timings.clear()
+
+                for i in range(args.iterations):
+                    start = time.perf_counter()
+                    stock_agent.analyze(args.tickers[i % len(args.tickers)])
+                    end_to_end.append(time.perf_counter() - start)
+                node_stats = {node: summarize(timings[node]) for node in NODE_FUNCTIONS.values()}
+
+                # 記憶體：另外執行幾次並以 tracemalloc 量測單次查詢的峰值
+                peaks = []
+                state_sizes = []
+                for i in range(args.memory_iterations):
+                    tracemalloc.start()
+                    state = stock_agent.analyze(args.tickers[i % len(args.tickers)])
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                    state_sizes.append(state_nbytes(state))
+        finally:
+            agent_module.llm_cache = original_cache
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "params": vars(args),
+        },
+        "nodes": node_stats,
+        "end_to_end": summarize(end_to_end),
+        "memory": {
+            "peak_per_query_kb": float(np.median(peaks) / 1024) if peaks else None,
+            "state_kb": float(np.median(state_sizes) / 1024) if state_sizes else None,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "upstream_calls": dict(market_data.calls),
+        "llm_calls": llm.calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StockAgent 離線效能測試")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--memory-iterations", type=int, default=5)
+    parser.add_argument("--tickers", nargs="+", default=["AAPL", "2330", "MSFT", "2454"])
+    parser.add_argument("--rows", type=int, default=42, help="每次抓取回傳的日線筆數")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="假的歷史資料延遲（秒）")
+    parser.add_argument("--info-latency", type=float, default=0.0, help="假的基本面資料延遲（秒）")
+    parser.add_argument("--llm-first-token", type=float, default=0.0, help="假的 LLM 首字延遲（秒）")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0, help="假的 LLM 每字延遲（秒）")
+    parser.add_argument("--llm-cache", action="store_true", help="啟用 LLM 回應快取")
+    parser.add_argument("--output", help="結果寫入檔案（預設輸出到 stdout）")
+    args = parser.parse_args()
+
+    result = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result + "\n")
+    else:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
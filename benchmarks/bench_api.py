@@ -0,0 +1,104 @@
+# benchmarks/bench_api.py
+"""
+離線量測 api_server 的吞吐量與延遲（假資料來源、假 LLM，不連網）
+以多條 keep-alive 連線同時送出 GET /v1/analyze，分別量測結果快取命中與未命中（每次執行分析）
+執行：python -m benchmarks.bench_api [--requests 2000] [--concurrency 32] [--tickers 20]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakeLLM, FakeMarketData, patched_agent
+
+
+async def _client(port: int, paths, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, paths, concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    shares = [paths[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(port, share, latencies, statuses) for share in shares if share))
+    elapsed = time.perf_counter() - started
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(paths),
+        "seconds": elapsed,
+        "rps": len(paths) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "statuses": statuses,
+    }
+
+
+async def bench(args) -> list:
+    from api_server import APIServer
+
+    results = []
+    with patched_agent(FakeMarketData(rows=args.rows), FakeLLM()) as agent_module, \
+            contextlib.redirect_stdout(io.StringIO()):
+        agent = agent_module.StockAgent()
+        tickers = [f"T{i:03d}" for i in range(args.tickers)]
+        paths = [f"/v1/analyze?ticker={tickers[i % len(tickers)]}" for i in range(args.requests)]
+        for name, ttl in (("cache_hit", 60.0), ("cache_miss", 0.0)):
+            server = APIServer(agent=agent, cache_ttl=ttl)
+            ready = asyncio.Event()
+            serving = asyncio.ensure_future(server.serve("127.0.0.1", 0, ready))
+            await ready.wait()
+            await run_load(server.port, paths[:len(tickers)], 1)  # 預熱：每檔先查一次
+            result = await run_load(server.port, paths, args.concurrency)
+            results.append({"mode": name, "concurrency": args.concurrency, **result})
+            serving.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await serving
+            for pool in server.pools.values():
+                pool.executor.shutdown(wait=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API 吞吐量測試")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32, help="同時連線數")
+    parser.add_argument("--tickers", type=int, default=20, help="查詢的股票檔數")
+    parser.add_argument("--rows", type=int, default=42, help="每檔股票的 K 棒數")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':>10} {'requests':>9} {'rps':>9} {'p50(ms)':>9} {'p99(ms)':>9}  statuses")
+    for r in results:
+        print(f"{r['mode']:>10} {r['requests']:>9} {r['rps']:>9.0f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}  "
+              f"{r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
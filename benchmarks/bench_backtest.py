@@ -0,0 +1,53 @@
+# benchmarks/bench_backtest.py
+"""
+回測參數掃描的耗時：多檔股票 × 多組參數（預設 1000 檔、10 年日線、100 組參數）
+執行：python -m benchmarks.bench_backtest [--rows 2520] [--tickers 1000]
+"""
+
+import argparse
+import json
+import time
+
+from backtest import param_grid, run_backtest, summarize
+from benchmarks.bench_panel_indicators import random_closes
+
+
+def default_grid():
+    """三種規則共 100 組參數"""
+    return (param_grid("ma", ma_fast=[3, 5, 8, 10, 13], ma_slow=[20, 30, 60, 90, 120, 240])
+            + param_grid("rsi", rsi_low=[15, 20, 25, 30, 35, 40], rsi_high=[60, 65, 70, 75, 80, 85])
+            + param_grid("bb", bb_std=[round(1.0 + 0.1 * i, 1) for i in range(34)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回測參數掃描效能測試")
+    parser.add_argument("--rows", type=int, default=2520, help="每檔股票的日線筆數（預設 10 年）")
+    parser.add_argument("--tickers", type=int, default=1000, help="股票檔數")
+    parser.add_argument("--cost", type=float, default=0.002, help="每次買進或賣出的成本比例")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    closes = random_closes(args.rows, args.tickers)
+    grid = default_grid()
+    start = time.perf_counter()
+    results = run_backtest(closes, grid, cost=args.cost)
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+    report = {
+        "tickers": args.tickers,
+        "rows": args.rows,
+        "params": len(grid),
+        "seconds": elapsed,
+        "ticker_params_per_second": args.tickers * len(grid) / elapsed,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.tickers} 檔 × {args.rows} 筆日線 × {len(grid)} 組參數：{elapsed:.2f} 秒"
+          f"（每秒 {report['ticker_params_per_second']:,.0f} 檔·組）")
+    print(summary.sort_values("median_return", ascending=False).head(10).round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
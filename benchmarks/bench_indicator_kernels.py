@@ -0,0 +1,156 @@
+# benchmarks/bench_indicator_kernels.py
+"""
+比較 indicator_kernels 的 NumPy 核心與等價的 pandas 寫法（10 年日線）
+量測每個指標的耗時、計算期間配置的記憶體峰值（tracemalloc）與數值差異
+執行：python -m benchmarks.bench_indicator_kernels [--rows 2520] [--tickers 200]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bars import Bars
+from benchmarks.fakes import synthetic_ohlcv
+from indicator_kernels import (ATR_WINDOW, EMA_SPANS, INDICATORS, KDJ_INIT, KDJ_WINDOW, MACD_FAST,
+                               MACD_SIGNAL, MACD_SLOW, compute_into, output_columns)
+
+TEN_YEARS = 2520
+
+
+# ---- 等價的 pandas 寫法 ----
+def pandas_ema(df: pd.DataFrame) -> dict:
+    return {f"EMA_{s}": df["Close"].ewm(span=s, adjust=False).mean() for s in EMA_SPANS}
+
+
+def pandas_macd(df: pd.DataFrame) -> dict:
+    fast = df["Close"].ewm(span=MACD_FAST, adjust=False).mean()
+    slow = df["Close"].ewm(span=MACD_SLOW, adjust=False).mean()
+    macd = fast - slow
+    signal = macd.ewm(span=MACD_SIGNAL, adjust=False).mean()
+    return {"MACD": macd, "MACD_Signal": signal, "MACD_Hist": macd - signal}
+
+
+def _smooth(values: pd.Series, init: float) -> pd.Series:
+    # K = 2/3 前值 + 1/3 今值，前值起始為 init：在序列前補一筆 init 後做 ewm
+    padded = pd.concat([pd.Series([init]), values], ignore_index=True)
+    return padded.ewm(alpha=1 / 3, adjust=False).mean().iloc[1:].set_axis(values.index)
+
+
+def pandas_kdj(df: pd.DataFrame) -> dict:
+    low = df["Low"].rolling(KDJ_WINDOW, min_periods=1).min()
+    high = df["High"].rolling(KDJ_WINDOW, min_periods=1).max()
+    span = high - low
+    rsv = ((df["Close"] - low) / span * 100).where(span != 0, KDJ_INIT)
+    k = _smooth(rsv, KDJ_INIT)
+    d = _smooth(k, KDJ_INIT)
+    return {"KDJ_K": k, "KDJ_D": d, "KDJ_J": 3 * k - 2 * d}
+
+
+def pandas_atr(df: pd.DataFrame) -> dict:
+    prev_close = df["Close"].shift()
+    tr = pd.concat([df["High"] - df["Low"], (df["High"] - prev_close).abs(),
+                    (df["Low"] - prev_close).abs()], axis=1).max(axis=1)
+    return {f"ATR_{ATR_WINDOW}": tr.ewm(alpha=1 / ATR_WINDOW, adjust=False).mean()}
+
+
+def pandas_obv(df: pd.DataFrame) -> dict:
+    direction = np.sign(df["Close"].diff()).fillna(0)
+    return {"OBV": (direction * df["Volume"]).cumsum()}
+
+
+PANDAS = {"EMA": pandas_ema, "MACD": pandas_macd, "KDJ": pandas_kdj, "ATR": pandas_atr, "OBV": pandas_obv}
+
+
+def run_kernels(bars_list, names):
+    # 輸出欄位已預留在 Bars 緩衝區，只量測計算本身
+    for bars in bars_list:
+        compute_into(bars, bars, names)
+    return bars
+
+
+def run_pandas(frames, names):
+    result = {}
+    for df in frames:
+        result = {}
+        for name in names:
+            result.update(PANDAS[name](df))
+    return result
+
+
+def measure(fn, *args, repeat: int = 3):
+    """回傳 (最佳耗時, tracemalloc 峰值 bytes, 結果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def max_abs_diff(bars: Bars, expected: dict) -> float:
+    worst = 0.0
+    for col, series in expected.items():
+        want = series.to_numpy(dtype=np.float64)
+        got = bars[col]
+        if not np.array_equal(np.isnan(want), np.isnan(got)):
+            return float("inf")
+        mask = ~np.isnan(want)
+        if mask.any():
+            scale = max(1.0, float(np.max(np.abs(want[mask]))))
+            worst = max(worst, float(np.max(np.abs(want[mask] - got[mask]))) / scale)
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="進階技術指標核心效能測試")
+    parser.add_argument("--rows", type=int, default=TEN_YEARS, help="每檔股票的日線筆數（預設 10 年）")
+    parser.add_argument("--tickers", type=int, default=200, help="逐檔計算的股票檔數")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    frames = [synthetic_ohlcv(f"T{i}", args.rows, seed=i) for i in range(args.tickers)]
+    bars_list = [Bars.from_frame(df, extra_columns=output_columns(INDICATORS)) for df in frames]
+    results = []
+    for name in list(INDICATORS) + ["ALL"]:
+        names = list(INDICATORS) if name == "ALL" else [name]
+        kernel_s, kernel_peak, bars = measure(run_kernels, bars_list[-1:], names)
+        pandas_s, pandas_peak, expected = measure(run_pandas, frames[-1:], names)
+        kernel_many, _, _ = measure(run_kernels, bars_list, names, repeat=1)
+        pandas_many, _, _ = measure(run_pandas, frames, names, repeat=1)
+        results.append({
+            "indicator": name,
+            "rows": args.rows,
+            "kernel_ms": kernel_s * 1000,
+            "pandas_ms": pandas_s * 1000,
+            "speedup": pandas_s / kernel_s if kernel_s else float("inf"),
+            "kernel_peak_kb": kernel_peak / 1024,
+            "pandas_peak_kb": pandas_peak / 1024,
+            "tickers": args.tickers,
+            "kernel_all_tickers_s": kernel_many,
+            "pandas_all_tickers_s": pandas_many,
+            "max_rel_diff": max_abs_diff(bars, expected),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.rows} 筆日線；核心的輸出寫入預留的 Bars 欄位，峰值記憶體只含暫存區")
+    print(f"{'indicator':>9} {'kernel(ms)':>11} {'pandas(ms)':>11} {'speedup':>8} "
+          f"{'kernel KB':>10} {'pandas KB':>10} {f'{args.tickers} tickers(s)':>20} {'max diff':>9}")
+    for r in results:
+        many = f"{r['kernel_all_tickers_s']:.3f} / {r['pandas_all_tickers_s']:.3f}"
+        print(f"{r['indicator']:>9} {r['kernel_ms']:>11.3f} {r['pandas_ms']:>11.3f} {r['speedup']:>7.1f}x "
+              f"{r['kernel_peak_kb']:>10.0f} {r['pandas_peak_kb']:>10.0f} {many:>20} {r['max_rel_diff']:>9.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_panel_indicators.py
+"""
+比較逐檔呼叫 compute_technical_indicators 與 compute_panel_indicators 的耗時
+執行：python -m benchmarks.bench_panel_indicators [--rows 250] [--sizes 1 100 2000]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from panel_indicators import compute_panel_indicators
+from stock_utils import compute_technical_indicators
+
+COLUMNS = ["MA_5", "MA_20", "MA_60", "RSI_14", "BB_Middle", "BB_Upper", "BB_Lower"]
+
+
+def random_closes(rows: int, n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, size=(rows, n))
+    closes = 100 * np.exp(np.cumsum(returns, axis=0))
+    # 部分股票較晚上市，前段為 NaN
+    late = rng.random(n) < 0.1
+    starts = rng.integers(0, rows, size=n)
+    for j in np.flatnonzero(late):
+        closes[:starts[j], j] = np.nan
+    return closes
+
+
+def run_loop(closes: np.ndarray):
+    out = []
+    with contextlib.redirect_stdout(io.StringIO()):  # 忽略資料不足的警告訊息
+        for j in range(closes.shape[1]):
+            col = closes[:, j]
+            first = np.argmax(~np.isnan(col)) if not np.isnan(col).all() else len(col)
+            out.append(compute_technical_indicators(pd.DataFrame({"Close": col[first:]})))
+    return out
+
+
+def max_abs_diff(closes, loop_result, panel_result) -> float:
+    worst = 0.0
+    for j, df in enumerate(loop_result):
+        offset = closes.shape[0] - len(df)
+        for col in COLUMNS:
+            expected = df[col].to_numpy()
+            actual = panel_result[col][offset:, j]
+            if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+                return float("inf")
+            mask = ~np.isnan(expected)
+            if mask.any():
+                worst = max(worst, float(np.max(np.abs(expected[mask] - actual[mask]))))
+    return worst
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="面板技術指標效能測試")
+    parser.add_argument("--rows", type=int, default=250, help="每檔股票的日線筆數")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 2000], help="股票檔數")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        closes = random_closes(args.rows, n)
+        loop_s, loop_result = timed(run_loop, closes, repeat=1 if n > 100 else 3)
+        panel_s, panel_result = timed(compute_panel_indicators, closes)
+        results.append({
+            "tickers": n,
+            "rows": args.rows,
+            "loop_seconds": loop_s,
+            "panel_seconds": panel_s,
+            "speedup": loop_s / panel_s if panel_s else float("inf"),
+            "max_abs_diff": max_abs_diff(closes, loop_result, panel_result),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'tickers':>8} {'loop(s)':>10} {'panel(s)':>10} {'speedup':>9} {'max diff':>10}")
+    for r in results:
+        print(f"{r['tickers']:>8} {r['loop_seconds']:>10.4f} {r['panel_seconds']:>10.4f} "
+              f"{r['speedup']:>8.1f}x {r['max_abs_diff']:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/fakes.py
+"""
+離線測試用的假資料與假服務：合成 OHLCV、假的 yfinance 抓取函式、假的 LLM
+"""
+
+import json
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_ohlcv(ticker: str, rows: int = 42, seed: int = None, tz: str = "America/New_York",
+                    end: str = "2025-06-06") -> pd.DataFrame:
+    """
+    產生與 fetch_tw_stock 相同欄位的合成日線資料（幾何隨機漫步）
+    同一檔股票在相同參數下結果固定
+    """
+    if seed is None:
+        seed = zlib.crc32(ticker.encode("utf-8"))
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=rows, tz=tz, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+    open_ = close * np.exp(rng.normal(0, 0.005, rows))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, rows)))
+    volume = rng.integers(1_000_000, 50_000_000, rows)
+    return pd.DataFrame({
+        "Date": dates,
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Volume": volume,
+    })
+
+
+class FakeMarketData:
+    """
+    取代 fetch_us_stock / fetch_tw_stock / get_fundamental_data 的假資料來源
+    可設定每次呼叫的延遲，並記錄呼叫次數
+    """
+
+    def __init__(self, rows: int = 42, fetch_latency: float = 0.0, info_latency: float = 0.0):
+        self.rows = rows
+        self.fetch_latency = fetch_latency
+        self.info_latency = info_latency
+        self.calls = {"history": 0, "info": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def fetch_us_stock(self, ticker: str, period: str = "2mo", interval: str = "1d") -> pd.DataFrame:
+        self._count("history")
+        time.sleep(self.fetch_latency)
+        return synthetic_ohlcv(ticker, self.rows)
+
+    def fetch_tw_stock(self, ticker: str, *args, **kwargs) -> pd.DataFrame:
+        self._count("history")
+        time.sleep(self.fetch_latency)
+        return synthetic_ohlcv(ticker, self.rows, tz="Asia/Taipei")
+
+    def get_fundamental_data(self, ticker: str, market: str) -> dict:
+        self._count("info")
+        time.sleep(self.info_latency)
+        return {
+            'pe_ratio': 25.3,
+            'market_cap': 2.5e12,
+            'dividend_yield': 0.005,
+            'revenue_growth': 0.08,
+            'profit_margin': 0.25,
+            'debt_to_equity': 150.0,
+            'book_value': 4.4,
+            'price_to_book': 45.0,
+            'sector': 'Technology',
+            'industry': 'Consumer Electronics',
+        }
+
+
+FAKE_REPLY = "根據目前的技術指標，股價處於短期上升趨勢，但RSI接近超買區，建議分批布局並設好停損。"
+
+
+class FakeLLM:
+    """
+    取代 stream_chatglm 的假模型：先等待 first_token_latency，之後每個字間隔 token_latency
+    """
+
+    def __init__(self, first_token_latency: float = 0.0, token_latency: float = 0.0, reply: str = FAKE_REPLY):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.reply = reply
+        self.calls = 0
+
+    def stream(self, prompt: str, model: str = None) -> Iterator[str]:
+        self.calls += 1
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self.reply):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
+
+    def call(self, prompt: str, model: str = None) -> str:
+        return "".join(self.stream(prompt, model)).strip()
+
+
+@contextmanager
+def patched_agent(market_data: FakeMarketData, llm: FakeLLM):
+    """
+    暫時以假資料來源與假模型取代 agent 模組中的外部相依
+    需在 build_stock_agent() 之前進入
+    """
+    import agent
+    originals = {name: getattr(agent, name) for name in
+                 ("fetch_us_stock", "fetch_tw_stock", "get_fundamental_data", "stream_chatglm")}
+    agent.fetch_us_stock = market_data.fetch_us_stock
+    agent.fetch_tw_stock = market_data.fetch_tw_stock
+    agent.get_fundamental_data = market_data.get_fundamental_data
+    agent.stream_chatglm = llm.stream
+    try:
+        yield agent
+    finally:
+        for name, value in originals.items():
+            setattr(agent, name, value)
+
+
+class StubOllamaServer:
+    """
+    模擬 Ollama /api/generate 的本機 HTTP 服務（NDJSON 串流），供 OllamaClient 離線測試
+    """
+
+    def __init__(self, llm: FakeLLM = None, host: str = "127.0.0.1", port: int = 0):
+        llm = llm or FakeLLM()
+        self.requests = 0
+        self.connections = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                stub.requests += 1
+                stub.connections.add(self.client_address)
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in llm.stream(payload.get("prompt", "")):
+                    self._chunk({"model": payload.get("model"), "response": token, "done": False})
+                self._chunk({"model": payload.get("model"), "response": "", "done": True})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, obj):
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
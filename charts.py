@@ -0,0 +1,201 @@
+# charts.py
+
+import io
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from metrics import metrics
+
+CHART_TYPES = ("price", "rsi", "bollinger")
+# 各圖表使用的欄位（最後一根 K 棒的這些值相同時，圖表不需重畫）
+CHART_COLUMNS = {
+    "price": ("Close", "MA_5", "MA_20", "MA_60"),
+    "rsi": ("RSI_14",),
+    "bollinger": ("Close", "BB_Upper", "BB_Middle", "BB_Lower"),
+}
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _new_axes(figsize):
+    # 不經過 pyplot，圖表不會留在全域的 figure 登錄表中
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def _finish(fig, ax, fmt: str) -> bytes:
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    # 自動調整日期標籤角度
+    for label in ax.xaxis.get_majorticklabels():
+        label.set_rotation(45)
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    fig.clear()
+    return buf.getvalue()
+
+
+def _plot_price(df_ind: pd.DataFrame, ticker: str, fmt: str) -> bytes:
+    fig, ax1 = _new_axes((10, 6))
+
+    # 繪製股價和移動平均線
+    ax1.plot(df_ind.index, df_ind["Close"],
+             label="Closing Price", linewidth=2, color='#1f77b4')
+    if "MA_5" in df_ind.columns:
+        ax1.plot(df_ind.index, df_ind["MA_5"],
+                 label="MA5", linestyle="--", alpha=0.8, color='orange')
+    if "MA_20" in df_ind.columns:
+        ax1.plot(df_ind.index, df_ind["MA_20"],
+                 label="MA20", linestyle="--", alpha=0.8, color='green')
+    if "MA_60" in df_ind.columns:
+        ax1.plot(df_ind.index, df_ind["MA_60"],
+                 label="MA60", linestyle="--", alpha=0.8, color='red')
+
+    ax1.set_title(f"{ticker}", fontsize=14, fontweight='bold')
+    ax1.set_xlabel("Date")
+    ax1.set_ylabel("Price")
+    return _finish(fig, ax1, fmt)
+
+
+def _plot_rsi(df_ind: pd.DataFrame, ticker: str, fmt: str) -> bytes:
+    fig, ax2 = _new_axes((10, 6))
+
+    ax2.plot(df_ind.index, df_ind["RSI_14"],
+             label="RSI(14)", linewidth=2, color='purple')
+    # 超買超賣線
+    ax2.axhline(70, color="red", linestyle="--", alpha=0.7, label="Overbought Line(70)")
+    ax2.axhline(30, color="green", linestyle="--", alpha=0.7, label="Oversold Line(30)")
+
+    ax2.set_title("RSI", fontsize=14, fontweight='bold')
+    ax2.set_xlabel("Date")
+    ax2.set_ylabel("RSI")
+    ax2.set_ylim(0, 100)
+    return _finish(fig, ax2, fmt)
+
+
+def _plot_bollinger(df_ind: pd.DataFrame, ticker: str, fmt: str) -> bytes:
+    fig, ax3 = _new_axes((12, 6))
+
+    # 繪製布林通道
+    ax3.plot(df_ind.index, df_ind["Close"],
+             label="Closing Price", linewidth=2, color='blue')
+    ax3.plot(df_ind.index, df_ind["BB_Upper"],
+             label="Upper Band", linestyle="--", alpha=0.8, color='red')
+    ax3.plot(df_ind.index, df_ind["BB_Middle"],
+             label="Middle Band(MA20)", linestyle="-", alpha=0.8, color='orange')
+    ax3.plot(df_ind.index, df_ind["BB_Lower"],
+             label="Lower Band", linestyle="--", alpha=0.8, color='green')
+    # 填充布林通道
+    ax3.fill_between(df_ind.index, df_ind["BB_Upper"], df_ind["BB_Lower"],
+                     alpha=0.1, color='gray')
+    ax3.set_title("Bollinger Bands", fontsize=14, fontweight='bold')
+    ax3.set_xlabel("Day")
+    ax3.set_ylabel("Price")
+    return _finish(fig, ax3, fmt)
+
+
+_PLOTTERS = {
+    "price": _plot_price,
+    "rsi": _plot_rsi,
+    "bollinger": _plot_bollinger,
+}
+
+
+def has_chart(df_ind: pd.DataFrame, kind: str) -> bool:
+    """
+    判斷資料是否足以繪製指定圖表
+    """
+    if df_ind is None or df_ind.empty:
+        return False
+    if kind == "rsi":
+        return "RSI_14" in df_ind.columns and not np.isnan(np.asarray(df_ind["RSI_14"], dtype=float)).all()
+    if kind == "bollinger":
+        return all(col in df_ind.columns for col in ["BB_Upper", "BB_Middle", "BB_Lower"])
+    return "Close" in df_ind.columns
+
+
+class ChartCache:
+    """
+    已繪製圖表的 LRU 快取，以 (股票代號, 最後一根 K 棒時間, 資料筆數, 圖表類型, 格式, 最後一根的圖表欄位值) 為鍵
+    相同資料重複查看時不需再經過 matplotlib；即時模式中最後一根 K 棒的報價變動時，
+    只有用到變動欄位的圖表會重畫
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(df_ind: pd.DataFrame, ticker: str, kind: str, fmt: str) -> tuple:
+        if "Date" in df_ind.columns:
+            last_bar = np.asarray(df_ind["Date"])[-1]
+        else:
+            last_bar = df_ind.index[-1]
+        # NaN 轉為 None，才能作為相同的鍵
+        last_values = tuple(
+            None if np.isnan(value) else value
+            for value in (float(np.asarray(df_ind[c], dtype=float)[-1])
+                          for c in CHART_COLUMNS.get(kind, ()) if c in df_ind.columns))
+        return (ticker.upper(), str(last_bar), len(df_ind), kind, fmt, last_values)
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                metrics.inc("cache_requests_total", cache="chart", result="miss")
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            metrics.inc("cache_requests_total", cache="chart", result="hit")
+            return data
+
+    def set(self, key: tuple, data: bytes):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+chart_cache = ChartCache()
+
+
+def render_chart(df_ind: pd.DataFrame, ticker: str, kind: str, fmt: str = "png",
+                 cache: Optional[ChartCache] = chart_cache) -> bytes:
+    """
+    繪製技術分析圖表並回傳圖片位元組（png 或 svg），結果會被快取
+    Args:
+        df_ind: 含技術指標的 DataFrame 或 Bars
+        ticker: 股票代號（圖表標題與快取鍵）
+        kind: "price"、"rsi" 或 "bollinger"
+    """
+    if kind not in _PLOTTERS:
+        raise ValueError(f"不支援的圖表類型：{kind}")
+    key = ChartCache.make_key(df_ind, ticker, kind, fmt) if cache is not None else None
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    with metrics.timer("call_duration_seconds", op=f"render_{kind}"):
+        data = _PLOTTERS[kind](df_ind, ticker, fmt)
+    if cache is not None:
+        cache.set(key, data)
+    return data
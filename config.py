@@ -0,0 +1,46 @@
+# config.py
+
+import os
+
+# 本機資料目錄（價格資料庫、快取等），可用環境變數覆寫
+DATA_DIR = os.environ.get(
+    "FINANCE_AGENT_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+)
+
+# 預設的資料期間與 K 線週期（yfinance 格式）
+DEFAULT_PERIOD = os.environ.get("FINANCE_AGENT_PERIOD", "2mo")
+DEFAULT_INTERVAL = os.environ.get("FINANCE_AGENT_INTERVAL", "1d")
+
+# 對 Yahoo Finance 的請求速率上限（每秒次數、可累積的突發次數、排隊等候上限秒數）
+UPSTREAM_RATE = float(os.environ.get("FINANCE_AGENT_UPSTREAM_RATE", "2"))
+UPSTREAM_BURST = int(os.environ.get("FINANCE_AGENT_UPSTREAM_BURST", "5"))
+UPSTREAM_TIMEOUT = float(os.environ.get("FINANCE_AGENT_UPSTREAM_TIMEOUT", "30"))
+
+# 本機 LLM（Ollama）服務設定
+OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_MODEL = os.environ.get("FINANCE_AGENT_LLM_MODEL", "EntropyYue/chatglm3")
+LLM_CONNECT_TIMEOUT = float(os.environ.get("FINANCE_AGENT_LLM_CONNECT_TIMEOUT", "2"))
+LLM_READ_TIMEOUT = float(os.environ.get("FINANCE_AGENT_LLM_READ_TIMEOUT", "120"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("FINANCE_AGENT_LLM_MAX_CONCURRENCY", "2"))
+
+# LLM 工作佇列：同時執行的模型呼叫數、等候中的工作上限、
+# 互動查詢等候開始產生的秒數（逾時改回傳不含 AI 分析的報告）、
+# batch 工作合併送出的數量（需與 Ollama 的 OLLAMA_NUM_PARALLEL 搭配，1 表示不合併）
+LLM_WORKERS = int(os.environ.get("FINANCE_AGENT_LLM_WORKERS", "1"))
+LLM_QUEUE_SIZE = int(os.environ.get("FINANCE_AGENT_LLM_QUEUE_SIZE", "16"))
+LLM_QUEUE_DEADLINE = float(os.environ.get("FINANCE_AGENT_LLM_QUEUE_DEADLINE", "20"))
+LLM_BATCH_SIZE = int(os.environ.get("FINANCE_AGENT_LLM_BATCH_SIZE", "1"))
+
+# HTTP API（api_server.py）：監聽位址（沒有驗證，預設只接受本機連線，0.0.0.0 才對外開放）、分析用執行緒數、等候 LLM 的執行緒數、
+# 排隊與執行中的分析工作上限（超過回傳 503）、每個請求的期限上限（秒）、結果快取秒數、整批查詢的檔數上限
+API_HOST = os.environ.get("FINANCE_AGENT_API_HOST", "127.0.0.1")
+API_WORKERS = int(os.environ.get("FINANCE_AGENT_API_WORKERS", "8"))
+API_LLM_WORKERS = int(os.environ.get("FINANCE_AGENT_API_LLM_WORKERS", "16"))
+API_MAX_PENDING = int(os.environ.get("FINANCE_AGENT_API_MAX_PENDING", "256"))
+API_DEADLINE = float(os.environ.get("FINANCE_AGENT_API_DEADLINE", "30"))
+API_CACHE_TTL = float(os.environ.get("FINANCE_AGENT_API_CACHE_TTL", "60"))
+API_BATCH_LIMIT = int(os.environ.get("FINANCE_AGENT_API_BATCH_LIMIT", "50"))
+
+# 即時模式（app.py）：檢查新 K 棒的間隔秒數
+LIVE_REFRESH_SECONDS = float(os.environ.get("FINANCE_AGENT_LIVE_REFRESH", "60"))
@@ -0,0 +1,251 @@
+# fetch_gateway.py
+"""
+上游資料請求閘道
+- 單一飛行（single-flight）：同時間相同參數的請求只執行一次，其餘等待並共用結果
+- 權杖桶限速：所有對 Yahoo 的實際請求共用每秒次數上限，超過時排隊
+StockAgent 由所有 Streamlit 工作階段共用，熱門股票同時被查詢時不會對上游重複發送請求
+"""
+
+import inspect
+import multiprocessing
+import threading
+import time
+from functools import wraps
+from typing import Optional
+
+import pandas as pd
+
+from config import UPSTREAM_BURST, UPSTREAM_RATE, UPSTREAM_TIMEOUT
+from metrics import metrics
+
+
+class UpstreamBusyError(RuntimeError):
+    """等候限速權杖逾時"""
+
+
+class TokenBucket:
+    """
+    權杖桶：每秒補充 rate 個權杖，最多累積 burst 個；rate <= 0 表示不限速
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self.waiting = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        取得一個權杖，回傳等候的秒數；timeout 內取不到時拋出 UpstreamBusyError
+        """
+        if self.rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            self.waiting += 1
+            metrics.set_gauge("upstream_queue_depth", self.waiting)
+            try:
+                waited = False
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return now - start if waited else 0.0
+                    wait = (1 - self._tokens) / self.rate
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise UpstreamBusyError(f"上游請求排隊超過 {timeout:g} 秒")
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+                    waited = True
+            finally:
+                self.waiting -= 1
+                metrics.set_gauge("upstream_queue_depth", self.waiting)
+
+    def set_rate(self, rate: float, burst: Optional[int] = None):
+        with self._cond:
+            self._refill(time.monotonic())
+            self.rate = rate
+            if burst is not None:
+                self.burst = max(1, burst)
+                self._tokens = min(self._tokens, self.burst)
+            self._cond.notify_all()
+
+
+class SharedTokenBucket:
+    """
+    多行程共用的權杖桶：權杖數、更新時間與等候中的請求數放在共享記憶體，速率與突發上限由所有行程共同遵守
+    （batch_scan 的子行程各自建桶時，突發次數會變成行程數倍）
+    需在建立子行程時傳入（例如 ProcessPoolExecutor 的 initargs），不能經由佇列傳遞
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        # [權杖數, 更新時間, 等候中的請求數（所有行程合計）]
+        self._state = multiprocessing.Array("d", [float(self.burst), time.monotonic(), 0.0])
+
+    @property
+    def waiting(self) -> int:
+        return int(self._state[2])
+
+    def _add_waiting(self, n: int):
+        with self._state.get_lock():
+            self._state[2] += n
+            waiting = int(self._state[2])
+        metrics.set_gauge("upstream_queue_depth", waiting)
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        同 TokenBucket.acquire；等候時不持有鎖，其他行程可以繼續取權杖
+        """
+        if self.rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        self._add_waiting(1)
+        try:
+            waited = False
+            while True:
+                with self._state.get_lock():
+                    now = time.monotonic()
+                    tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate)
+                    self._state[1] = now
+                    if tokens >= 1:
+                        self._state[0] = tokens - 1
+                        return now - start if waited else 0.0
+                    self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+                if deadline is not None:
+                    if now >= deadline:
+                        raise UpstreamBusyError(f"上游請求排隊超過 {timeout:g} 秒")
+                    wait = min(wait, deadline - now)
+                time.sleep(wait)
+                waited = True
+        finally:
+            self._add_waiting(-1)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    相同 key 的並行呼叫只執行一次
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        回傳 (結果, 是否由本次呼叫執行)；執行失敗時所有等待者都收到相同的例外
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                metrics.set_gauge("inflight_requests", len(self._calls))
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                metrics.set_gauge("inflight_requests", len(self._calls))
+            call.done.set()
+        return call.result, True
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def _copy(value):
+    # 共用結果給其他呼叫者時複製一份，避免彼此修改
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class FetchGateway:
+    def __init__(self, rate: float = UPSTREAM_RATE, burst: int = UPSTREAM_BURST,
+                 timeout: float = UPSTREAM_TIMEOUT):
+        self.bucket = TokenBucket(rate, burst)
+        self.flight = SingleFlight()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.throttled = 0
+
+    def coalesce(self, op: str):
+        """
+        函式裝飾器：以 (op, 參數) 為鍵合併並行的相同呼叫
+        """
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (op, tuple(bound.arguments.items()))
+                result, leader = self.flight.do(key, lambda: fn(*args, **kwargs))
+                if leader:
+                    return result
+                with self._lock:
+                    self.coalesced += 1
+                metrics.inc("coalesced_requests_total", op=op)
+                return _copy(result)
+            return wrapper
+        return decorator
+
+    def throttle(self, source: str):
+        """
+        對上游發送請求前呼叫：取得限速權杖（必要時排隊）
+        """
+        waited = self.bucket.acquire(self.timeout)
+        metrics.observe("upstream_wait_seconds", waited, source=source)
+        if waited > 0:
+            with self._lock:
+                self.throttled += 1
+            metrics.inc("upstream_throttled_total", source=source)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "inflight": self.flight.inflight(),
+                "queue_depth": self.bucket.waiting,
+                "coalesced": self.coalesced,
+                "throttled": self.throttled,
+                "rate": self.bucket.rate,
+            }
+
+
+# 模組層級共用實例
+gateway = FetchGateway()
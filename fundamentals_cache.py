@@ -0,0 +1,209 @@
+# fundamentals_cache.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config import DATA_DIR
+from metrics import metrics
+
+FUNDAMENTALS_PATH = os.path.join(DATA_DIR, "fundamentals.sqlite")
+
+DAY = 24 * 3600
+# 各欄位的有效期限（秒）：價格相關每日更新，財報相關按季，產業分類很少變動
+FIELD_TTLS = {
+    "pe_ratio": DAY,
+    "market_cap": DAY,
+    "price_to_book": DAY,
+    "dividend_yield": 7 * DAY,
+    "revenue_growth": 30 * DAY,
+    "profit_margin": 30 * DAY,
+    "debt_to_equity": 30 * DAY,
+    "book_value": 30 * DAY,
+    "sector": 90 * DAY,
+    "industry": 90 * DAY,
+}
+DEFAULT_TTL = DAY
+
+
+class FundamentalsCache:
+    """
+    基本面資料快取，以 (market, ticker) 為鍵、各欄位有獨立的 TTL
+    - 全部欄位都沒有資料時才同步向上游抓取
+    - 有過期欄位時先回傳舊值，並在背景更新（不佔用查詢時間）
+    - bulk_refresh 以有限的執行緒池批次更新整個股票池
+    """
+
+    def __init__(self, fetcher: Callable[[str, str], dict], path: str = FUNDAMENTALS_PATH,
+                 field_ttls: Optional[Dict[str, float]] = None, background_workers: int = 2):
+        self.fetcher = fetcher
+        self.path = path
+        self.field_ttls = dict(FIELD_TTLS if field_ttls is None else field_ttls)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._inflight = set()
+        self._background = ThreadPoolExecutor(max_workers=background_workers,
+                                              thread_name_prefix="fundamentals-refresh")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fundamentals ("
+                " market TEXT NOT NULL,"
+                " ticker TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (market, ticker, field))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self, ticker: str, market: str) -> Dict[str, Tuple[object, float]]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT field, value, fetched_at FROM fundamentals WHERE market = ? AND ticker = ?",
+                (market, ticker.upper()),
+            ).fetchall()
+        return {field: (json.loads(value), fetched_at) for field, value, fetched_at in rows}
+
+    def _store(self, ticker: str, market: str, data: dict):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO fundamentals (market, ticker, field, value, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(market, ticker.upper(), field, json.dumps(value, default=str), now)
+                 for field, value in data.items()],
+            )
+            conn.commit()
+
+    def _stale_fields(self, cached: Dict[str, Tuple[object, float]], now: float):
+        return [field for field, (_, fetched_at) in cached.items()
+                if now - fetched_at > self.field_ttls.get(field, DEFAULT_TTL)]
+
+    def is_stale(self, ticker: str, market: str) -> bool:
+        cached = self._load(ticker, market)
+        return not cached or bool(self._stale_fields(cached, time.time()))
+
+    def refresh(self, ticker: str, market: str) -> dict:
+        """
+        向上游重新抓取並寫入快取
+        """
+        data = self.fetcher(ticker, market)
+        self._store(ticker, market, data)
+        return data
+
+    def _refresh_in_background(self, ticker: str, market: str):
+        key = (market, ticker.upper())
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def job():
+            try:
+                self.refresh(ticker, market)
+            except Exception as e:
+                print(f"背景更新 {ticker} 基本面資料失敗：{e}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+        self._background.submit(job)
+
+    def get(self, ticker: str, market: str) -> dict:
+        """
+        讀取基本面資料；本機沒有資料時才會同步呼叫上游
+        """
+        cached = self._load(ticker, market)
+        if not cached:
+            self.misses += 1
+            metrics.inc("cache_requests_total", cache="fundamentals", result="miss")
+            return self.refresh(ticker, market)
+        if self._stale_fields(cached, time.time()):
+            self.stale += 1
+            metrics.inc("cache_requests_total", cache="fundamentals", result="stale")
+            self._refresh_in_background(ticker, market)
+        else:
+            self.hits += 1
+            metrics.inc("cache_requests_total", cache="fundamentals", result="hit")
+        return {field: value for field, (value, _) in cached.items()}
+
+    def bulk_refresh(self, universe: Iterable[Tuple[str, str]], max_workers: int = 8,
+                     only_stale: bool = True) -> dict:
+        """
+        批次更新整個股票池
+        Args:
+            universe: (ticker, market) 的序列
+            max_workers: 同時向上游請求的上限
+            only_stale: 只更新有過期欄位的股票
+        Returns:
+            dict: 更新、略過、失敗的檔數與耗時
+        """
+        started = time.time()
+        universe = list(universe)
+        targets = [(t, m) for t, m in universe if not only_stale or self.is_stale(t, m)]
+        failed = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(self.refresh, t, m): (t, m) for t, m in targets}
+            for future in as_completed(futures):
+                ticker, _ = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[ticker] = str(e)
+        return {
+            "refreshed": len(targets) - len(failed),
+            "skipped": len(universe) - len(targets),
+            "failed": failed,
+            "seconds": time.time() - started,
+        }
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "stale": self.stale, "misses": self.misses}
+
+
+def main():
+    """
+    批次更新基本面快取，例：
+    python fundamentals_cache.py --market us AAPL MSFT TSLA
+    python fundamentals_cache.py --market tw --file tw_tickers.txt
+    """
+    import argparse
+    from stock_utils import fundamentals_cache
+
+    parser = argparse.ArgumentParser(description="批次更新基本面資料快取")
+    parser.add_argument("tickers", nargs="*", help="股票代號")
+    parser.add_argument("--market", choices=["us", "tw"], required=True)
+    parser.add_argument("--file", help="股票代號清單檔（每行一檔）")
+    parser.add_argument("--workers", type=int, default=8, help="同時請求上限")
+    parser.add_argument("--all", action="store_true", help="忽略 TTL，全部重新抓取")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            tickers += [line.strip() for line in f if line.strip()]
+    summary = fundamentals_cache.bulk_refresh(
+        [(t, args.market) for t in tickers], max_workers=args.workers, only_stale=not args.all
+    )
+    print(f"更新 {summary['refreshed']} 檔，略過 {summary['skipped']} 檔，"
+          f"失敗 {len(summary['failed'])} 檔，耗時 {summary['seconds']:.1f} 秒")
+    for ticker, error in summary["failed"].items():
+        print(f"  {ticker}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# indicator_engine.py
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# 與 compute_technical_indicators 相同的參數
+MA_WINDOWS = (5, 20, 60)
+RSI_WINDOW = 14
+BB_WINDOW = 20
+BB_NUM_STD = 2
+SNAPSHOT_VERSION = 1
+_LONGEST = max(MA_WINDOWS)  # 需 >= BB_WINDOW、RSI_WINDOW，快照只保存此視窗的收盤價
+
+
+class _RollingWindow:
+    """
+    固定長度的滑動視窗，每次更新 O(1)
+    語意同 pandas rolling(window, min_periods=1)：NaN 佔位但不計入樣本數
+    平均採用 Kahan 補償加總，變異數採用 Welford 增減，與 pandas 的實作方式一致
+    """
+
+    __slots__ = ("size", "values", "nobs", "total", "comp", "mean", "ssqdm")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.nobs = 0
+        self.total = 0.0
+        self.comp = 0.0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+
+    def push(self, value: float):
+        if len(self.values) == self.size:
+            self._remove(self.values[0])
+        self.values.append(value)
+        self._add(value)
+
+    def replace_last(self, value: float):
+        """以新值取代最後一個值（視窗內容其餘不變）"""
+        self._remove(self.values[-1])
+        self.values[-1] = value
+        self._add(value)
+
+    def _add(self, value: float):
+        if math.isnan(value):
+            return
+        self.nobs += 1
+        y = value - self.comp
+        t = self.total + y
+        self.comp = (t - self.total) - y
+        self.total = t
+        delta = value - self.mean
+        self.mean += delta / self.nobs
+        self.ssqdm += ((self.nobs - 1) * delta * delta) / self.nobs
+
+    def _remove(self, value: float):
+        if math.isnan(value):
+            return
+        self.nobs -= 1
+        y = -value - self.comp
+        t = self.total + y
+        self.comp = (t - self.total) - y
+        self.total = t
+        if self.nobs:
+            delta = value - self.mean
+            self.mean -= delta / self.nobs
+            self.ssqdm -= ((self.nobs + 1) * delta * delta) / self.nobs
+        else:
+            self.total = self.comp = self.mean = self.ssqdm = 0.0
+
+    def average(self) -> float:
+        return self.total / self.nobs if self.nobs else math.nan
+
+    def std(self) -> float:
+        if self.nobs < 2:
+            return math.nan
+        return math.sqrt(max(self.ssqdm, 0.0) / (self.nobs - 1))
+
+
+class IndicatorState:
+    """
+    單一股票的指標狀態（環狀緩衝區）
+    """
+
+    __slots__ = ("count", "prev_close", "ma", "gain", "loss", "bb")
+
+    def __init__(self):
+        self.count = 0
+        self.prev_close = math.nan
+        self.ma = {w: _RollingWindow(w) for w in MA_WINDOWS}
+        self.gain = _RollingWindow(RSI_WINDOW)
+        self.loss = _RollingWindow(RSI_WINDOW)
+        self.bb = _RollingWindow(BB_WINDOW)
+
+    def update(self, close: float) -> Dict[str, float]:
+        close = float(close)
+        self.count += 1
+        for window in self.ma.values():
+            window.push(close)
+        delta = close - self.prev_close  # 第一筆為 NaN，同 Series.diff()
+        self.gain.push(max(delta, 0.0) if not math.isnan(delta) else math.nan)
+        self.loss.push(-min(delta, 0.0) if not math.isnan(delta) else math.nan)
+        self.bb.push(close)
+        self.prev_close = close
+        return self.latest()
+
+    def revise(self, close: float) -> Dict[str, float]:
+        """
+        以新收盤價取代最後一根 K 棒（盤中尚未收盤的 K 棒價格變動）
+        """
+        if not self.count:
+            return self.update(close)
+        close = float(close)
+        for window in self.ma.values():
+            window.replace_last(close)
+        self.bb.replace_last(close)
+        closes = self.ma[_LONGEST].values
+        delta = close - closes[-2] if len(closes) > 1 else math.nan
+        self.gain.replace_last(max(delta, 0.0) if not math.isnan(delta) else math.nan)
+        self.loss.replace_last(-min(delta, 0.0) if not math.isnan(delta) else math.nan)
+        self.prev_close = close
+        return self.latest()
+
+    def latest(self) -> Dict[str, float]:
+        result = {"Close": self.prev_close}
+        for w, window in self.ma.items():
+            result[f"MA_{w}"] = window.average()
+
+        if self.count >= RSI_WINDOW:
+            rs = self.gain.average() / (self.loss.average() + 1e-10)  # 避免除零
+            result["RSI_14"] = 100 - (100 / (1 + rs))
+        else:
+            result["RSI_14"] = math.nan
+
+        if self.count >= BB_WINDOW:
+            middle = self.bb.average()
+            band = self.bb.std() * BB_NUM_STD
+            result["BB_Middle"] = middle
+            result["BB_Upper"] = middle + band
+            result["BB_Lower"] = middle - band
+        else:
+            result["BB_Middle"] = result["BB_Upper"] = result["BB_Lower"] = math.nan
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "prev_close": self.prev_close,
+            # 只需保存最長視窗的原始值，還原時重新累加
+            "closes": list(self.ma[_LONGEST].values),
+            "gains": list(self.gain.values),
+            "losses": list(self.loss.values),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        state = cls()
+        for close in data["closes"]:
+            for window in state.ma.values():
+                window.push(close)
+            state.bb.push(close)
+        for gain in data["gains"]:
+            state.gain.push(gain)
+        for loss in data["losses"]:
+            state.loss.push(loss)
+        state.count = data["count"]
+        state.prev_close = data["prev_close"]
+        return state
+
+
+class IndicatorEngine:
+    """
+    增量技術指標引擎：為每檔股票保存狀態，新 K 棒到來時以 O(1) 更新全部指標
+    結果與 compute_technical_indicators 對同一段歷史最後一列的計算值相同
+    """
+
+    def __init__(self):
+        self._states: Dict[str, IndicatorState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, ticker: str) -> IndicatorState:
+        with self._lock:
+            state = self._states.get(ticker)
+            if state is None:
+                state = self._states[ticker] = IndicatorState()
+            return state
+
+    def update(self, ticker: str, close: float) -> Dict[str, float]:
+        """
+        加入一根新 K 棒的收盤價，回傳最新的指標值
+        """
+        return self._state(ticker).update(close)
+
+    def revise(self, ticker: str, close: float) -> Dict[str, float]:
+        """
+        更新最後一根 K 棒的收盤價（同一根 K 棒重複報價時使用，不新增 K 棒）
+        """
+        return self._state(ticker).revise(close)
+
+    def seed(self, ticker: str, closes: Iterable[float]) -> Optional[Dict[str, float]]:
+        """
+        以歷史收盤價初始化（會先清除該股票的既有狀態）
+        """
+        with self._lock:
+            state = self._states[ticker] = IndicatorState()
+        result = None
+        for close in np.asarray(closes, dtype=float):
+            result = state.update(close)
+        return result
+
+    def has(self, ticker: str) -> bool:
+        return ticker in self._states
+
+    def latest(self, ticker: str) -> Optional[Dict[str, float]]:
+        state = self._states.get(ticker)
+        return state.latest() if state is not None and state.count else None
+
+    def reset(self, ticker: str):
+        with self._lock:
+            self._states.pop(ticker, None)
+
+    def tickers(self):
+        return list(self._states)
+
+    def snapshot(self) -> dict:
+        """
+        匯出全部狀態（可 JSON 序列化）
+        """
+        with self._lock:
+            return {
+                "version": SNAPSHOT_VERSION,
+                "tickers": {t: s.to_dict() for t, s in self._states.items()},
+            }
+
+    def restore(self, snapshot: dict):
+        """
+        由 snapshot() 的結果還原狀態
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支援的指標狀態版本：{snapshot.get('version')}")
+        states = {t: IndicatorState.from_dict(d) for t, d in snapshot["tickers"].items()}
+        with self._lock:
+            self._states = states
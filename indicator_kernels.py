@@ -0,0 +1,230 @@
+# indicator_kernels.py
+"""
+進階技術指標（EMA、MACD、KDJ、ATR、OBV）的 NumPy 計算核心
+每個核心直接寫入呼叫端預先配置的輸出陣列（例如 Bars 預留欄位的檢視），
+只使用固定大小的暫存區，不會為每個中間結果配置整段序列
+
+遞迴型指標（EMA 類）以區塊閉式解向量化：區塊內 y[k] = w^(k+1)·y_prev + a·w^k·cumsum(x[j]·w^-j)，
+區塊長度讓 w^-j 不超過 e^500（輸入絕對值在 1e90 以下不會溢位），每段的相對誤差約 1e-15
+與 pandas 的對應：ewm(adjust=False).mean()、rolling(min_periods=1).min()/max()
+缺值：開頭的缺值輸出 NaN，之後的缺值視為價格不變（遞迴與 OBV 沿用前值，滑動極值略過缺值）
+
+使用方式：compute_technical_indicators(df, indicators=["MACD", "KDJ"])
+"""
+
+import math
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+EMA_SPANS = (12, 26)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+KDJ_WINDOW = 9
+KDJ_INIT = 50.0  # K、D 的起始值（台灣常用算法）
+ATR_WINDOW = 14
+_MAX_EXPONENT = 500.0  # EMA 區塊長度上限：w^-j <= e^500
+
+
+class IndicatorSpec(NamedTuple):
+    name: str
+    inputs: tuple  # 需要的價格欄位
+    outputs: tuple  # 寫入的欄位名稱
+    kernel: Callable  # kernel(*inputs, *outputs)
+    description: str
+
+
+INDICATORS: Dict[str, IndicatorSpec] = {}
+
+
+def register(name: str, inputs: Iterable[str], outputs: Iterable[str], description: str = ""):
+    """
+    註冊指標計算核心；核心依序接收輸入陣列與輸出陣列，結果寫入輸出陣列
+    """
+    def decorator(kernel):
+        INDICATORS[name] = IndicatorSpec(name, tuple(inputs), tuple(outputs), kernel, description)
+        return kernel
+    return decorator
+
+
+def available_indicators() -> List[str]:
+    return list(INDICATORS)
+
+
+def output_columns(names: Iterable[str]) -> List[str]:
+    """選擇的指標會寫入的欄位（供預先配置 Bars 的欄位）"""
+    columns = []
+    for name in names:
+        if name not in INDICATORS:
+            raise ValueError(f"未知的技術指標 '{name}'，可用：{', '.join(INDICATORS)}")
+        columns.extend(c for c in INDICATORS[name].outputs if c not in columns)
+    return columns
+
+
+# ---- 共用核心 ----
+def _first_valid(x: np.ndarray) -> int:
+    """第一個非 NaN 的位置（全為 NaN 時回傳長度）"""
+    valid = ~np.isnan(x)
+    return int(valid.argmax()) if valid.any() else len(x)
+
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    """中間有缺值時以前值補齊（回傳新陣列；沒有缺值時回傳原陣列）"""
+    missing = np.isnan(x)
+    if not missing.any():
+        return x
+    idx = np.where(missing, 0, np.arange(len(x)))
+    np.maximum.accumulate(idx, out=idx)
+    return x[idx]
+
+
+@lru_cache(maxsize=32)
+def _ema_coefficients(alpha: float):
+    """區塊長度與 w^-j、w^k、w^(k+1)（每個 alpha 只計算一次）"""
+    w = 1.0 - alpha
+    block = int(_MAX_EXPONENT / -math.log(w)) if w < 1.0 else 1
+    k = np.arange(max(1, block), dtype=np.float64)
+    decay = w ** k
+    return w ** -k, decay * alpha, decay * w
+
+
+def ema_into(x: np.ndarray, alpha: float, out: np.ndarray, init: Optional[float] = None) -> np.ndarray:
+    """
+    指數移動平均 y[t] = a·x[t] + (1-a)·y[t-1]，寫入 out（可與 x 為同一陣列）
+    init 為第一筆之前的值；None 時以第一筆有效值為起點（同 pandas ewm(adjust=False)）
+    開頭的 NaN 輸出 NaN，之後的缺值沿用前值
+    """
+    n = len(x)
+    start = _first_valid(x)
+    out[:start] = np.nan
+    if start == n:
+        return out
+    src = _ffill(x[start:])
+    dst = out[start:]
+    if alpha >= 1.0:
+        dst[:] = src
+        return out
+    inv, scaled_decay, carry = _ema_coefficients(alpha)
+    block = min(len(inv), len(src))
+    scratch = np.empty(block, dtype=np.float64)
+    prev = src[0] if init is None else init
+    for i in range(0, len(src), block):
+        m = min(block, len(src) - i)
+        buf = scratch[:m]
+        np.multiply(src[i:i + m], inv[:m], out=buf)
+        np.cumsum(buf, out=buf)
+        buf *= scaled_decay[:m]
+        # 最後寫回 dst（x 與 out 為同一陣列時，區塊已先讀入 buf）
+        np.multiply(carry[:m], prev, out=dst[i:i + m])
+        dst[i:i + m] += buf
+        prev = dst[i + m - 1]
+    return out
+
+
+def rolling_extreme_into(x: np.ndarray, window: int, out: np.ndarray, func=np.fmin) -> np.ndarray:
+    """
+    滑動視窗最小值 / 最大值（func 為 np.fmin / np.fmax，略過缺值），同 pandas rolling(min_periods=1)
+    以倍增合併：涵蓋 1、2、4… 筆的結果兩兩合併，約 log2(window) 次整段運算
+    """
+    n = len(x)
+    src, dst = x, out
+    scratch = None
+    span = 1
+    while span < window:
+        shift = min(span, window - span)
+        if dst is None:
+            dst = scratch = np.empty(n, dtype=np.float64)
+        dst[:shift] = src[:shift]
+        func(src[shift:], src[:n - shift], out=dst[shift:])
+        span += shift
+        # 交替使用 out 與暫存區，輸入 x 不會被覆寫
+        src, dst = dst, (scratch if dst is out else out)
+    if src is not out:
+        out[:] = src
+    return out
+
+
+# ---- 指標 ----
+@register("EMA", ("Close",), tuple(f"EMA_{s}" for s in EMA_SPANS), "指數移動平均（12、26 日）")
+def ema_kernel(close, *outs):
+    for span, out in zip(EMA_SPANS, outs):
+        ema_into(close, 2.0 / (span + 1), out)
+
+
+@register("MACD", ("Close",), ("MACD", "MACD_Signal", "MACD_Hist"), "MACD（DIF、DEA 訊號線、柱狀體）")
+def macd_kernel(close, macd, signal, hist):
+    # hist 先暫存慢線，不另外配置陣列
+    ema_into(close, 2.0 / (MACD_FAST + 1), macd)
+    ema_into(close, 2.0 / (MACD_SLOW + 1), hist)
+    np.subtract(macd, hist, out=macd)
+    ema_into(macd, 2.0 / (MACD_SIGNAL + 1), signal)
+    np.subtract(macd, signal, out=hist)
+
+
+@register("KDJ", ("High", "Low", "Close"), ("KDJ_K", "KDJ_D", "KDJ_J"), "KD 隨機指標（9 日 RSV，含 J 值）")
+def kdj_kernel(high, low, close, k, d, j):
+    # k、d 先暫存 9 日最低 / 最高，j 暫存 RSV
+    rolling_extreme_into(low, KDJ_WINDOW, k, np.fmin)
+    rolling_extreme_into(high, KDJ_WINDOW, d, np.fmax)
+    np.subtract(close, k, out=j)
+    np.subtract(d, k, out=d)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        np.divide(j, d, out=j)
+    j *= 100.0
+    j[d == 0] = KDJ_INIT  # 區間內最高等於最低（例如漲跌停鎖死），RSV 視為 50
+    ema_into(j, 1.0 / 3.0, k, init=KDJ_INIT)
+    ema_into(k, 1.0 / 3.0, d, init=KDJ_INIT)
+    np.multiply(k, 3.0, out=j)
+    j -= d
+    j -= d
+
+
+@register("ATR", ("High", "Low", "Close"), ("ATR_14",), "平均真實區間（Wilder 平滑，14 日）")
+def atr_kernel(high, low, close, atr):
+    # 真實區間：max(高-低, |高-前收|, |低-前收|)，第一筆為高-低
+    np.subtract(high, low, out=atr)
+    if len(atr) > 1:
+        gap = np.subtract(high[1:], close[:-1])
+        np.abs(gap, out=gap)
+        np.fmax(atr[1:], gap, out=atr[1:])
+        np.subtract(low[1:], close[:-1], out=gap)
+        np.abs(gap, out=gap)
+        np.fmax(atr[1:], gap, out=atr[1:])
+    ema_into(atr, 1.0 / ATR_WINDOW, atr)
+
+
+@register("OBV", ("Close", "Volume"), ("OBV",), "能量潮（收盤上漲加成交量、下跌減成交量）")
+def obv_kernel(close, volume, obv):
+    start = _first_valid(close)
+    obv[:start] = np.nan
+    if start == len(obv):
+        return
+    # 中間缺收盤價時與前一個有效收盤價比較，缺值當天不增減
+    close = _ffill(close[start:])
+    out = obv[start:]
+    out[0] = 0.0
+    if len(out) > 1:
+        np.subtract(close[1:], close[:-1], out=out[1:])
+        np.sign(out[1:], out=out[1:])
+        np.multiply(out[1:], volume[start + 1:], out=out[1:])
+        np.nan_to_num(out, copy=False, nan=0.0)
+    np.cumsum(out, out=out)
+
+
+def compute_into(columns, outputs, names: Iterable[str]):
+    """
+    依序執行選擇的指標核心
+    Args:
+        columns: 可用 [] 取得價格陣列的物件（Bars 或 {欄位: 陣列}）
+        outputs: 可用 [] 取得預先配置的輸出陣列的物件（通常與 columns 相同）
+        names: 指標名稱，見 available_indicators()
+    """
+    for name in names:
+        if name not in INDICATORS:
+            raise ValueError(f"未知的技術指標 '{name}'，可用：{', '.join(INDICATORS)}")
+        spec = INDICATORS[name]
+        missing = [c for c in spec.inputs if c not in columns]
+        if missing:
+            raise ValueError(f"計算 {name} 需要 {', '.join(missing)} 欄位")
+        spec.kernel(*(np.asarray(columns[c], dtype=np.float64) for c in spec.inputs),
+                    *(outputs[c] for c in spec.outputs))
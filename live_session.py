@@ -0,0 +1,143 @@
+# live_session.py
+"""
+即時模式：盯盤中的股票定時向上游補抓最後一根 K 棒之後的資料（price_store.poll），
+以增量指標引擎 O(1) 更新指標並寫入既有的 Bars，不重新抓整段歷史、不重算整段指標
+只有技術訊號改變時才需要重新產生 AI 報告（見 app.py 的即時更新區塊）
+
+使用方式：
+    live = LiveSession(agent 最終狀態)
+    update = live.poll()
+    if update.signals_changed: agent.stream_report(live.state)
+"""
+
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from bars import PRICE_COLUMNS
+from config import DEFAULT_INTERVAL, DEFAULT_PERIOD, LIVE_REFRESH_SECONDS
+from indicator_engine import IndicatorState
+from metrics import metrics
+from price_store import period_to_offset, price_store
+from stock_utils import generate_analysis_summary, signal_labels
+from ticker_resolver import resolver
+
+
+class LiveUpdate(NamedTuple):
+    added: int  # 新增的 K 棒數
+    revised: bool  # 最後一根 K 棒（尚未收盤）的報價是否變動
+    signals_changed: bool
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.revised)
+
+
+NO_UPDATE = LiveUpdate(0, False, False)
+
+
+class LiveSession:
+    """
+    單一股票的即時狀態：state 為 StockAgent 的最終狀態（含 bars、價格統計與報告），poll() 會就地更新
+    """
+
+    def __init__(self, state: dict, refresh_seconds: float = LIVE_REFRESH_SECONDS, store=price_store):
+        if state.get("bars") is None or state["bars"].empty:
+            raise ValueError("沒有可即時更新的價格資料")
+        self.state = dict(state)
+        self.symbol = resolver.yahoo_symbol(state["ticker"], state["market"])
+        self.interval = state.get("interval") or DEFAULT_INTERVAL
+        self.offset = period_to_offset(state.get("period") or DEFAULT_PERIOD)
+        self.refresh_seconds = refresh_seconds
+        self.store = store
+        self.indicators = IndicatorState()
+        for close in self.bars["Close"]:
+            self.indicators.update(close)
+        self.signals = signal_labels(self.bars.row(-1))
+        self.last_poll = time.monotonic()
+
+    @property
+    def bars(self):
+        return self.state["bars"]
+
+    @property
+    def ticker(self) -> str:
+        return self.state["ticker"]
+
+    @property
+    def last_bar(self) -> pd.Timestamp:
+        return self.bars.date_index()[-1]
+
+    def due(self) -> bool:
+        return time.monotonic() - self.last_poll >= self.refresh_seconds
+
+    def poll(self, force: bool = False) -> LiveUpdate:
+        """
+        檢查新 K 棒（距離上次檢查未滿 refresh_seconds 且 force=False 時不連網）
+        新 K 棒以 update、同一根 K 棒的新報價以 revise 更新指標，並重算價格統計與分析摘要
+        """
+        if not force and not self.due():
+            return NO_UPDATE
+        self.last_poll = time.monotonic()
+        bars = self.bars
+        last_ns = int(bars.dates[-1])
+        with metrics.timer("call_duration_seconds", op="live_poll"):
+            delta = self.store.poll(self.symbol, pd.Timestamp(last_ns, tz="UTC"), self.interval)
+        added, revised = 0, False
+        for i in range(len(delta) if delta is not None else 0):
+            date_ns = int(delta.dates[i])
+            prices = {c: delta[c][i] for c in PRICE_COLUMNS if c in delta}
+            if date_ns < last_ns:
+                continue
+            if date_ns == last_ns:
+                if np.array_equal([bars[c][-1] for c in prices], list(prices.values()), equal_nan=True):
+                    continue
+                bars.set_row(-1, {**prices, **self.indicators.revise(prices["Close"])})
+                revised = True
+            else:
+                bars.append(date_ns, {**prices, **self.indicators.update(prices["Close"])})
+                last_ns = date_ns
+                added += 1
+        if not (added or revised):
+            metrics.inc("live_polls_total", result="unchanged")
+            return NO_UPDATE
+
+        metrics.inc("live_polls_total", result="new_bar" if added else "revised")
+        if added:
+            self._trim()
+        self._refresh_stats()
+        signals = signal_labels(bars.row(-1))
+        changed = signals != self.signals
+        self.signals = signals
+        return LiveUpdate(added, revised, changed)
+
+    def _trim(self):
+        """捨棄超出 period 的舊 K 棒，圖表與統計維持相同的期間"""
+        if self.offset is None:
+            return
+        start = pd.Timestamp.now(tz="UTC") - self.offset
+        start_ns = start.tz_localize(None).as_unit("ns").value
+        n = int(np.searchsorted(self.bars.dates, start_ns, side="left"))
+        self.bars.drop_head(min(n, len(self.bars) - 1))
+
+    def _refresh_stats(self):
+        bars = self.bars
+        closes = bars["Close"]
+        self.state.update({
+            "current_price": closes[-1],
+            "previous_close": closes[-2] if len(bars) > 1 else closes[-1],
+            "period_high": np.nanmax(closes),
+            "period_low": np.nanmin(closes),
+            "avg_volume": np.nanmean(bars["Volume"]),
+            "data_points": len(bars),
+            "analysis_summary": generate_analysis_summary(
+                bars, self.state.get("intent") or "basic", self.state.get("fundamental_data") or {}),
+        })
+
+    def set_report(self, state: dict):
+        """stream_report 完成後寫回新的報告"""
+        for key in ("response_text", "report_text", "llm_text"):
+            if key in state:
+                self.state[key] = state[key]
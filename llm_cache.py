@@ -0,0 +1,138 @@
+# llm_cache.py
+
+import hashlib
+import json
+import numbers
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import DATA_DIR, LLM_MODEL
+from metrics import metrics
+
+LLM_CACHE_PATH = os.path.join(DATA_DIR, "llm_cache.sqlite")
+# 快取鍵已包含價格、摘要與基本面，輸入相同時回應仍適用；
+# 期限需涵蓋收盤後預熱到隔日開盤前（台股 14:30 -> 隔日 09:00）
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def _normalize(value):
+    """將數值四捨五入、字典排序，讓相同輸入得到相同的雜湊"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return None if value != value else round(value, 4)  # NaN 視為 None
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return str(value)
+
+
+def make_key(ticker, current_price, price_change_pct, analysis_summary, fundamental_data,
+             model: str = LLM_MODEL) -> str:
+    """
+    以分析輸入（股票代號、價格、漲跌幅、分析摘要、基本面）產生快取鍵
+    """
+    payload = {
+        "model": model,
+        "ticker": str(ticker).upper(),
+        "current_price": round(float(current_price), 2),
+        "price_change_pct": round(float(price_change_pct), 2),
+        "analysis_summary": analysis_summary,
+        "fundamental_data": _normalize(fundamental_data or {}),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LLM 回應的持久化快取（SQLite），支援 TTL 與 LRU 淘汰
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                metrics.inc("cache_requests_total", cache="llm", result="miss")
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            metrics.inc("cache_requests_total", cache="llm", result="hit")
+            return row[0]
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            # 清除過期資料，超過上限時淘汰最久未使用的項目
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": size,
+            }
+
+
+# 模組層級共用實例
+llm_cache = LLMResponseCache()
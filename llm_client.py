@@ -0,0 +1,151 @@
+# llm_client.py
+
+import http.client
+import json
+import queue
+import threading
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+from config import (
+    OLLAMA_URL,
+    LLM_MODEL,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MAX_CONCURRENCY,
+)
+
+
+class LLMBusyError(RuntimeError):
+    """等待可用連線逾時（已達並行上限）"""
+
+
+class LLMConnectError(ConnectionError):
+    """無法建立與 Ollama 服務的連線（連線被拒、連線逾時、主機無法連線）；請求尚未送出"""
+
+
+class OllamaClient:
+    """
+    常駐的 Ollama HTTP 客戶端：重複使用 keep-alive 連線，並限制同時進行的請求數
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = LLM_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT,
+                 acquire_timeout: Optional[float] = None):
+        if "://" not in base_url:
+            base_url = f"http://{base_url}"
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 11434
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._idle = queue.LifoQueue()
+
+    # ---- 連線池 ----
+    def _new_connection(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        self._connect(conn)
+        return conn
+
+    def _connect(self, conn: http.client.HTTPConnection):
+        # 只有建立連線的失敗轉為 LLMConnectError；連線後的讀取逾時維持原本的例外
+        conn.timeout = self.connect_timeout
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            raise LLMConnectError(f"無法連線到 Ollama 服務 {self.host}:{self.port}：{e}") from e
+        conn.sock.settimeout(self.read_timeout)
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise LLMBusyError("LLM 服務忙碌中，等待連線逾時")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._new_connection()
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, OSError) and not isinstance(e, LLMConnectError):
+                raise LLMConnectError(f"無法連線到 Ollama 服務 {self.host}:{self.port}：{e}") from e
+            raise
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool):
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ---- API ----
+    def _post(self, conn, path: str, payload: dict) -> http.client.HTTPResponse:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # 伺服器已關閉閒置連線，重新連線後再送一次
+            conn.close()
+            self._connect(conn)
+            conn.request("POST", path, body=body, headers=headers)
+            return conn.getresponse()
+
+    def stream(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None) -> Iterator[str]:
+        """
+        逐段產生模型輸出的文字
+        """
+        payload = {"model": model or self.model, "prompt": prompt, "stream": True}
+        if options:
+            payload["options"] = options
+        conn = self._acquire()
+        reusable = False
+        try:
+            resp = self._post(conn, "/api/generate", payload)
+            if resp.status != 200:
+                detail = resp.read().decode("utf-8", "replace")
+                reusable = not resp.will_close
+                raise RuntimeError(f"Ollama 回應錯誤 {resp.status}: {detail}")
+            for line in resp:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama 執行失敗: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+            resp.read()  # 讀完剩餘內容，連線才能重複使用
+            reusable = not resp.will_close
+        finally:
+            self._release(conn, reusable)
+
+    def generate(self, prompt: str, model: Optional[str] = None, options: Optional[dict] = None) -> str:
+        return "".join(self.stream(prompt, model=model, options=options)).strip()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
@@ -0,0 +1,229 @@
+# llm_queue.py
+"""
+LLM 工作佇列
+- 固定數量的工作執行緒執行模型呼叫，避免大量並行請求搶同一份 CPU / 記憶體
+- 互動查詢（interactive）優先於批次與預熱（batch）
+- batch 工作可合併成一批同時送出（需 Ollama 設定 OLLAMA_NUM_PARALLEL，由伺服器合併運算）
+- 佇列已滿或在期限內未開始產生時拋出例外，由呼叫端改回傳不含 AI 分析的報告
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+from config import LLM_BATCH_SIZE, LLM_QUEUE_SIZE, LLM_WORKERS
+from metrics import metrics
+from utils import stream_chatglm
+
+# 數字越小越優先
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class LLMQueueFullError(RuntimeError):
+    """佇列已滿（或被較高優先的工作擠出）"""
+
+
+class LLMQueueTimeout(RuntimeError):
+    """期限內未開始產生回應"""
+
+
+_DONE = object()
+
+
+class LLMJob:
+    """
+    佇列中的一次模型呼叫；以 tokens() 逐段取得輸出
+    """
+
+    def __init__(self, prompt: str, priority: str, deadline: Optional[float], generate: Callable, seq: int):
+        self.prompt = prompt
+        self.priority = priority
+        self.deadline = deadline  # time.monotonic()，None 表示不限
+        self.generate = generate
+        self.seq = seq
+        self.submitted = time.monotonic()
+        self.cancelled = False
+        self._events = queue.Queue()
+
+    def __lt__(self, other: "LLMJob") -> bool:
+        return (PRIORITIES[self.priority], self.seq) < (PRIORITIES[other.priority], other.seq)
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _put(self, item):
+        self._events.put(item)
+
+    def tokens(self) -> Iterator[str]:
+        """
+        逐段回傳模型輸出；期限前仍未收到第一段時取消工作並拋出 LLMQueueTimeout
+        """
+        first = True
+        try:
+            while True:
+                timeout = None
+                if first and self.deadline is not None:
+                    timeout = max(0.0, self.deadline - time.monotonic())
+                try:
+                    item = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    raise LLMQueueTimeout("LLM 服務忙碌中，等候逾時") from None
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                first = False
+                yield item
+        finally:
+            # 呼叫端中途放棄（逾時、關閉串流）時，工作執行緒看到後會停止產生
+            self.cancel()
+
+    def result(self) -> str:
+        return "".join(self.tokens()).strip()
+
+
+class LLMQueue:
+    """
+    有上限的優先佇列與工作執行緒；第一次 submit 時才啟動執行緒
+    """
+
+    def __init__(self, workers: int = LLM_WORKERS, max_pending: int = LLM_QUEUE_SIZE,
+                 batch_size: int = LLM_BATCH_SIZE, generate: Callable = stream_chatglm):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.generate = generate
+        self._heap: List[LLMJob] = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._threads = []
+        # 同批次其餘工作的執行緒（建立時不啟動執行緒，用到才產生）
+        self._batch_pool = ThreadPoolExecutor(max_workers=self.workers * (self.batch_size - 1),
+                                              thread_name_prefix="llm-batch") if self.batch_size > 1 else None
+        self.running = 0
+
+    # ---- 提交 ----
+    def submit(self, prompt: str, priority: str = "interactive", deadline: Optional[float] = None,
+               generate: Optional[Callable] = None) -> LLMJob:
+        """
+        加入一個工作；deadline 為最多等候開始產生的秒數
+        佇列已滿時，互動工作會擠掉最晚加入的 batch 工作，否則拋出 LLMQueueFullError
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的優先順序 '{priority}'")
+        job = LLMJob(prompt, priority, time.monotonic() + deadline if deadline is not None else None,
+                     generate or self.generate, next(self._seq))
+        with self._cond:
+            self._start()
+            self._drop_stale()
+            if len(self._heap) >= self.max_pending:
+                victim = max(self._heap)
+                if PRIORITIES[victim.priority] <= PRIORITIES[priority]:
+                    metrics.inc("llm_jobs_total", priority=priority, result="rejected")
+                    raise LLMQueueFullError("LLM 服務忙碌中，佇列已滿")
+                self._heap.remove(victim)
+                heapq.heapify(self._heap)
+                victim._put(LLMQueueFullError("LLM 佇列已滿，工作被較高優先的請求取代"))
+                metrics.inc("llm_jobs_total", priority=victim.priority, result="rejected")
+            heapq.heappush(self._heap, job)
+            metrics.set_gauge("llm_queue_depth", len(self._heap))
+            self._cond.notify()
+        return job
+
+    def stream(self, prompt: str, priority: str = "interactive", deadline: Optional[float] = None,
+               generate: Optional[Callable] = None) -> Iterator[str]:
+        return self.submit(prompt, priority, deadline, generate).tokens()
+
+    def _drop_stale(self):
+        # 已取消或逾時的工作不佔佇列空間
+        now = time.monotonic()
+        stale = [job for job in self._heap if job.cancelled or job.expired(now)]
+        if stale:
+            self._heap = [job for job in self._heap if job not in stale]
+            heapq.heapify(self._heap)
+            for job in stale:
+                metrics.inc("llm_jobs_total", priority=job.priority, result="expired")
+
+    # ---- 工作執行緒 ----
+    def _start(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"llm-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self) -> List[LLMJob]:
+        """取出下一個工作；batch 工作最多合併 batch_size 個"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._heap:
+                    job = heapq.heappop(self._heap)
+                    if job.cancelled or job.expired(now):
+                        metrics.inc("llm_jobs_total", priority=job.priority, result="expired")
+                        continue
+                    jobs = [job]
+                    while (job.priority == "batch" and len(jobs) < self.batch_size and self._heap
+                           and self._heap[0].priority == "batch"):
+                        extra = heapq.heappop(self._heap)
+                        if extra.cancelled or extra.expired(now):
+                            metrics.inc("llm_jobs_total", priority=extra.priority, result="expired")
+                        else:
+                            jobs.append(extra)
+                    self.running += len(jobs)
+                    metrics.set_gauge("llm_queue_depth", len(self._heap))
+                    return jobs
+                self._cond.wait()
+
+    def _run(self, job: LLMJob):
+        metrics.observe("llm_queue_wait_seconds", time.monotonic() - job.submitted, priority=job.priority)
+        result = "ok"
+        tokens = None
+        try:
+            tokens = job.generate(job.prompt)
+            for token in tokens:
+                if job.cancelled:
+                    result = "cancelled"
+                    break
+                job._put(token)
+            job._put(_DONE)
+        except Exception as e:
+            result = "error"
+            job._put(e)
+        finally:
+            if hasattr(tokens, "close"):
+                tokens.close()  # 中途取消時立即釋放連線
+        metrics.inc("llm_jobs_total", priority=job.priority, result=result)
+
+    def _worker(self):
+        while True:
+            jobs = self._take()
+            try:
+                if len(jobs) == 1:
+                    self._run(jobs[0])
+                else:
+                    futures = [self._batch_pool.submit(self._run, job) for job in jobs[1:]]
+                    self._run(jobs[0])
+                    for future in futures:
+                        future.result()
+            finally:
+                with self._cond:
+                    self.running -= len(jobs)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = {name: 0 for name in PRIORITIES}
+            for job in self._heap:
+                pending[job.priority] += 1
+            return {"pending": pending, "running": self.running, "workers": self.workers}
+
+
+# 模組層級共用實例
+llm_queue = LLMQueue()
@@ -0,0 +1,250 @@
+# metrics.py
+
+import json
+import os
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# 直方圖的分界（秒），涵蓋指標計算（毫秒級）到 LLM 生成（數十秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "finance_agent_"
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+class _NullTimer:
+    """停用時使用的空計時器，幾乎沒有額外成本"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc("errors_total", op=self.labels.get("op") or self.labels.get("node", self.name),
+                             error=exc_type.__name__)
+        return False
+
+
+class Metrics:
+    """
+    輕量的指標收集器：計數器、量測值（gauge）與延遲直方圖
+    可匯出為 Prometheus 文字格式或 JSON，也可將每筆事件寫成 JSON Lines
+    停用時所有記錄呼叫立即返回
+    """
+
+    def __init__(self, enabled: bool = False, log_path: Optional[str] = None, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._log = None
+        if log_path:
+            self.set_log(log_path)
+
+    def set_log(self, path: Optional[str]):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._log = open(path, "a", encoding="utf-8", buffering=1) if path else None
+
+    def _emit(self, kind: str, name: str, value: float, labels: dict):
+        if self._log is not None:
+            record = {"ts": time.time(), "type": kind, "metric": PREFIX + name, "value": value, **labels}
+            self._log.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._emit("counter", name, value, labels)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """設定目前值（例如佇列長度）"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+            self._emit("gauge", name, value, labels)
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+            hist["count"] += 1
+            hist["sum"] += seconds
+            self._emit("duration", name, seconds, labels)
+
+    def timer(self, name: str, **labels):
+        """
+        with metrics.timer("call_duration_seconds", op="fetch_us_stock"): ...
+        發生例外時另外累計 errors_total（依例外類別）
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"metric": PREFIX + name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                "gauges": [
+                    {"metric": PREFIX + name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._gauges.items()
+                ],
+                "histograms": [
+                    {"metric": PREFIX + name, "labels": dict(labels), "count": h["count"], "sum": h["sum"],
+                     "buckets": dict(zip(self.buckets, h["buckets"]))}
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} counter")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{fmt(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} gauge")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{fmt(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                    seen.add(name)
+                for bound, count in zip(self.buckets, h["buckets"]):
+                    lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', '+Inf')])} {h['count']}")
+                lines.append(f"{PREFIX}{name}_sum{fmt(labels)} {h['sum']}")
+                lines.append(f"{PREFIX}{name}_count{fmt(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(
+    enabled=os.environ.get("FINANCE_AGENT_METRICS", "0") == "1",
+    log_path=os.environ.get("FINANCE_AGENT_METRICS_LOG"),
+)
+
+
+def traced(op: str):
+    """
+    函式裝飾器：記錄呼叫耗時（call_duration_seconds）與例外類別（errors_total）
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(metrics, "call_duration_seconds", {"op": op}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_node(node: str, fn):
+    """
+    包裝 LangGraph 節點：記錄節點耗時，以及節點寫入狀態的錯誤
+    指標停用時直接回傳原函式，不增加任何成本
+    """
+    if not metrics.enabled:
+        return fn
+
+    @wraps(fn)
+    def wrapper(state):
+        with _Timer(metrics, "node_duration_seconds", {"node": node}):
+            result = fn(state)
+        if isinstance(result, dict) and "error" in result and "error" not in state:
+            metrics.inc("node_errors_total", node=node)
+        return result
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = metrics.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    在背景執行緒提供 /metrics（Prometheus 文字格式）與 /metrics.json
+    沒有驗證，預設只接受本機連線；需要由其他主機抓取時才指定 host（例如 0.0.0.0）
+    """
+    metrics.enabled = True
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
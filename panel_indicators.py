@@ -0,0 +1,148 @@
+# panel_indicators.py
+
+from typing import Dict, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator_engine import MA_WINDOWS, RSI_WINDOW, BB_WINDOW, BB_NUM_STD
+
+
+def _rolling_sums(values: np.ndarray, window: int, powers=(1,)):
+    """
+    沿時間軸（axis 0）計算滑動視窗內的樣本數與各次方和，NaN 不計入
+    先減去每欄第一個有效值再累加，降低累加和相減時的誤差
+    回傳 (ref, count, [sum of (x-ref)^p ...])
+    """
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=0)
+    ref = values[first, np.arange(values.shape[1])]
+    ref = np.where(np.isnan(ref), 0.0, ref)
+    centered = np.where(valid, values - ref, 0.0)
+
+    end = np.arange(1, values.shape[0] + 1)
+    start = np.maximum(end - window, 0)
+
+    def windowed(x):
+        c = np.zeros((x.shape[0] + 1, x.shape[1]), dtype=np.float64)
+        np.cumsum(x, axis=0, out=c[1:])
+        return c[end] - c[start]
+
+    count = windowed(valid.astype(np.float64))
+    sums = [windowed(centered ** p) for p in powers]
+    return ref, count, sums
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    同 pandas rolling(window, min_periods=1).mean()，逐欄計算
+    """
+    ref, count, (s1,) = _rolling_sums(values, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, ref + s1 / count, np.nan)
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    同 pandas rolling(window, min_periods=1) 的 mean() 與 std()（ddof=1）
+    每個視窗先減去視窗內最後一個有效值再逐筆累加（window 次整段運算），誤差不隨序列長度累積，
+    價格固定的視窗標準差恰為 0
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows = values.shape[0]
+    valid = ~np.isnan(values)
+    # 視窗內最後一個有效值：以前值補齊（視窗內全為缺值時樣本數為 0，不影響結果）
+    idx = np.where(valid, np.arange(rows).reshape((-1,) + (1,) * (values.ndim - 1)), 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    ref = np.nan_to_num(np.take_along_axis(values, idx, axis=0))
+    weight = valid.astype(np.float64)
+    filled = np.where(valid, values, 0.0)
+
+    count = np.zeros_like(values)
+    s1 = np.zeros_like(values)
+    s2 = np.zeros_like(values)
+    diff = np.empty_like(values)
+    for k in range(min(window, rows)):
+        d = diff[k:]
+        np.subtract(filled[:rows - k], ref[k:], out=d)
+        d *= weight[:rows - k]  # 缺值不計入
+        count[k:] += weight[:rows - k]
+        s1[k:] += d
+        d *= d
+        s2[k:] += d
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, ref + s1 / count, np.nan)
+        var = (s2 - s1 * s1 / count) / (count - 1)
+        std = np.where(count > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return mean, std
+
+
+def series_lengths(close: np.ndarray) -> np.ndarray:
+    """
+    每欄的資料筆數：自第一個有效值起算（之前視為尚未上市，不計入）
+    """
+    valid = ~np.isnan(close)
+    has_data = valid.any(axis=0)
+    first = valid.argmax(axis=0)
+    return np.where(has_data, close.shape[0] - first, 0)
+
+
+def compute_panel_indicators(close: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    一次計算多檔股票的技術指標
+    Args:
+        close: 對齊後的收盤價，形狀為 (日期數, 股票數)，缺值為 NaN
+    Returns:
+        dict: 欄位名稱同 compute_technical_indicators，每個值皆為 (日期數, 股票數) 陣列
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 1:
+        close = close[:, None]
+    lengths = series_lengths(close)
+    result = {}
+
+    # 移動平均
+    for w in MA_WINDOWS:
+        result[f"MA_{w}"] = rolling_mean(close, w)
+
+    # RSI：資料不足 14 筆的股票整欄為 NaN
+    delta = np.empty_like(close)
+    delta[0] = np.nan
+    np.subtract(close[1:], close[:-1], out=delta[1:])
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    gain[np.isnan(delta)] = np.nan
+    loss[np.isnan(delta)] = np.nan
+    avg_gain = rolling_mean(gain, RSI_WINDOW)
+    avg_loss = rolling_mean(loss, RSI_WINDOW)
+    rs = avg_gain / (avg_loss + 1e-10)  # 避免除零
+    rsi = 100 - (100 / (1 + rs))
+    rsi[:, lengths < RSI_WINDOW] = np.nan
+    result["RSI_14"] = rsi
+
+    # 布林通道：資料不足 20 筆的股票整欄為 NaN
+    middle, std = rolling_mean_std(close, BB_WINDOW)
+    short = lengths < BB_WINDOW
+    middle[:, short] = np.nan
+    std[:, short] = np.nan
+    result["BB_Middle"] = middle
+    result["BB_Upper"] = middle + std * BB_NUM_STD
+    result["BB_Lower"] = middle - std * BB_NUM_STD
+    return result
+
+
+def align_closes(frames: Mapping[str, pd.DataFrame], date_col: str = "Date") -> Tuple[pd.Index, list, np.ndarray]:
+    """
+    將多檔股票的 DataFrame 依交易日對齊成收盤價矩陣（去除時區，方便台美股混合）
+    Returns:
+        tuple: (日期索引, 股票代號清單, (日期數, 股票數) 收盤價矩陣)
+    """
+    def by_date(df):
+        dates = pd.to_datetime(df[date_col])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        return pd.Series(df["Close"].to_numpy(), index=dates.dt.normalize())
+
+    tickers = list(frames)
+    closes = pd.concat({t: by_date(df) for t, df in frames.items()}, axis=1).sort_index()
+    return closes.index, tickers, closes[tickers].to_numpy(dtype=np.float64)
@@ -0,0 +1,230 @@
+# prewarm.py
+"""
+收盤後預熱熱門股票的快取
+台股、美股收盤後，對近期查詢次數最多的前 K 檔預先抓取歷史價格與基本面、計算技術指標
+（同時更新訊號篩選索引），並可選擇預先產生 AI 分析寫入 LLM 快取，尖峰時段的查詢即可直接命中
+
+可在 app 行程內以背景執行緒執行（FINANCE_AGENT_PREWARM=1），或單獨執行：
+python prewarm.py --daemon
+python prewarm.py --now --market tw --top 30 --llm
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+from bars import Bars
+from config import DEFAULT_INTERVAL, DEFAULT_PERIOD
+from metrics import metrics
+from query_stats import query_stats
+from ticker_resolver import resolver
+
+# 市場: (時區, 預熱時間)；收盤後預留時間讓上游資料更新
+MARKET_CLOSE_SCHEDULE = {
+    "tw": ("Asia/Taipei", "14:30"),  # 13:30 收盤
+    "us": ("America/New_York", "16:30"),  # 16:00 收盤
+}
+DEFAULT_TOP_K = 20
+MAX_SLEEP_SECONDS = 600
+
+
+def popular_tickers(market: str, k: int) -> List[str]:
+    """
+    近期查詢最多的前 k 檔；查詢紀錄不足時以股票主檔的順序補足
+    """
+    tickers = query_stats.top(market, k)
+    for entry in resolver.entries:
+        if len(tickers) >= k:
+            break
+        if entry.market == market and entry.code not in tickers:
+            tickers.append(entry.code)
+    return tickers
+
+
+def warm_ticker(ticker: str, market: str, agent=None, period: str = DEFAULT_PERIOD,
+                interval: str = DEFAULT_INTERVAL, index=None):
+    """
+    預熱單一股票：價格資料、基本面、技術指標（提供 index 時寫入篩選索引）
+    提供 agent 時執行完整流程，AI 分析會寫入 LLM 快取
+    """
+    from stock_utils import (compute_indicators_inplace, fetch_tw_stock, fetch_us_stock,
+                             fundamentals_cache)
+
+    # 先更新基本面，之後查詢使用的基本面與 LLM 快取鍵中的一致
+    fundamentals_cache.refresh(ticker, market)
+    if agent is not None:
+        # 直接執行圖，不計入查詢次數；LLM 以 batch 優先順序排隊，不影響互動查詢
+        state = agent.graph.invoke({"query": ticker, "period": period, "interval": interval,
+                                    "priority": "batch"})
+        if "error" in state:
+            raise ValueError(state["error"])
+        bars = state["bars"]
+    else:
+        fetch = fetch_tw_stock if market == "tw" else fetch_us_stock
+        bars = compute_indicators_inplace(Bars.from_frame(fetch(ticker, period=period, interval=interval)))
+    if index is not None and interval == "1d":
+        index.seed_from_bars(ticker, market, bars)
+
+
+def run_prewarm(market: str, top_k: int = DEFAULT_TOP_K, agent=None, workers: int = 4,
+                tickers: Optional[Iterable[str]] = None) -> dict:
+    """
+    預熱一個市場的熱門股票，回傳統計資訊
+    以執行緒池平行處理；AI 分析由 LLM 工作佇列以 batch 優先順序執行，同時執行的模型呼叫數受佇列限制
+    """
+    from screener import SignalIndex
+
+    started = time.time()
+    tickers = list(tickers) if tickers is not None else popular_tickers(market, top_k)
+    index = SignalIndex()  # 每次預熱重新讀入索引檔，存檔時與其他行程寫入的股票合併
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(warm_ticker, t, market, agent, index=index): t for t in tickers}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed[futures[future]] = str(e)
+    try:
+        index.save()
+    except Exception as e:
+        print(f"儲存篩選索引失敗：{e}")
+
+    warmed = len(tickers) - len(failed)
+    metrics.inc("prewarm_tickers_total", warmed, market=market, result="ok")
+    metrics.inc("prewarm_tickers_total", len(failed), market=market, result="failed")
+    return {
+        "market": market,
+        "warmed": warmed,
+        "failed": failed,
+        "llm": agent is not None,
+        "seconds": time.time() - started,
+    }
+
+
+class PrewarmScheduler:
+    """
+    背景排程：每個交易日（週一至週五）在各市場收盤後執行一次預熱
+    啟動時若今天的預熱時間已過且尚未執行，會立即補做
+    """
+
+    def __init__(self, markets: Iterable[str] = ("tw", "us"), top_k: int = DEFAULT_TOP_K,
+                 agent=None, schedule: dict = MARKET_CLOSE_SCHEDULE):
+        self.markets = list(markets)
+        self.top_k = top_k
+        self.agent = agent
+        self.schedule = schedule
+        self.last_summary = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run_time(self, market: str, day) -> datetime:
+        tz, at = self.schedule[market]
+        hour, minute = map(int, at.split(":"))
+        return datetime(day.year, day.month, day.day, hour, minute, tzinfo=ZoneInfo(tz))
+
+    def due(self, now: Optional[datetime] = None) -> List[tuple]:
+        """
+        回傳已到預熱時間但今天尚未執行的 (market, 交易日)
+        """
+        now = now or datetime.now(ZoneInfo("UTC"))
+        result = []
+        for market in self.markets:
+            local = now.astimezone(ZoneInfo(self.schedule[market][0]))
+            day = local.date().isoformat()
+            if local.weekday() < 5 and local >= self._run_time(market, local) and query_stats.last_run(market) != day:
+                result.append((market, day))
+        return result
+
+    def next_run(self, now: Optional[datetime] = None) -> datetime:
+        """
+        下一次預熱時間（UTC）
+        """
+        now = now or datetime.now(ZoneInfo("UTC"))
+        candidates = []
+        for market in self.markets:
+            local = now.astimezone(ZoneInfo(self.schedule[market][0]))
+            for offset in range(8):
+                day = local + timedelta(days=offset)
+                run = self._run_time(market, day)
+                if day.weekday() < 5 and run > local:
+                    candidates.append(run.astimezone(ZoneInfo("UTC")))
+                    break
+        return min(candidates)
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[dict]:
+        summaries = []
+        for market, day in self.due(now):
+            print(f"開始預熱 {market} 熱門股票（{day}）")
+            summary = run_prewarm(market, self.top_k, agent=self.agent)
+            query_stats.mark_run(market, day)
+            self.last_summary[market] = summary
+            print(f"預熱 {market} 完成：{summary['warmed']} 檔，失敗 {len(summary['failed'])} 檔，"
+                  f"耗時 {summary['seconds']:.1f} 秒")
+            summaries.append(summary)
+        if summaries:
+            query_stats.prune()
+        return summaries
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"預熱排程執行失敗：{e}")
+            wait = (self.next_run() - datetime.now(ZoneInfo("UTC"))).total_seconds()
+            # 最多睡 MAX_SLEEP_SECONDS，避免系統休眠或時鐘調整後錯過排程
+            self._stop.wait(min(max(wait, 1), MAX_SLEEP_SECONDS))
+
+    def start(self) -> "PrewarmScheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="prewarm-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="收盤後預熱熱門股票快取")
+    parser.add_argument("--market", choices=["tw", "us"], action="append", help="市場（可重複，預設兩者）")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_K, help="每個市場預熱的檔數")
+    parser.add_argument("--llm", action="store_true", help="一併預先產生 AI 分析")
+    parser.add_argument("--now", action="store_true", help="立即執行一次（不等收盤時間）")
+    parser.add_argument("--daemon", action="store_true", help="常駐執行，每個交易日收盤後預熱")
+    args = parser.parse_args()
+
+    markets = args.market or ["tw", "us"]
+    agent = None
+    if args.llm:
+        from agent import StockAgent
+        agent = StockAgent()
+
+    if args.now:
+        for market in markets:
+            summary = run_prewarm(market, args.top, agent=agent)
+            print(f"{market}：預熱 {summary['warmed']} 檔，失敗 {len(summary['failed'])} 檔，"
+                  f"耗時 {summary['seconds']:.1f} 秒")
+            for ticker, error in summary["failed"].items():
+                print(f"  {ticker}：{error}")
+    elif args.daemon:
+        scheduler = PrewarmScheduler(markets, args.top, agent=agent)
+        print(f"預熱排程已啟動，下一次：{scheduler.next_run().astimezone():%Y-%m-%d %H:%M}")
+        scheduler._loop()
+    else:
+        scheduler = PrewarmScheduler(markets, args.top)
+        for market in markets:
+            print(f"{market} 熱門股票：{', '.join(popular_tickers(market, args.top))}")
+        print(f"下一次預熱：{scheduler.next_run().astimezone():%Y-%m-%d %H:%M}")
+
+
+if __name__ == "__main__":
+    main()
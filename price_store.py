@@ -0,0 +1,255 @@
+# price_store.py
+
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+import yfinance as yf
+
+from bar_archive import BarArchive
+from bars import Bars
+from config import DATA_DIR
+from fetch_gateway import gateway
+from metrics import metrics
+
+PRICE_DIR = os.path.join(DATA_DIR, "prices")
+
+# 同一檔股票在此秒數內不重複向 Yahoo 要資料
+DEFAULT_REFRESH_SECONDS = 300
+# 本機價格一律為未還原權息的原始價格，與交易所每日行情（tw_daily_quotes）一致，兩者可寫入同一序列
+PRICE_BASIS = "unadjusted"
+
+
+def _yf_history(symbol: str, **kwargs) -> pd.DataFrame:
+    kwargs.setdefault("auto_adjust", False)
+    return yf.Ticker(symbol).history(**kwargs)
+
+
+def period_to_offset(period: str) -> Optional[pd.DateOffset]:
+    """
+    將 yfinance 的 period 字串轉為 DateOffset
+    例：2mo -> 2 個月，1y -> 1 年；max 回傳 None（不切窗）
+    """
+    if period == "max":
+        return None
+    if period == "ytd":
+        today = pd.Timestamp.now()
+        return pd.DateOffset(days=today.dayofyear - 1)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not match:
+        raise ValueError(f"不支援的 period 格式：{period}")
+    n, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        return pd.DateOffset(days=n)
+    if unit == "wk":
+        return pd.DateOffset(weeks=n)
+    if unit == "mo":
+        return pd.DateOffset(months=n)
+    return pd.DateOffset(years=n)
+
+
+
+_CN_NUMBERS = "零一兩三四五六七八九十"
+_PERIOD_UNITS = {"d": "天", "wk": "週", "mo": "個月", "y": "年"}
+_INTERVAL_UNITS = {"m": "分鐘線", "h": "小時線", "d": "日線", "wk": "週線", "mo": "月線"}
+
+
+def describe_period(period: str, interval: str = "1d") -> str:
+    """
+    資料範圍的中文說明，例：2mo/1d -> 近兩個月資料，60d/5m -> 近60天5分鐘線資料
+    """
+    if period == "max":
+        text = "全部歷史"
+    elif period == "ytd":
+        text = "今年以來"
+    else:
+        match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+        if not match:
+            return f"{period}資料"
+        n = int(match.group(1))
+        text = f"近{_CN_NUMBERS[n] if n <= 10 else n}{_PERIOD_UNITS[match.group(2)]}"
+    if interval != "1d":
+        match = re.fullmatch(r"(\d+)(m|h|d|wk|mo)", interval)
+        if match:
+            n, unit = int(match.group(1)), match.group(2)
+            text += _INTERVAL_UNITS[unit] if n == 1 and unit in ("d", "wk", "mo") else f"{n}{_INTERVAL_UNITS[unit]}"
+        else:
+            text += interval
+    return text + "資料"
+
+
+class PriceStore:
+    """
+    本機 OHLCV 資料庫：每檔股票（每種 interval）一組記憶體映射的欄位檔（見 bar_archive）
+    讀取時先用本機資料，只向上游補抓最後一根 K 棒之後的資料再附加寫回
+    價格為未還原權息的原始價格（PRICE_BASIS）；舊版以還原價格寫入的資料視為沒有資料，會重新下載
+    """
+
+    def __init__(self, root: str = PRICE_DIR,
+                 downloader: Callable[..., pd.DataFrame] = _yf_history,
+                 refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        self.root = root
+        self.archive = BarArchive(root, tag=PRICE_BASIS)
+        self.downloader = downloader
+        self.refresh_seconds = refresh_seconds
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._listeners = []
+
+    def _lock(self, key: str) -> threading.RLock:
+        # 可重入：寫入通知的 callback 可以再讀取同一檔股票
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def add_listener(self, callback: Callable[[str, str, pd.DataFrame], None]):
+        """
+        註冊寫入通知：每次寫入 K 棒（下載、增量補抓、合併）後呼叫 callback(symbol, interval, 寫入的 K 棒)
+        例如篩選索引以此增量更新（見 screener.SignalIndex.watch）
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str, str, pd.DataFrame], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, symbol: str, interval: str, df: pd.DataFrame):
+        for callback in list(self._listeners):
+            try:
+                callback(symbol, interval, df)
+            except Exception as e:
+                print(f"價格更新通知失敗（{symbol}）：{e}")
+
+    def path(self, symbol: str, interval: str = "1d") -> str:
+        return self.archive.path(symbol, interval)
+
+    def load(self, symbol: str, interval: str = "1d") -> Optional[pd.DataFrame]:
+        """
+        讀取本機的全部資料（不連網），沒有資料時回傳 None
+        """
+        try:
+            df = self.archive.frame(symbol, interval)
+        except Exception as e:
+            print(f"讀取本機價格資料失敗（{self.path(symbol, interval)}）：{e}")
+            return None
+        return df if not df.empty else None
+
+    def save(self, symbol: str, df: pd.DataFrame, interval: str = "1d", complete: Optional[bool] = None):
+        """
+        寫入資料，與本機資料重疊的部分以 df 為準
+        complete 為 True 表示上游沒有更早的資料（見 BarArchive.write）
+        """
+        self.archive.write(symbol, df, interval, complete)
+        self._notify(symbol, interval, df)
+
+    def merge(self, symbol: str, df: pd.DataFrame, interval: str = "1d"):
+        """
+        與本機資料合併（重疊的日期以 df 為準），保留 df 最後一天之後的既有 K 棒；
+        回補較舊的日期時使用（save 會以 df 取代其起始日之後的全部資料）
+        """
+        with self._lock(self.path(symbol, interval)):
+            merged = df
+            if self.archive.rows(symbol, interval):
+                existing = self.archive.frame(symbol, interval, start=df["Date"].min())
+                if not existing.empty:
+                    merged = pd.concat([existing, df], ignore_index=True)
+            self.archive.write(symbol, merged, interval)
+            self._notify(symbol, interval, df)
+
+    def _is_fresh(self, symbol: str, interval: str) -> bool:
+        mtime = self.archive.mtime(symbol, interval)
+        return mtime is not None and time.time() - mtime < self.refresh_seconds
+
+    def _download(self, symbol: str, **kwargs) -> pd.DataFrame:
+        gateway.throttle("yahoo_history")
+        metrics.inc("upstream_calls_total", source="yahoo_history")
+        df = self.downloader(symbol, **kwargs)
+        if df is None or df.empty:
+            return pd.DataFrame()
+        df = df.reset_index()
+        # 分鐘線的日期欄位名稱為 Datetime，統一為 Date
+        return df.rename(columns={df.columns[0]: "Date"})
+
+    def _sync(self, symbol: str, period: str, interval: str):
+        """
+        確保本機資料涵蓋 period 並且是最新的，回傳期間的起始時間（None 表示全部）
+        """
+        offset = period_to_offset(period)
+        with self._lock(self.path(symbol, interval)):
+            bounds = self.archive.bounds(symbol, interval)
+            window_start = None
+            if bounds is not None:
+                first, last = bounds
+                if offset is not None:
+                    window_start = pd.Timestamp.now(tz=first.tz) - offset
+                # 本機資料涵蓋要求的期間（容許一週假日誤差），或上游已沒有更早的資料（新上市、抓過全部歷史）
+                covers = (self.archive.meta(symbol, interval) or {}).get("complete") or (
+                    window_start is not None and first <= window_start + pd.Timedelta(days=7))
+                if covers:
+                    if self._is_fresh(symbol, interval):
+                        metrics.inc("cache_requests_total", cache="price", result="hit")
+                    else:
+                        metrics.inc("cache_requests_total", cache="price", result="delta")
+                        self._append_delta(symbol, last, interval)
+                    return window_start
+
+            # 否則重新抓整段
+            metrics.inc("cache_requests_total", cache="price", result="miss")
+            df = self._download(symbol, period=period, interval=interval)
+            if df.empty:
+                # 上游失敗時退回使用本機舊資料（仍只取要求的期間）
+                return window_start
+            if offset is not None:
+                window_start = pd.Timestamp.now(tz=df["Date"].dt.tz) - offset
+            # 上游給的資料比要求的期間短（或要求全部歷史）：之後更長的期間也不必再重抓
+            complete = window_start is None or df["Date"].min() > window_start + pd.Timedelta(days=7)
+            self.save(symbol, df, interval, complete)
+            return window_start
+
+    def history(self, symbol: str, period: str = "2mo", interval: str = "1d") -> pd.DataFrame:
+        """
+        取得 symbol 在 period 期間內的歷史資料（DataFrame，第一欄為 Date）
+        """
+        start = self._sync(symbol, period, interval)
+        return self.archive.frame(symbol, interval, start)
+
+    def bars(self, symbol: str, period: str = "2mo", interval: str = "1d") -> Optional[Bars]:
+        """
+        同 history，但直接由記憶體映射檔切出期間內的資料為 Bars（已預留指標欄位），
+        長序列不經過 DataFrame
+        """
+        start = self._sync(symbol, period, interval)
+        return self.archive.read(symbol, interval, start)
+
+    def poll(self, symbol: str, since, interval: str = "1d") -> Optional[Bars]:
+        """
+        即時模式使用：不論本機資料多新都向上游補抓最後一根 K 棒之後的資料，
+        回傳 since（含，通常為呼叫端已有的最後一根 K 棒）之後的 K 棒（不含指標欄位）
+        本機沒有這檔股票時回傳 None
+        """
+        with self._lock(self.path(symbol, interval)):
+            bounds = self.archive.bounds(symbol, interval)
+            if bounds is None:
+                return None
+            metrics.inc("cache_requests_total", cache="price", result="delta")
+            self._append_delta(symbol, bounds[1], interval)
+        return self.archive.read(symbol, interval, since, extra_columns=())
+
+    def _append_delta(self, symbol: str, last: pd.Timestamp, interval: str):
+        """只抓最後一根 K 棒（含，可能尚未收盤）之後的資料並附加"""
+        try:
+            delta = self._download(symbol, start=last.strftime("%Y-%m-%d"), interval=interval)
+        except Exception as e:
+            print(f"增量更新 {symbol} 失敗，使用本機資料：{e}")
+            return
+        if delta.empty:
+            self.archive.touch(symbol, interval)  # 沒有新資料也記錄本次檢查時間
+            return
+        self.save(symbol, delta, interval)
+
+
+# 模組層級共用實例
+price_store = PriceStore()
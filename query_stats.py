@@ -0,0 +1,121 @@
+# query_stats.py
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from config import DATA_DIR
+
+QUERY_STATS_PATH = os.path.join(DATA_DIR, "query_stats.sqlite")
+FLUSH_SECONDS = 60
+
+
+class QueryStats:
+    """
+    每檔股票每日的查詢次數（SQLite），供收盤後預熱挑選熱門股票
+    查詢時只在記憶體中累計，每隔一段時間才寫入資料庫，不增加查詢延遲
+    """
+
+    def __init__(self, path: str = QUERY_STATS_PATH, flush_seconds: float = FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._pending = Counter()
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_counts ("
+                " market TEXT NOT NULL,"
+                " ticker TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " PRIMARY KEY (market, ticker, day))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prewarm_runs ("
+                " market TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " finished_at REAL NOT NULL,"
+                " PRIMARY KEY (market, day))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def record(self, ticker: str, market: str):
+        """
+        記錄一次查詢
+        """
+        if not ticker or market not in ("tw", "us"):
+            return
+        with self._lock:
+            self._pending[(market, ticker.upper(), time.strftime("%Y-%m-%d"))] += 1
+            due = time.time() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.time()
+            if not pending:
+                return
+            conn = self._connection()
+            conn.executemany(
+                "INSERT INTO query_counts (market, ticker, day, count) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (market, ticker, day) DO UPDATE SET count = count + excluded.count",
+                [(market, ticker, day, n) for (market, ticker, day), n in pending.items()],
+            )
+            conn.commit()
+
+    def top(self, market: str, k: int, days: int = 14) -> List[str]:
+        """
+        最近 days 天查詢次數最多的前 k 檔
+        """
+        self.flush()
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT ticker FROM query_counts WHERE market = ? AND day >= ?"
+                " GROUP BY ticker ORDER BY SUM(count) DESC, ticker LIMIT ?",
+                (market, since, k),
+            ).fetchall()
+        return [ticker for (ticker,) in rows]
+
+    def last_run(self, market: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT MAX(day) FROM prewarm_runs WHERE market = ?", (market,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_run(self, market: str, day: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO prewarm_runs (market, day, finished_at) VALUES (?, ?, ?)",
+                (market, day, time.time()),
+            )
+            conn.commit()
+
+    def prune(self, days: int = 90):
+        """刪除超過 days 天的查詢紀錄"""
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM query_counts WHERE day < ?", (since,))
+            conn.commit()
+
+
+# 模組層級共用實例
+query_stats = QueryStats()
+atexit.register(query_stats.flush)
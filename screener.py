@@ -0,0 +1,475 @@
+# screener.py
+"""
+技術訊號篩選器：為整個股票池維護最新一根 K 棒的指標值與訊號，查詢時不需連網
+新 K 棒到來時以增量指標引擎 O(1) 更新單一股票
+索引檔由明確的寫入者更新（--build、收盤後預熱、交易所行情匯入），存檔時在檔案鎖內與磁碟上的索引合併
+
+例：
+python screener.py --build data/scan_tw.parquet
+python screener.py --market tw --where "RSI_14<30" --where "Close<BB_Lower"
+python screener.py --signal RSI超賣 --sort RSI_14
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from bars import INDICATOR_COLUMNS, Bars
+from config import DATA_DIR
+from indicator_engine import IndicatorEngine
+from metrics import metrics
+from price_store import price_store
+from stock_utils import SIGNAL_LABELS, signal_masks
+from ticker_resolver import resolver
+
+try:
+    import fcntl
+except ImportError:  # Windows：不加檔案鎖（仍會與磁碟上的索引合併）
+    fcntl = None
+
+INDEX_PATH = os.path.join(DATA_DIR, "screener.parquet")
+FIELDS = ("Close",) + INDICATOR_COLUMNS
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+_CONDITION = re.compile(r"\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*")
+_NAT = np.iinfo(np.int64).min
+
+
+def parse_condition(text: str) -> tuple:
+    """
+    將 "RSI_14<30"、"Close<BB_Lower" 解析為 (欄位, 運算子, 數值或欄位)
+    """
+    match = _CONDITION.fullmatch(text)
+    if not match:
+        raise ValueError(f"無法解析的條件：{text}")
+    field, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return field, op, value
+
+
+def _to_ns(date) -> int:
+    if date is None:
+        return _NAT
+    ts = pd.Timestamp(date)
+    if ts.tz is not None:
+        ts = ts.tz_localize(None)  # 以交易所當地日期為準
+    return ts.as_unit("ns").value
+
+
+class SignalIndex:
+    """
+    整個股票池的最新指標值（欄位導向的 NumPy 陣列）與訊號位元遮罩
+    - 每檔股票一列，以 (market, ticker) 定位
+    - 查詢以向量運算一次比較全部股票
+    - 訊號在寫入時計算，規則與 generate_analysis_summary 相同
+    """
+
+    def __init__(self, path: Optional[str] = INDEX_PATH, engine: Optional[IndicatorEngine] = None,
+                 capacity: int = 1024, store=price_store):
+        self.path = path
+        self.engine = engine or IndicatorEngine()
+        self.store = store
+        self._rows = {}
+        self._tickers = []
+        self._markets = np.empty(capacity, dtype="U2")
+        self._dates = np.full(capacity, _NAT, dtype=np.int64)
+        self._values = np.full((len(FIELDS), capacity), np.nan)
+        self._flags = np.zeros(capacity, dtype=np.uint16)
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._tickers)
+
+    def __contains__(self, key) -> bool:
+        return tuple(key) in self._rows
+
+    # ---- 寫入 ----
+    def _row(self, ticker: str, market: str) -> int:
+        key = (market, ticker)
+        i = self._rows.get(key)
+        if i is not None:
+            return i
+        i = len(self._tickers)
+        if i == len(self._dates):
+            self._grow()
+        self._rows[key] = i
+        self._tickers.append(ticker)
+        self._markets[i] = market
+        return i
+
+    def _grow(self):
+        capacity = len(self._dates) * 2
+        markets = np.empty(capacity, dtype="U2")
+        markets[:len(self._markets)] = self._markets
+        dates = np.full(capacity, _NAT, dtype=np.int64)
+        dates[:len(self._dates)] = self._dates
+        values = np.full((len(FIELDS), capacity), np.nan)
+        values[:, :self._values.shape[1]] = self._values
+        flags = np.zeros(capacity, dtype=np.uint16)
+        flags[:len(self._flags)] = self._flags
+        self._markets, self._dates, self._values, self._flags = markets, dates, values, flags
+
+    def _refresh_flags(self, rows):
+        v = {name: self._values[j, rows] for j, name in enumerate(FIELDS)}
+        masks = signal_masks(v["Close"], v["MA_5"], v["MA_20"], v["RSI_14"], v["BB_Upper"], v["BB_Lower"])
+        flags = np.zeros(np.shape(rows), dtype=np.uint16)
+        for bit, label in enumerate(SIGNAL_LABELS):
+            flags |= masks[label].astype(np.uint16) << bit
+        self._flags[rows] = flags
+
+    def upsert(self, ticker: str, market: str, values: dict, date=None):
+        """
+        寫入單一股票最新一根 K 棒的指標值（values 含 Close 與指標欄位）
+        """
+        with self._lock:
+            i = self._row(ticker, market)
+            for j, name in enumerate(FIELDS):
+                value = values.get(name)
+                self._values[j, i] = np.nan if value is None else value
+            self._dates[i] = _to_ns(date)
+            self._refresh_flags(i)
+        metrics.inc("screener_updates_total", kind="upsert")
+
+    def upsert_frame(self, df: pd.DataFrame):
+        """
+        一次寫入多檔股票（欄位：ticker、market、date 及 FIELDS）
+        例如 batch_scan 的輸出
+        """
+        with self._lock:
+            rows = np.array([self._row(t, m) for t, m in zip(df["ticker"], df["market"])], dtype=np.intp)
+            if not len(rows):
+                return
+            for j, name in enumerate(FIELDS):
+                if name in df.columns:
+                    self._values[j, rows] = df[name].to_numpy(dtype=float, na_value=np.nan)
+            if "date" in df.columns:
+                self._dates[rows] = [_to_ns(d) for d in df["date"]]
+            self._refresh_flags(rows)
+        metrics.inc("screener_updates_total", kind="bulk")
+
+    def seed(self, ticker: str, market: str, closes: Sequence[float], date=None):
+        """
+        以歷史收盤價初始化該股票的增量指標狀態並寫入索引
+        """
+        latest = self.engine.seed(f"{market}:{ticker}", closes)
+        if latest is not None:
+            self.upsert(ticker, market, latest, date)
+
+    def seed_from_bars(self, ticker: str, market: str, bars: Bars):
+        self.seed(ticker, market, bars["Close"], bars.date_index()[-1] if len(bars) else None)
+
+    def seed_from_store(self, ticker: str, market: str, interval: str = "1d", symbol: Optional[str] = None) -> bool:
+        """
+        由本機價格資料庫初始化（只讀本機檔案，不向上游抓資料），沒有資料時回傳 False
+        symbol 為 Yahoo 代號，未指定時由 ticker 推得
+        """
+        df = self.store.load(symbol or resolver.yahoo_symbol(ticker, market), interval)
+        if df is None or df.empty:
+            return False
+        self.seed(ticker, market, df["Close"].to_numpy(dtype=float), df[df.columns[0]].iloc[-1])
+        return True
+
+    def on_bar(self, ticker: str, market: str, close: float, date) -> dict:
+        """
+        新 K 棒（或同一根 K 棒的新報價）到來時增量更新，回傳最新的指標值
+        尚未有狀態的股票會先由本機價格資料庫初始化
+        """
+        key = f"{market}:{ticker}"
+        date_ns = _to_ns(date)
+        with self._lock:
+            if not self.engine.has(key):
+                self.seed_from_store(ticker, market)
+            i = self._rows.get((market, ticker))
+            last_ns = self._dates[i] if i is not None else _NAT
+            if self.engine.has(key) and date_ns < last_ns:
+                return self.engine.latest(key)  # 比索引中更舊的 K 棒，忽略
+            if self.engine.has(key) and date_ns == last_ns:
+                latest = self.engine.revise(key, close)
+            else:
+                latest = self.engine.update(key, close)
+            self.upsert(ticker, market, latest, date)
+        return latest
+
+    def watch(self):
+        """
+        訂閱 self.store 的寫入通知：之後寫入的日線 K 棒都會更新索引（不會自動存檔，需自行呼叫 save）
+        """
+        self.store.add_listener(self.on_bars)
+
+    def unwatch(self):
+        self.store.remove_listener(self.on_bars)
+
+    def on_bars(self, symbol: str, interval: str, df: pd.DataFrame):
+        """
+        價格資料庫寫入一段 K 棒（symbol 為 Yahoo 代號，df 第一欄為日期）後更新該股票，只處理日線
+        """
+        if interval != "1d" or df.empty:
+            return
+        ticker, market = resolver.from_yahoo(symbol)
+        if not self.engine.has(f"{market}:{ticker}"):
+            # 還沒有狀態：資料庫已含這次寫入的 K 棒，直接由資料庫初始化
+            self.seed_from_store(ticker, market, symbol=symbol)
+        else:
+            for date, close in zip(df[df.columns[0]], df["Close"].to_numpy(dtype=float)):
+                self.on_bar(ticker, market, close, date)
+
+    def remove(self, ticker: str, market: str):
+        with self._lock:
+            i = self._rows.pop((market, ticker), None)
+            if i is None:
+                return
+            # 將最後一列搬到被刪除的位置
+            last = len(self._tickers) - 1
+            if i != last:
+                moved = (str(self._markets[last]), self._tickers[last])
+                self._rows[moved] = i
+                self._tickers[i] = self._tickers[last]
+                self._markets[i] = self._markets[last]
+                self._dates[i] = self._dates[last]
+                self._values[:, i] = self._values[:, last]
+                self._flags[i] = self._flags[last]
+            self._tickers.pop()
+            self._dates[last] = _NAT
+            self._values[:, last] = np.nan
+            self._flags[last] = 0
+            self.engine.reset(f"{market}:{ticker}")
+
+    # ---- 查詢 ----
+    def _column(self, name: str, n: int) -> np.ndarray:
+        if name not in FIELDS:
+            raise ValueError(f"未知的欄位：{name}（可用：{', '.join(FIELDS)}）")
+        return self._values[FIELDS.index(name), :n]
+
+    def query(self, market: Optional[str] = None, signals: Iterable[str] = (),
+              where: Iterable = (), sort_by: Optional[str] = None, ascending: bool = True,
+              limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        篩選股票
+        Args:
+            market: "tw" / "us"，None 為全部
+            signals: 必須同時具備的訊號，例如 ["RSI超賣", "跌破布林下軌"]
+            where: 條件，字串 "RSI_14<30" 或 (欄位, 運算子, 數值或欄位)；NaN 一律不符合
+            sort_by: 排序欄位
+        """
+        with metrics.timer("call_duration_seconds", op="screener_query"), self._lock:
+            n = len(self._tickers)
+            mask = np.ones(n, dtype=bool)
+            if market is not None:
+                mask &= self._markets[:n] == market
+            required = 0
+            for label in signals:
+                if label not in SIGNAL_LABELS:
+                    raise ValueError(f"未知的訊號：{label}（可用：{'、'.join(SIGNAL_LABELS)}）")
+                required |= 1 << SIGNAL_LABELS.index(label)
+            if required:
+                mask &= (self._flags[:n] & required) == required
+            for condition in where:
+                field, op, value = parse_condition(condition) if isinstance(condition, str) else condition
+                if op not in OPERATORS:
+                    raise ValueError(f"不支援的運算子：{op}")
+                rhs = self._column(value, n) if isinstance(value, str) else value
+                mask &= OPERATORS[op](self._column(field, n), rhs)
+
+            rows = np.flatnonzero(mask)
+            if sort_by is not None:
+                keys = self._column(sort_by, n)[rows]
+                order = np.argsort(keys if ascending else -keys, kind="stable")
+                rows = rows[order]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._frame(rows)
+
+    def _frame(self, rows: np.ndarray) -> pd.DataFrame:
+        frame = pd.DataFrame({
+            "ticker": [self._tickers[i] for i in rows],
+            "market": self._markets[rows].astype(object),
+            "date": self._dates[rows].view("datetime64[ns]"),  # _NAT 即為 NaT
+        })
+        for j, name in enumerate(FIELDS):
+            frame[name] = self._values[j, rows]
+        frame["signals"] = [self.labels_of(int(f)) for f in self._flags[rows]]
+        return frame
+
+    @staticmethod
+    def labels_of(flags: int) -> list:
+        return [label for bit, label in enumerate(SIGNAL_LABELS) if flags >> bit & 1]
+
+    def get(self, ticker: str, market: str) -> Optional[dict]:
+        with self._lock:
+            i = self._rows.get((market, ticker))
+            if i is None:
+                return None
+            return self._frame(np.array([i])).iloc[0].to_dict()
+
+    def to_frame(self) -> pd.DataFrame:
+        with self._lock:
+            return self._frame(np.arange(len(self._tickers)))
+
+    # ---- 存檔 ----
+    def _state_path(self, path: str) -> str:
+        return os.path.splitext(path)[0] + ".state.json"
+
+    def save(self, path: Optional[str] = None):
+        """
+        索引存為 Parquet，增量指標狀態另存 JSON（兩者皆以原子替換寫入）
+        在檔案鎖內先讀入磁碟上的索引並合併：同一檔股票以日期較新者為準（相同時以本行程為準），
+        只在磁碟上的股票保留，多個行程輪流存檔不會蓋掉彼此寫入的股票
+        """
+        path = path or self.path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _file_lock(path + ".lock"):
+            with self._lock:
+                frame = self.to_frame().drop(columns="signals")
+                snapshot = self.engine.snapshot()
+            if os.path.exists(path):
+                frame, snapshot = _merge_saved(path, frame, snapshot)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            state_path = self._state_path(path)
+            tmp_path = f"{state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, state_path)
+
+    def load(self, path: Optional[str] = None):
+        """
+        讀入索引檔；指標狀態檔無法讀取時視為沒有狀態（之後由本機價格資料庫重新初始化）
+        """
+        path = path or self.path
+        frame = pd.read_parquet(path)
+        snapshot = _read_snapshot(self._state_path(path))
+        with self._lock:
+            self.upsert_frame(frame)
+            if snapshot is not None:
+                try:
+                    self.engine.restore(snapshot)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"指標狀態無法還原，略過：{e}")
+
+    def build_from_scan(self, scan_path: str) -> int:
+        """
+        由 batch_scan 的輸出建立索引，回傳寫入的股票數（略過失敗的股票）
+        """
+        df = pd.read_parquet(scan_path)
+        if "error" in df.columns:
+            df = df[df["error"].isna()]
+        df = df.rename(columns={"close": "Close"})
+        self.upsert_frame(df)
+        return len(df)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """跨行程的獨占檔案鎖（fcntl.flock，關閉檔案即釋放）；沒有 fcntl 的平台不加鎖"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _read_snapshot(state_path: str) -> Optional[dict]:
+    """讀取指標狀態檔，不存在或內容損毀時回傳 None"""
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"指標狀態檔無法讀取，略過（{state_path}）：{e}")
+        return None
+    return snapshot if isinstance(snapshot, dict) else None
+
+
+def _merge_saved(path: str, frame: pd.DataFrame, snapshot: dict):
+    """
+    將本行程的索引（frame、snapshot）與磁碟上的索引合併，回傳合併後的 (frame, snapshot)
+    """
+    try:
+        saved = pd.read_parquet(path)
+    except Exception as e:
+        print(f"索引檔無法讀取，以本行程的索引取代（{path}）：{e}")
+        return frame, snapshot
+    saved_snapshot = _read_snapshot(os.path.splitext(path)[0] + ".state.json")
+    if saved_snapshot is None or saved_snapshot.get("version") != snapshot["version"]:
+        saved_snapshot = {"tickers": {}}
+
+    mine = dict(zip(zip(frame["market"], frame["ticker"]), frame["date"].to_numpy()))
+    keep = []  # 磁碟上較新、或本行程沒有的股票
+    for i, (market, ticker, saved_date) in enumerate(zip(saved["market"], saved["ticker"], saved["date"])):
+        date = mine.get((market, ticker))
+        if date is None or (pd.notna(saved_date) and (pd.isna(date) or saved_date > date)):
+            keep.append(i)
+    if not keep:
+        return frame, snapshot
+
+    kept = saved.iloc[keep]
+    newer = set(zip(kept["market"], kept["ticker"]))
+    frame = pd.concat([frame[[key not in newer for key in zip(frame["market"], frame["ticker"])]],
+                       kept[[c for c in frame.columns if c in kept.columns]]], ignore_index=True)
+    tickers = dict(snapshot["tickers"])
+    for market, ticker in newer:
+        state_key = f"{market}:{ticker}"
+        if state_key in saved_snapshot["tickers"]:
+            tickers[state_key] = saved_snapshot["tickers"][state_key]
+        else:
+            tickers.pop(state_key, None)  # 磁碟上較新的列沒有狀態：捨棄本行程較舊的狀態
+    return frame, {**snapshot, "tickers": tickers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技術訊號篩選")
+    parser.add_argument("--index", default=INDEX_PATH, help="索引檔")
+    parser.add_argument("--build", nargs="+", metavar="SCAN", help="由 batch_scan 的輸出建立 / 更新索引")
+    parser.add_argument("--seed", action="store_true", help="由本機價格資料庫初始化增量指標狀態")
+    parser.add_argument("--market", choices=["us", "tw"], help="市場")
+    parser.add_argument("--signal", action="append", default=[], help=f"訊號：{'、'.join(SIGNAL_LABELS)}")
+    parser.add_argument("--where", action="append", default=[], help='條件，例如 "RSI_14<30"、"Close<BB_Lower"')
+    parser.add_argument("--sort", help="排序欄位")
+    parser.add_argument("--desc", action="store_true", help="由大到小排序")
+    parser.add_argument("--limit", type=int, help="最多顯示幾檔")
+    args = parser.parse_args()
+
+    index = SignalIndex(args.index)
+    if args.build:
+        for scan_path in args.build:
+            print(f"{scan_path}：寫入 {index.build_from_scan(scan_path)} 檔")
+        if args.seed:
+            seeded = sum(index.seed_from_store(t, m) for m, t in list(index._rows))
+            print(f"已由本機價格資料初始化 {seeded} 檔")
+        index.save()
+        print(f"索引共 {len(index)} 檔：{args.index}")
+        return
+
+    result = index.query(market=args.market, signals=args.signal, where=args.where,
+                         sort_by=args.sort, ascending=not args.desc, limit=args.limit)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(result.to_string(index=False) if not result.empty else "沒有符合條件的股票")
+    print(f"共 {len(result)} 檔")
+
+
+if __name__ == "__main__":
+    main()
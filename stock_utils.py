@@ -1,145 +1,142 @@
+import re
+from typing import Iterable
 import pandas as pd
 import yfinance as yf
 import numpy as np
+from bars import Bars
+from config import DEFAULT_PERIOD, DEFAULT_INTERVAL
+from price_store import price_store
+from ticker_resolver import resolver
+from fetch_gateway import gateway
+from fundamentals_cache import FundamentalsCache
+from metrics import metrics, traced
+from indicator_kernels import compute_into, output_columns
+
+# 民國年日期：111/01/01、111-1-1、111年01月01日，或不含分隔的 1110101
+_ROC_DATE = re.compile(r"(\d{2,3})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})日?")
+_ROC_COMPACT = re.compile(r"(\d{2,3})(\d{2})(\d{2})")
+
+
 def convert_tw_date(date_str):
     """
     將台灣民國年日期轉換為西元年
-    例：111/01/01 -> 2022-01-01
+    例：111/01/01、1110101、111年01月01日 -> 2022-01-01
+    無法辨識時原樣回傳
     """
     try:
-        parts = date_str.split('/')
-        if len(parts) == 3:
-            roc_year = int(parts[0])
+        text = str(date_str).strip()
+        match = _ROC_DATE.fullmatch(text) or _ROC_COMPACT.fullmatch(text)
+        if match:
+            roc_year, month, day = (int(part) for part in match.groups())
             western_year = roc_year + 1911  # 民國年轉西元年
-            month = parts[1].zfill(2)
-            day = parts[2].zfill(2)
-            return f"{western_year}-{month}-{day}"
+            return f"{western_year}-{month:02d}-{day:02d}"
         return date_str
-    except (ValueError, IndexError):
+    except (ValueError, IndexError, AttributeError):
         return date_str
 
-def fetch_us_stock(ticker: str, period: str = "2mo", interval: str = "1d") -> pd.DataFrame:
+@traced("fetch_us_stock")
+@gateway.coalesce("fetch_us_stock")
+def fetch_us_stock(ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL) -> pd.DataFrame:
     """
-    使用 yfinance 抓取美股歷史資料（近兩個月、日線）。
+    使用 yfinance 抓取美股歷史資料（預設近兩個月、日線）。
+    先讀本機價格資料庫，只向上游補抓缺少的 K 棒。
     回傳 DataFrame，包含開高低收、成交量。
     """
-    stock = yf.Ticker(ticker)
-    
-    # info = stock.info
-
-    df = stock.history(period=period, interval=interval)
+    df = price_store.history(resolver.yahoo_symbol(ticker, "us"), period=period, interval=interval)
     if df.empty:
         raise ValueError(f"無法取得 {ticker} 的美股資料。")
-    df.reset_index(inplace=True)
-    return df#,info
+    return df
 
-def fetch_tw_stock(ticker: str) -> pd.DataFrame:
+@traced("fetch_tw_stock")
+@gateway.coalesce("fetch_tw_stock")
+def fetch_tw_stock(ticker: str, period: str = DEFAULT_PERIOD, interval: str = DEFAULT_INTERVAL) -> pd.DataFrame:
     """
-    使用 yfinance 抓取台股歷史資料（近兩個月、日線）
+    使用 yfinance 抓取台股歷史資料（預設近兩個月、日線）
+    先讀本機價格資料庫，只向上游補抓缺少的 K 棒
     """
-    tw_ticker = f"{ticker}.TW"
+    # 上櫃股票為 .TWO，其餘為 .TW（依股票主檔判斷）
+    tw_ticker = resolver.yahoo_symbol(ticker, "tw")
     try:
-        stock = yf.Ticker(tw_ticker)
-        df = stock.history(period="2mo", interval="1d")
+        # 本機資料庫回傳的資料已重設索引，日期為一般欄位
+        df = price_store.history(tw_ticker, period=period, interval=interval)
         
         if df.empty:
             raise ValueError(f"無法取得 {ticker} 的台股資料")
         
-        # 重設索引，將日期變成一般欄位
-        df.reset_index(inplace=True)
-        
-        # 統一欄位名稱格式
-        df = df.rename(columns={
-            'Date': 'Date',
-            'Open': 'Open',
-            'High': 'High',
-            'Low': 'Low',
-            'Close': 'Close',
-            'Volume': 'Volume'
-        })
         # 選擇需要的欄位並排序
         df = df[["Date", "Open", "High", "Low", "Close", "Volume"]].sort_values("Date").reset_index(drop=True)
         return df
     except Exception as e:
         raise ValueError(f"抓取台股 {ticker} 資料時發生錯誤：{str(e)}")
 
+NA_FUNDAMENTALS = {
+    'pe_ratio': 'N/A',
+    'market_cap': 'N/A',
+    'dividend_yield': 'N/A',
+    'revenue_growth': 'N/A',
+    'profit_margin': 'N/A',
+    'debt_to_equity': 'N/A',
+    'book_value': 'N/A',
+    'price_to_book': 'N/A',
+    'sector': 'N/A',
+    'industry': 'N/A'
+}
+
+def fetch_fundamental_data(ticker: str, market: str) -> dict:
+    """
+    向上游獲取基本面資料（失敗時拋出例外，不寫入快取）
+    """
+    if market == "us":
+        gateway.throttle("yahoo_info")
+        metrics.inc("upstream_calls_total", source="yahoo_info")
+        # 使用 yfinance 獲取美股基本面資料
+        stock = yf.Ticker(ticker)
+        info = stock.info
+        
+        return {
+            'pe_ratio': info.get('trailingPE', 'N/A'),
+            'market_cap': info.get('marketCap', 'N/A'),
+            'dividend_yield': info.get('dividendYield', 'N/A'),
+            'revenue_growth': info.get('revenueGrowth', 'N/A'),
+            'profit_margin': info.get('profitMargins', 'N/A'),
+            'debt_to_equity': info.get('debtToEquity', 'N/A'),
+            'book_value': info.get('bookValue', 'N/A'),
+            'price_to_book': info.get('priceToBook', 'N/A'),
+            'sector': info.get('sector', 'N/A'),
+            'industry': info.get('industry', 'N/A')
+        }
+    # 台股基本面資料（簡化版本，實際應用可串接更詳細的API）
+    return {
+        **NA_FUNDAMENTALS,
+        'sector': '台股資料',
+        'industry': '需要進一步API串接'
+    }
+
+fundamentals_cache = FundamentalsCache(fetch_fundamental_data)
+
+@traced("get_fundamental_data")
+@gateway.coalesce("get_fundamental_data")
 def get_fundamental_data(ticker: str, market: str):
     """
     獲取基本面資料
+    優先讀取本機快取，過期欄位會在背景更新
     """
-    fundamental_data = {}
-    
     try:
-        if market == "us":
-            # 使用 yfinance 獲取美股基本面資料
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
-            fundamental_data = {
-                'pe_ratio': info.get('trailingPE', 'N/A'),
-                'market_cap': info.get('marketCap', 'N/A'),
-                'dividend_yield': info.get('dividendYield', 'N/A'),
-                'revenue_growth': info.get('revenueGrowth', 'N/A'),
-                'profit_margin': info.get('profitMargins', 'N/A'),
-                'debt_to_equity': info.get('debtToEquity', 'N/A'),
-                'book_value': info.get('bookValue', 'N/A'),
-                'price_to_book': info.get('priceToBook', 'N/A'),
-                'sector': info.get('sector', 'N/A'),
-                'industry': info.get('industry', 'N/A')
-            }
-        else:
-            # 台股基本面資料（簡化版本，實際應用可串接更詳細的API）
-            fundamental_data = {
-                'pe_ratio': 'N/A',
-                'market_cap': 'N/A',
-                'dividend_yield': 'N/A',
-                'revenue_growth': 'N/A',
-                'profit_margin': 'N/A',
-                'debt_to_equity': 'N/A',
-                'book_value': 'N/A',
-                'price_to_book': 'N/A',
-                'sector': '台股資料',
-                'industry': '需要進一步API串接'
-            }
-            
+        return fundamentals_cache.get(ticker, market)
     except Exception as e:
         print(f"基本面資料獲取失敗: {e}")
-        fundamental_data = {
-            'pe_ratio': 'N/A',
-            'market_cap': 'N/A',
-            'dividend_yield': 'N/A',
-            'revenue_growth': 'N/A',
-            'profit_margin': 'N/A',
-            'debt_to_equity': 'N/A',
-            'book_value': 'N/A',
-            'price_to_book': 'N/A',
-            'sector': 'N/A',
-            'industry': 'N/A'
-        }
-    
-    return fundamental_data
+        return dict(NA_FUNDAMENTALS)
 
-def compute_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
+def _indicator_columns(price: pd.Series) -> dict:
     """
-    計算簡單的技術指標：移動平均（MA）、相對強弱指標（RSI）等。
-    統一使用 Close 欄位處理美股和台股
+    由收盤價計算各技術指標欄位，回傳 {欄位名稱: Series}
     """
-    df = df.copy()
-    
-    # 確保有 Close 欄位
-    if "Close" not in df.columns:
-        raise ValueError("資料中缺少 Close 欄位")
-    
-    price = df["Close"]
-    
-    # 檢查資料是否足夠
-    if len(price) < 5:
-        print("警告：資料不足 5 筆，技術指標可能不準確")
+    columns = {}
     
     # 移動平均（使用 min_periods 避免 NaN）
-    df["MA_5"] = price.rolling(window=5, min_periods=1).mean()
-    df["MA_20"] = price.rolling(window=20, min_periods=1).mean()
-    df["MA_60"] = price.rolling(window=60, min_periods=1).mean()  # 新增60日均線
+    columns["MA_5"] = price.rolling(window=5, min_periods=1).mean()
+    columns["MA_20"] = price.rolling(window=20, min_periods=1).mean()
+    columns["MA_60"] = price.rolling(window=60, min_periods=1).mean()  # 新增60日均線
     
     # RSI 計算
     if len(price) >= 14:
@@ -149,61 +146,141 @@ def compute_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
         avg_gain = gain.rolling(window=14, min_periods=1).mean()
         avg_loss = loss.rolling(window=14, min_periods=1).mean()
         rs = avg_gain / (avg_loss + 1e-10)  # 避免除零
-        df["RSI_14"] = 100 - (100 / (1 + rs))
+        columns["RSI_14"] = 100 - (100 / (1 + rs))
     else:
-        df["RSI_14"] = np.nan
+        columns["RSI_14"] = np.nan
     
     # 新增布林通道（Bollinger Bands）
     if len(price) >= 20:
-        df["BB_Middle"] = price.rolling(window=20, min_periods=1).mean()
+        columns["BB_Middle"] = price.rolling(window=20, min_periods=1).mean()
         bb_std = price.rolling(window=20, min_periods=1).std()
-        df["BB_Upper"] = df["BB_Middle"] + (bb_std * 2)
-        df["BB_Lower"] = df["BB_Middle"] - (bb_std * 2)
+        columns["BB_Upper"] = columns["BB_Middle"] + (bb_std * 2)
+        columns["BB_Lower"] = columns["BB_Middle"] - (bb_std * 2)
     else:
-        df["BB_Middle"] = df["BB_Upper"] = df["BB_Lower"] = np.nan
+        columns["BB_Middle"] = columns["BB_Upper"] = columns["BB_Lower"] = np.nan
+    
+    return columns
+
+def compute_technical_indicators(df: pd.DataFrame, indicators: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    計算簡單的技術指標：移動平均（MA）、相對強弱指標（RSI）等。
+    統一使用 Close 欄位處理美股和台股
+    indicators 可另外選擇進階指標（EMA、MACD、KDJ、ATR、OBV，見 indicator_kernels）
+    """
+    df = df.copy()
+    
+    # 確保有 Close 欄位
+    if "Close" not in df.columns:
+        raise ValueError("資料中缺少 Close 欄位")
+    
+    price = df["Close"]
+    
+    # 檢查資料是否足夠
+    if len(price) < 5:
+        print("警告：資料不足 5 筆，技術指標可能不準確")
+    
+    for name, values in _indicator_columns(price).items():
+        df[name] = values
+    
+    if indicators:
+        columns = output_columns(indicators)
+        out = np.full((len(columns), len(df)), np.nan)
+        compute_into(df, dict(zip(columns, out)), indicators)
+        for name, values in zip(columns, out):
+            df[name] = values
     
     return df
 
+def compute_indicators_inplace(bars: Bars, indicators: Iterable[str] = ()) -> Bars:
+    """
+    與 compute_technical_indicators 相同的計算，但直接寫入 Bars 預留的指標欄位，
+    不複製整張價格表；進階指標的欄位未預留時一次擴充
+    """
+    if "Close" not in bars:
+        raise ValueError("資料中缺少 Close 欄位")
+    
+    if len(bars) < 5:
+        print("警告：資料不足 5 筆，技術指標可能不準確")
+    
+    # 以 Series 包裝收盤價的檢視（不複製）
+    price = pd.Series(bars["Close"], copy=False)
+    for name, values in _indicator_columns(price).items():
+        bars.set_column(name, values)
+    
+    if indicators:
+        bars.reserve(output_columns(indicators))
+        compute_into(bars, bars, indicators)
+    
+    return bars
+
+SIGNAL_LABELS = ("短期趨勢向上", "短期趨勢向下", "趨勢震盪",
+                 "RSI超買", "RSI超賣", "RSI中性",
+                 "突破布林上軌", "跌破布林下軌")
+
+def signal_masks(close, ma5, ma20, rsi, bb_upper, bb_lower) -> dict:
+    """
+    技術訊號判斷規則，輸入可為純量或陣列（整個股票池一次判斷）
+    回傳 {訊號: 布林值或布林陣列}，缺值（NaN）的指標不產生訊號
+    """
+    close, ma5, ma20, rsi, bb_upper, bb_lower = (
+        np.asarray(v, dtype=float) for v in (close, ma5, ma20, rsi, bb_upper, bb_lower))
+    
+    # 移動平均分析
+    has_ma = ~np.isnan(ma5) & ~np.isnan(ma20)
+    trend_up = has_ma & (close > ma5) & (ma5 > ma20)
+    trend_down = has_ma & (close < ma5) & (ma5 < ma20)
+    
+    # RSI 分析
+    has_rsi = ~np.isnan(rsi)
+    overbought = has_rsi & (rsi > 70)
+    oversold = has_rsi & (rsi < 30)
+    
+    # 布林通道分析
+    has_bb = ~np.isnan(bb_upper) & ~np.isnan(bb_lower)
+    above_upper = has_bb & (close > bb_upper)
+    
+    return {
+        "短期趨勢向上": trend_up,
+        "短期趨勢向下": trend_down,
+        "趨勢震盪": has_ma & ~trend_up & ~trend_down,
+        "RSI超買": overbought,
+        "RSI超賣": oversold,
+        "RSI中性": has_rsi & ~overbought & ~oversold,
+        "突破布林上軌": above_upper,
+        "跌破布林下軌": has_bb & ~above_upper & (close < bb_lower),
+    }
+
+def signal_labels(latest_data) -> list:
+    """
+    最新一根 K 棒成立的訊號（SIGNAL_LABELS 中的名稱，不含數值），可用來判斷訊號是否改變
+    """
+    masks = signal_masks(latest_data["Close"], latest_data.get("MA_5", np.nan),
+                         latest_data.get("MA_20", np.nan), latest_data.get("RSI_14", np.nan),
+                         latest_data.get("BB_Upper", np.nan), latest_data.get("BB_Lower", np.nan))
+    return [label for label in SIGNAL_LABELS if masks[label]]
+
+def technical_signals(latest_data) -> list:
+    """
+    最新一根 K 棒的技術訊號文字，例：["短期趨勢向上", "RSI中性(55.2)"]
+    """
+    return [f"RSI中性({latest_data['RSI_14']:.1f})" if label == "RSI中性" else label
+            for label in signal_labels(latest_data)]
+
 def generate_analysis_summary(df: pd.DataFrame, intent: str, fundamental_data: dict) -> str:
     """
     根據資料和意圖生成分析摘要
     """
     try:
-        latest_data = df.iloc[-1]
+        if isinstance(df, Bars):
+            latest_data = df.row(-1)
+            closes = df["Close"]
+        else:
+            latest_data = df.iloc[-1]
+            closes = df["Close"].to_numpy()
         current_price = latest_data["Close"]
         
         # 技術分析摘要
-        tech_summary = []
-        
-        # 移動平均分析
-        if pd.notna(latest_data.get("MA_5")) and pd.notna(latest_data.get("MA_20")):
-            ma5 = latest_data["MA_5"]
-            ma20 = latest_data["MA_20"]
-            if current_price > ma5 > ma20:
-                tech_summary.append("短期趨勢向上")
-            elif current_price < ma5 < ma20:
-                tech_summary.append("短期趨勢向下")
-            else:
-                tech_summary.append("趨勢震盪")
-        
-        # RSI 分析
-        if pd.notna(latest_data.get("RSI_14")):
-            rsi = latest_data["RSI_14"]
-            if rsi > 70:
-                tech_summary.append("RSI超買")
-            elif rsi < 30:
-                tech_summary.append("RSI超賣")
-            else:
-                tech_summary.append(f"RSI中性({rsi:.1f})")
-        
-        # 布林通道分析
-        if pd.notna(latest_data.get("BB_Upper")) and pd.notna(latest_data.get("BB_Lower")):
-            bb_upper = latest_data["BB_Upper"]
-            bb_lower = latest_data["BB_Lower"]
-            if current_price > bb_upper:
-                tech_summary.append("突破布林上軌")
-            elif current_price < bb_lower:
-                tech_summary.append("跌破布林下軌")
+        tech_summary = technical_signals(latest_data)
         
         # 根據意圖組合摘要
         if intent == "technical":
@@ -217,7 +294,7 @@ def generate_analysis_summary(df: pd.DataFrame, intent: str, fundamental_data: d
             return "基本面：" + "、".join(fund_items) if fund_items else "基本面資料有限"
         else:
             # 基本分析
-            price_trend = "上漲" if len(df) > 1 and current_price > df["Close"].iloc[-2] else "下跌"
+            price_trend = "上漲" if len(df) > 1 and current_price > closes[-2] else "下跌"
             return f"股價呈{price_trend}趨勢，" + "、".join(tech_summary[:2]) if tech_summary else f"股價呈{price_trend}趨勢"
             
     except Exception as e:
@@ -0,0 +1,13 @@
+# tests/conftest.py
+"""
+測試共用設定：資料目錄改到暫存目錄（需在匯入 config 之前設定），並讓測試可匯入專案模組
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("FINANCE_AGENT_DATA_DIR", tempfile.mkdtemp(prefix="finance_agent_test_"))
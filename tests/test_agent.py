@@ -0,0 +1,48 @@
+# tests/test_agent.py
+
+import pytest
+
+from benchmarks.fakes import FakeLLM, FakeMarketData, patched_agent
+
+
+class BrokenLLM(FakeLLM):
+    """送出 fail_after 個字後連線中斷"""
+
+    def __init__(self, fail_after: int):
+        super().__init__()
+        self.fail_after = fail_after
+
+    def stream(self, prompt, model=None):
+        for i, token in enumerate(super().stream(prompt, model)):
+            if i == self.fail_after:
+                raise ConnectionResetError("連線中斷")
+            yield token
+
+
+def _run(ticker: str, llm: FakeLLM):
+    with patched_agent(FakeMarketData(), llm) as agent:
+        displayed, state = "", {}
+        for event in agent.StockAgent().stream(ticker):
+            if event["event"] == "report":
+                displayed = event["text"]
+            elif event["event"] == "token":
+                displayed += event["text"]
+            elif event["event"] == "node":
+                state = event["state"]
+    return displayed, state
+
+
+@pytest.mark.parametrize("ticker, fail_after", [("ZZPA", 5), ("ZZPB", 0)])
+def test_llm_failure_keeps_streamed_text_in_final_report(ticker, fail_after):
+    displayed, state = _run(ticker, BrokenLLM(fail_after))
+    assert state["response_text"] == displayed  # 最終報告與串流畫面一致
+    assert "🤖 AI分析" in state["response_text"]
+    assert state["llm_text"] is None
+    if fail_after:
+        assert state["response_text"].split("🤖 AI分析：\n ")[1].startswith(FakeLLM().reply[:fail_after])
+
+
+def test_successful_stream_matches_final_report():
+    displayed, state = _run("ZZPC", FakeLLM())
+    assert state["response_text"] == displayed
+    assert state["llm_text"] == FakeLLM().reply
@@ -0,0 +1,207 @@
+# tests/test_api_server.py
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import api_server
+from api_server import APIError, APIServer, parse_request
+from benchmarks.fakes import FakeLLM, FakeMarketData, patched_agent
+from config import API_DEADLINE
+
+
+@pytest.mark.parametrize("deadline", ["nan", "NaN", "inf", "-inf", float("nan")])
+def test_non_finite_deadline_is_rejected(deadline):
+    with pytest.raises(APIError) as excinfo:
+        parse_request({"deadline": deadline})
+    assert excinfo.value.status == 400
+
+
+def test_deadline_is_clamped():
+    assert parse_request({"deadline": -5})["deadline"] == 0.001
+    assert parse_request({"deadline": API_DEADLINE * 10})["deadline"] == API_DEADLINE
+
+
+class FakeAgent:
+    """包裝以假資料建立的 StockAgent：記錄呼叫，可用 gate 讓分析停住，特定代號回傳錯誤"""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def analyze(self, ticker, period, interval, indicators, llm=True, deadline=None):
+        self.calls.append((ticker, deadline))
+        self.gate.wait(5)
+        if ticker == "ZZNONE":
+            return {"query": ticker, "market": "unknown", "error": "找不到股票"}
+        if ticker == "ZZDOWN":
+            return {"query": ticker, "market": "us", "error": "資料來源失敗"}
+        if ticker == "ZZBOOM":
+            raise RuntimeError("boom")
+        return self.agent.analyze(ticker, period, interval, indicators, llm=llm, deadline=deadline)
+
+
+@pytest.fixture(scope="module")
+def stock_agent():
+    with patched_agent(FakeMarketData(), FakeLLM()) as agent:
+        yield agent.StockAgent()
+
+
+@pytest.fixture
+def fake(stock_agent):
+    return FakeAgent(stock_agent)
+
+
+def _serve(fake, **kwargs):
+    """建立 APIServer 並在 async 函式結束後關閉執行緒池"""
+    def run(body):
+        server = APIServer(agent=fake, **kwargs)
+        try:
+            return asyncio.run(body(server))
+        finally:
+            fake.gate.set()
+            for pool in server.pools.values():
+                pool.executor.shutdown(wait=True)
+    return run
+
+
+async def _drain(server):
+    while server._inflight:
+        await asyncio.sleep(0.01)
+
+
+def test_analyze_returns_payload(fake):
+    async def body(server):
+        return await server.dispatch("GET", "/v1/analyze?ticker=ZZAPI&indicators=MACD", b"")
+
+    status, payload = _serve(fake)(body)
+    assert status == 200
+    result = json.loads(payload)
+    assert result["ticker"] == "ZZAPI"
+    assert "MACD" in result["indicators"]
+
+
+def test_pending_limit_returns_503(fake):
+    fake.gate.clear()
+
+    async def body(server):
+        first = asyncio.ensure_future(server.analyze("ZZP1", parse_request({})))
+        await asyncio.sleep(0.05)
+        rejected = await server.analyze("ZZP2", parse_request({}))
+        fake.gate.set()
+        return rejected, await first
+
+    rejected, first = _serve(fake, max_pending=1)(body)
+    assert rejected[0] == 503
+    assert first[0] == 200
+
+
+def test_deadline_returns_504_and_result_is_still_cached(fake):
+    fake.gate.clear()
+
+    async def body(server):
+        request = parse_request({"deadline": 0.05})
+        timed_out = await server.analyze("ZZSL", request)
+        fake.gate.set()
+        await _drain(server)  # 逾時的工作仍會跑完
+        return timed_out, await server.analyze("ZZSL", request)
+
+    timed_out, retried = _serve(fake)(body)
+    assert timed_out[0] == 504
+    assert retried[0] == 200
+    assert len(fake.calls) == 1  # 重試直接命中快取
+
+
+def test_remaining_deadline_is_passed_to_agent(fake):
+    async def body(server):
+        return await server.analyze("ZZDL", parse_request({"deadline": 5}))
+
+    assert _serve(fake)(body)[0] == 200
+    (_, deadline), = fake.calls
+    assert 0 < deadline <= 5
+
+
+def test_identical_inflight_requests_run_once(fake):
+    fake.gate.clear()
+
+    async def body(server):
+        waiting = [asyncio.ensure_future(server.analyze("ZZSM", parse_request({}))) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        fake.gate.set()
+        return await asyncio.gather(*waiting)
+
+    results = _serve(fake, cache_ttl=0)(body)
+    assert len(fake.calls) == 1
+    assert len({payload for _, payload in results}) == 1
+    assert {status for status, _ in results} == {200}
+
+
+def test_cache_expires_after_ttl(fake):
+    async def body(server):
+        await server.analyze("ZZTTL", parse_request({}))
+        await server.analyze("ZZTTL", parse_request({}))
+        hits = len(fake.calls)
+        await asyncio.sleep(0.15)
+        await server.analyze("ZZTTL", parse_request({}))
+        return hits
+
+    assert _serve(fake, cache_ttl=0.1)(body) == 1
+    assert len(fake.calls) == 2
+
+
+def test_cache_evicts_least_recently_used(fake, monkeypatch):
+    monkeypatch.setattr(api_server, "CACHE_ENTRIES", 2)
+
+    async def body(server):
+        for ticker in ("ZZLA", "ZZLB", "ZZLA", "ZZLC", "ZZLA", "ZZLB"):
+            await server.analyze(ticker, parse_request({}))
+
+    _serve(fake)(body)
+    assert [t for t, _ in fake.calls] == ["ZZLA", "ZZLB", "ZZLC", "ZZLB"]  # ZZLA 剛用過，擠掉 ZZLB
+
+
+def test_batch_reports_status_per_ticker(fake):
+    async def body(server):
+        request = json.dumps({"tickers": ["ZZOK", "ZZNONE", "ZZDOWN", "ZZBOOM", ""]}).encode()
+        return await server.dispatch("POST", "/v1/batch", request)
+
+    status, payload = _serve(fake)(body)
+    assert status == 200
+    results = json.loads(payload)["results"]
+    assert [r["status"] for r in results] == [200, 404, 502, 500, 400]
+    assert results[0]["result"]["ticker"] == "ZZOK"
+    assert results[1]["result"]["ticker"] == "ZZNONE"
+
+
+@pytest.mark.parametrize("method, target, body, status", [
+    ("POST", "/v1/batch", b'{"tickers": []}', 400),
+    ("POST", "/v1/analyze", b"not json", 400),
+    ("DELETE", "/v1/analyze", b"", 405),
+    ("GET", "/v2/analyze", b"", 404),
+    ("GET", "/v1/analyze?ticker=ZZX&deadline=nan", b"", 400),
+])
+def test_dispatch_errors(fake, method, target, body, status):
+    async def run(server):
+        return await server.dispatch(method, target, body)
+
+    assert _serve(fake)(run)[0] == status
+    assert fake.calls == []
+
+
+def test_request_deadline_bounds_llm_wait(stock_agent):
+    import agent
+    slow = FakeLLM(first_token_latency=0.5)
+    original, agent.stream_chatglm = agent.stream_chatglm, slow.stream
+    try:
+        started = time.monotonic()
+        state = stock_agent.analyze("ZZLD", llm=True, deadline=0.1)
+    finally:
+        agent.stream_chatglm = original
+    assert time.monotonic() - started < 0.45
+    assert state["llm_text"] is None
+    assert "AI 分析暫時無法提供" in state["response_text"]
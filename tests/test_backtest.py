@@ -0,0 +1,118 @@
+# tests/test_backtest.py
+
+import numpy as np
+import pytest
+
+from backtest import METRICS, BacktestParams, param_grid, positions, run_backtest
+from panel_indicators import compute_panel_indicators
+from stock_utils import signal_masks
+
+
+def _signals(close: np.ndarray, rule: str):
+    """以 signal_masks（報告使用的規則）判斷每日的買進、賣出訊號；停牌日不產生訊號"""
+    ind = compute_panel_indicators(close)
+    masks = signal_masks(close, ind["MA_5"][:, 0], ind["MA_20"][:, 0], ind["RSI_14"][:, 0],
+                         ind["BB_Upper"][:, 0], ind["BB_Lower"][:, 0])
+    valid = ~np.isnan(close)
+    if rule == "ma":
+        buy, sell = masks["短期趨勢向上"], ~masks["短期趨勢向上"]
+    elif rule == "rsi":
+        buy, sell = masks["RSI超賣"], masks["RSI超買"]
+    else:
+        buy, sell = masks["突破布林上軌"], masks["跌破布林下軌"]
+    return buy & valid, sell & valid
+
+
+def reference(close: np.ndarray, rule: str, cost: float) -> dict:
+    """逐日模擬單一股票：訊號開始成立的當天以收盤價買進或賣出"""
+    buy, sell = _signals(close, rule)
+    rows = len(close)
+    listed = np.flatnonzero(~np.isnan(close))
+    equity, peak, drawdown = 1.0, 1.0, 0.0
+    trades, wins, held = 0, 0, 0
+    holding, entry, trade_value = False, 0, 1.0
+    last = np.nan
+
+    def mark():
+        nonlocal peak, drawdown
+        peak = max(peak, equity)
+        drawdown = max(drawdown, 1 - equity / peak)
+
+    for t in range(rows):
+        price = close[t]
+        if holding and not np.isnan(price) and not np.isnan(last):
+            equity *= price / last
+            trade_value *= price / last
+            mark()
+        if not np.isnan(price):
+            last = price
+        new_buy = buy[t] and not (t and buy[t - 1])
+        new_sell = sell[t] and not (t and sell[t - 1])
+        if holding and new_sell:
+            equity *= 1 - cost
+            trade_value *= 1 - cost
+            mark()
+            holding = False
+            held += t - entry
+            wins += trade_value > 1
+        elif not holding and new_buy and t < rows - 1:
+            equity *= 1 - cost
+            mark()
+            holding, entry, trade_value = True, t, 1 - cost
+            trades += 1
+    if holding:
+        held += rows - 1 - entry
+        wins += trade_value > 1
+    length = rows - listed[0] if len(listed) else 0
+    return {
+        "total_return": equity - 1,
+        "buy_hold_return": close[listed[-1]] / close[listed[0]] - 1 if len(listed) else 0.0,
+        "max_drawdown": drawdown,
+        "hit_rate": wins / trades if trades else np.nan,
+        "trades": trades,
+        "exposure": held / max(length - 1, 1),
+    }
+
+
+def _random_panel(rng) -> np.ndarray:
+    rows, cols = int(rng.integers(1, 400)), int(rng.integers(1, 5))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, rng.choice([0.01, 0.03]), (rows, cols)), axis=0))
+    for n in range(cols):
+        close[:int(rng.integers(0, rows + 1)) if rng.random() < 0.3 else 0, n] = np.nan  # 尚未上市
+        gaps = rng.random(rows) < rng.choice([0.0, 0.02, 0.1])
+        close[gaps, n] = np.nan  # 停牌
+    return close
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_daily_reference(seed):
+    rng = np.random.default_rng(seed)
+    close = _random_panel(rng)
+    cost = float(rng.choice([0.0, 0.002, 0.01]))
+    grid = [BacktestParams(rule) for rule in ("ma", "rsi", "bb")]
+    results = run_backtest(close, grid, cost=cost, chunk_size=int(rng.integers(1, 4)))
+    for (rule, ticker), row in results.set_index(["rule", "ticker"]).iterrows():
+        expected = reference(close[:, ticker], rule, cost)
+        for name in METRICS:
+            assert row[name] == pytest.approx(expected[name], rel=1e-9, abs=1e-12, nan_ok=True), \
+                (rule, ticker, name)
+
+
+def test_positions_follow_trades():
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, 300)))
+    held = positions(close, BacktestParams("ma"))[:, 0]
+    buy, sell = _signals(close, "ma")
+    # 持有期間從買進隔天到賣出當天
+    entries = np.flatnonzero(held[1:] & ~held[:-1]) + 1
+    exits = np.flatnonzero(held[:-1] & ~held[1:])
+    assert len(entries) > 3
+    assert all(buy[t - 1] for t in entries)
+    assert all(sell[t] for t in exits)
+
+
+def test_param_grid_skips_invalid_combinations():
+    grid = param_grid("ma", ma_fast=[5, 20], ma_slow=[10, 20])
+    assert [(p.ma_fast, p.ma_slow) for p in grid] == [(5, 10), (5, 20)]
+    with pytest.raises(ValueError):
+        param_grid("rsi", ma_fast=[5])
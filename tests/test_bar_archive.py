@@ -0,0 +1,72 @@
+# tests/test_bar_archive.py
+
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from bar_archive import BarArchive
+
+
+def _bars(start: str, values) -> pd.DataFrame:
+    values = np.asarray(values, dtype=float)
+    dates = pd.bdate_range(start, periods=len(values), tz="Asia/Taipei")
+    return pd.DataFrame({"Date": dates, "Open": values, "High": values, "Low": values, "Close": values,
+                         "Volume": values})
+
+
+def _column_files(root) -> list:
+    return sorted(f for d in os.listdir(root) for f in os.listdir(os.path.join(root, d)) if f.startswith("Close"))
+
+
+def test_new_bars_are_appended_in_place(tmp_path):
+    archive = BarArchive(str(tmp_path))
+    archive.write("2330.TW", _bars("2024-01-01", [1, 2, 3]))
+    gen = archive.meta("2330.TW")["gen"]
+    # 增量補抓從最後一根（未變動）開始
+    archive.write("2330.TW", _bars("2024-01-03", [3, 4, 5]))
+    assert archive.meta("2330.TW")["gen"] == gen
+    assert archive.frame("2330.TW")["Close"].tolist() == [1, 2, 3, 4, 5]
+    assert _column_files(tmp_path) == ["Close.bin"]
+
+
+def test_revision_switches_to_new_files(tmp_path):
+    archive = BarArchive(str(tmp_path))
+    archive.write("2330.TW", _bars("2024-01-01", [1, 2, 3]))
+    before = archive.read("2330.TW", extra_columns=())
+    archive.write("2330.TW", _bars("2024-01-03", [3.5, 4]))  # 最後一根的報價變動
+    assert archive.frame("2330.TW")["Close"].tolist() == [1, 2, 3.5, 4]
+    assert before["Close"].tolist() == [1, 2, 3]  # 先前讀到的資料不受影響
+    assert len(_column_files(tmp_path)) == 1  # 舊版欄位檔已刪除
+
+
+def test_rewrite_from_start_replaces_everything(tmp_path):
+    archive = BarArchive(str(tmp_path))
+    archive.write("2330.TW", _bars("2024-01-02", [1, 2, 3]))
+    archive.write("2330.TW", _bars("2024-01-01", [9, 8]))
+    assert archive.frame("2330.TW")["Close"].tolist() == [9, 8]
+
+
+def _revise_repeatedly(root: str, n: int):
+    archive = BarArchive(root)
+    for i in range(n):
+        archive.write("2330.TW", _bars("2024-01-01", np.full(200, float(i))))  # 每次改寫全部 K 棒
+
+
+def test_readers_never_see_half_written_rows(tmp_path):
+    root = str(tmp_path)
+    archive = BarArchive(root)
+    archive.write("2330.TW", _bars("2024-01-01", np.zeros(200)))
+    writer = multiprocessing.get_context("fork").Process(target=_revise_repeatedly, args=(root, 300))
+    writer.start()
+    reads = 0
+    while writer.is_alive() or not reads:
+        bars = archive.read("2330.TW", extra_columns=())
+        values = np.stack([bars[c] for c in ("Open", "High", "Low", "Close", "Volume")])
+        assert len(bars) == 200
+        assert (values == values[0, 0]).all()  # 每一列、每個欄位都來自同一次寫入
+        reads += 1
+    writer.join()
+    assert writer.exitcode == 0
+    assert archive.frame("2330.TW")["Close"].iloc[-1] == 299
@@ -0,0 +1,64 @@
+# tests/test_bars.py
+
+import numpy as np
+import pandas as pd
+
+from bars import INDICATOR_COLUMNS, PRICE_COLUMNS, Bars
+from benchmarks.fakes import synthetic_ohlcv
+from stock_utils import compute_indicators_inplace, compute_technical_indicators
+
+
+def test_round_trip_keeps_dates_and_timezone():
+    df = synthetic_ohlcv("ZZBR", 30, tz="Asia/Taipei")
+    bars = Bars.from_frame(df)
+    assert bars.tz == "Asia/Taipei"
+    assert (bars.date_index() == pd.DatetimeIndex(df["Date"])).all()
+    frame = bars.to_frame()
+    pd.testing.assert_frame_equal(frame[["Date", *PRICE_COLUMNS]], df.astype({"Volume": float}),
+                                  check_dtype=False, check_freq=False)
+    assert frame[list(INDICATOR_COLUMNS)].isna().all().all()
+
+
+def test_columns_are_views_of_one_buffer():
+    bars = Bars.from_frame(synthetic_ohlcv("ZZBR", 30))
+    close = bars["Close"]
+    compute_indicators_inplace(bars)
+    assert bars["MA_5"].base is bars["Close"].base  # 指標寫入預留的欄位，沒有另外配置
+    close[-1] = 1.0  # 未擴充時仍為同一塊緩衝區
+    assert bars.row(-1)["Close"] == 1.0
+
+
+def test_inplace_indicators_match_dataframe_version():
+    df = synthetic_ohlcv("ZZBR", 80)
+    expected = compute_technical_indicators(df, indicators=["MACD", "KDJ"])
+    bars = compute_indicators_inplace(Bars.from_frame(df), indicators=["MACD", "KDJ"])
+    for column in (*INDICATOR_COLUMNS, "MACD", "KDJ_K"):
+        np.testing.assert_allclose(bars[column], expected[column], rtol=1e-12, err_msg=column)
+
+
+def test_append_set_row_and_drop_head():
+    df = synthetic_ohlcv("ZZBR", 5, tz=None)
+    bars = Bars.from_frame(df)
+    next_day = pd.Timestamp(df["Date"].iloc[-1]) + pd.Timedelta(days=1)
+    bars.append(next_day.value, {"Close": 42.0, "MA_5": 41.0, "Unknown": 1.0})
+    assert len(bars) == 6
+    assert bars.date_index()[-1] == next_day
+    row = bars.row(-1)
+    assert (row["Close"], row["MA_5"]) == (42.0, 41.0)
+    assert np.isnan(row["Open"])
+
+    bars.set_row(-1, {"Close": 43.0, "Volume": None})
+    assert bars["Close"][-1] == 43.0 and np.isnan(bars["Volume"][-1])
+
+    bars.drop_head(2)
+    assert len(bars) == 4
+    assert bars["Close"][0] == df["Close"].iloc[2]
+
+
+def test_set_column_and_reserve_grow_buffer():
+    bars = Bars.from_frame(synthetic_ohlcv("ZZBR", 10), extra_columns=())
+    bars.reserve(["A", "B", "A"])
+    bars.set_column("C", np.arange(10.0))
+    assert bars.columns == ["Date", *PRICE_COLUMNS, "A", "B", "C"]
+    assert np.isnan(bars["A"]).all()
+    assert bars["C"].tolist() == list(range(10))
@@ -0,0 +1,52 @@
+# tests/test_batch_scan.py
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import agent
+import batch_scan
+import stock_utils
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("台積電", ("2330", "tw")),
+    ("2330.TW", ("2330", "tw")),
+    ("2330", ("2330", "tw")),
+    ("Apple", ("AAPL", "us")),
+    ("aapl", ("AAPL", "us")),
+])
+def test_resolve_ticker(text, expected):
+    assert batch_scan.resolve_ticker(text) == expected
+
+
+def test_names_and_suffixes_share_checkpoint_rows(tmp_path):
+    output = str(tmp_path / "scan.parquet")
+    with open(output + ".progress.jsonl", "w", encoding="utf-8") as f:
+        for ticker, market in (("2330", "tw"), ("AAPL", "us")):
+            f.write(json.dumps({"ticker": ticker, "market": market, "error": None, "close": 1.0}) + "\n")
+
+    summary = batch_scan.run_scan(["台積電", "2330.TW", "2330", "Apple"], output, workers=1)
+    assert (summary["total"], summary["processed"]) == (2, 0)  # 全部命中檢查點，不重新分析
+    assert list(pd.read_parquet(output)["ticker"]) == ["2330", "AAPL"]
+
+
+def test_llm_uses_batch_queue_and_cache(monkeypatch):
+    closes = 100 + np.arange(30.0)
+    frame = pd.DataFrame({"Date": pd.bdate_range("2024-01-01", periods=30, tz="America/New_York"),
+                          "Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1000.0})
+    monkeypatch.setattr(stock_utils, "fetch_us_stock", lambda ticker, period, interval: frame)
+    calls = []
+
+    def fake_stream(prompt, priority="interactive", deadline=None, generate=None):
+        calls.append((priority, deadline))
+        yield "批次分析"
+
+    monkeypatch.setattr(agent.llm_queue, "stream", fake_stream)
+    first = batch_scan.analyze_ticker("ZZBATCH", "us", with_llm=True)
+    second = batch_scan.analyze_ticker("ZZBATCH", "us", with_llm=True)
+    assert first["error"] is None
+    assert first["llm_text"] == second["llm_text"] == "批次分析"
+    assert calls == [("batch", None)]  # 第二次命中 LLM 快取
@@ -0,0 +1,81 @@
+# tests/test_charts.py
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import charts
+from benchmarks.fakes import synthetic_ohlcv
+from charts import ChartCache, has_chart, render_chart
+from stock_utils import compute_technical_indicators
+
+
+@pytest.fixture
+def frame():
+    return compute_technical_indicators(synthetic_ohlcv("ZZCH", 60))
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """記錄實際呼叫 matplotlib 繪圖的次數"""
+    calls = []
+    for kind, plot in list(charts._PLOTTERS.items()):
+        def wrapped(df, ticker, fmt, plot=plot, kind=kind):
+            calls.append(kind)
+            return plot(df, ticker, fmt)
+        monkeypatch.setitem(charts._PLOTTERS, kind, wrapped)
+    return calls
+
+
+@pytest.mark.parametrize("kind", charts.CHART_TYPES)
+def test_render_png_without_leaking_figures(frame, kind):
+    data = render_chart(frame, "ZZCH", kind, cache=None)
+    assert data.startswith(b"\x89PNG")
+    assert plt.get_fignums() == []
+
+
+def test_svg_format(frame):
+    assert b"<svg" in render_chart(frame, "ZZCH", "rsi", fmt="svg", cache=None)
+
+
+def test_repeated_render_hits_cache(frame, counted):
+    cache = ChartCache()
+    first = render_chart(frame, "zzch", "price", cache=cache)
+    assert render_chart(frame, "ZZCH", "price", cache=cache) == first
+    assert counted == ["price"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_revised_last_bar_redraws_only_affected_charts(frame, counted):
+    cache = ChartCache()
+    for kind in charts.CHART_TYPES:
+        render_chart(frame, "ZZCH", kind, cache=cache)
+    revised = frame.copy()
+    revised.loc[revised.index[-1], ["Close", "MA_5"]] += 1.0  # 盤中報價變動，RSI 不變
+    for kind in charts.CHART_TYPES:
+        render_chart(revised, "ZZCH", kind, cache=cache)
+    assert counted == ["price", "rsi", "bollinger", "price", "bollinger"]
+
+
+def test_least_recently_used_chart_is_evicted(frame):
+    cache = ChartCache(max_entries=2)
+    keys = [ChartCache.make_key(frame, "ZZCH", kind, "png") for kind in charts.CHART_TYPES]
+    cache.set(keys[0], b"a")
+    cache.set(keys[1], b"b")
+    assert cache.get(keys[0]) == b"a"
+    cache.set(keys[2], b"c")
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == b"a"
+
+
+def test_nan_values_give_stable_keys(frame):
+    frame["RSI_14"] = np.nan
+    assert ChartCache.make_key(frame, "ZZCH", "rsi", "png") == ChartCache.make_key(frame.copy(), "ZZCH", "rsi", "png")
+    assert not has_chart(frame, "rsi")
+    assert has_chart(frame, "bollinger")
+    assert not has_chart(frame.iloc[:0], "price")
+
+
+def test_unknown_chart_type(frame):
+    with pytest.raises(ValueError):
+        render_chart(frame, "ZZCH", "volume")
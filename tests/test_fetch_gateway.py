@@ -0,0 +1,158 @@
+# tests/test_fetch_gateway.py
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+import batch_scan
+from fetch_gateway import FetchGateway, SharedTokenBucket, SingleFlight, TokenBucket, UpstreamBusyError
+
+
+def test_token_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(rate=0.5, burst=3)
+    assert [bucket.acquire(timeout=0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    with pytest.raises(UpstreamBusyError):
+        bucket.acquire(timeout=0.05)
+
+
+def _grab(n: int) -> int:
+    """在子行程中以 gateway 的權杖桶連續取 n 個權杖（不等候），回傳取得的數量"""
+    from fetch_gateway import gateway
+    got = 0
+    for _ in range(n):
+        try:
+            gateway.bucket.acquire(timeout=0)
+            got += 1
+        except UpstreamBusyError:
+            pass
+    return got
+
+
+def test_batch_workers_share_one_burst():
+    # 4 個子行程同時取權杖，合計不能超過設定的突發次數
+    bucket = SharedTokenBucket(rate=0.01, burst=3)
+    with ProcessPoolExecutor(max_workers=4, initializer=batch_scan._init_worker, initargs=(bucket,)) as pool:
+        assert sum(pool.map(_grab, [3] * 4)) == 3
+
+
+def test_shared_bucket_refills_at_rate():
+    bucket = SharedTokenBucket(rate=50, burst=1)
+    assert bucket.acquire(timeout=0) == 0.0
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1) > 0
+    assert 0.015 <= time.monotonic() - started < 0.5
+
+
+def _wait_for_token(bucket):
+    try:
+        bucket.acquire(timeout=0.5)
+    except UpstreamBusyError:
+        pass
+
+
+def test_shared_bucket_reports_waiting_across_processes():
+    bucket = SharedTokenBucket(rate=0.01, burst=1)
+    bucket.acquire(timeout=0)
+    child = multiprocessing.get_context("fork").Process(target=_wait_for_token, args=(bucket,))
+    child.start()
+    deadline = time.monotonic() + 0.4
+    while bucket.waiting == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert bucket.waiting == 1  # 另一個行程正在等候
+    child.join()
+    assert bucket.waiting == 0
+
+
+def _run_concurrently(fn, n):
+    """n 個執行緒同時呼叫 fn，回傳各自的結果或例外"""
+    results = [None] * n
+
+    def run(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def _wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    time.sleep(0.1)  # 讓其他執行緒進入等候
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        gate.wait(2)
+        return "data"
+
+    threads, results = _run_concurrently(lambda: flight.do("2330", fetch), 5)
+    _wait_until(lambda: len(calls) == 1)
+    assert flight.inflight() == 1
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(r[1] for r in results) == [False] * 4 + [True]
+    assert {r[0] for r in results} == {"data"}
+    assert flight.inflight() == 0
+    # 完成後的呼叫重新執行
+    assert flight.do("2330", fetch) == ("data", True)
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def fetch():
+        gate.wait(2)
+        raise ValueError("上游錯誤")
+
+    threads, results = _run_concurrently(lambda: flight.do("k", fetch), 3)
+    _wait_until(lambda: flight.inflight() == 1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.inflight() == 0
+
+
+def test_coalesce_keys_on_arguments_and_copies_results():
+    gateway = FetchGateway(rate=100, burst=10)
+    gate = threading.Event()
+    calls = []
+
+    @gateway.coalesce("history")
+    def history(ticker, period="1y"):
+        calls.append((ticker, period))
+        gate.wait(2)
+        return pd.DataFrame({"Close": [1.0, 2.0]})
+
+    # history("2330") 與 history("2330", period="1y") 是同一個鍵；不同期間另外執行
+    threads, results = _run_concurrently(lambda: history("2330"), 2)
+    extra, extra_results = _run_concurrently(lambda: history("2330", period="1y"), 1)
+    other, other_results = _run_concurrently(lambda: history("2330", period="5y"), 1)
+    _wait_until(lambda: len(calls) == 2)
+    gate.set()
+    for t in threads + extra + other:
+        t.join()
+    assert sorted(calls) == [("2330", "1y"), ("2330", "5y")]
+    assert gateway.stats()["coalesced"] == 2
+    frames = results + extra_results
+    frames[0].loc[0, "Close"] = -1.0  # 修改其中一份不影響其他呼叫者
+    assert sorted(f.loc[0, "Close"] for f in frames) == [-1.0, 1.0, 1.0]
@@ -0,0 +1,98 @@
+# tests/test_fundamentals_cache.py
+
+import threading
+
+import pytest
+
+import fundamentals_cache as fundamentals_module
+from fundamentals_cache import DAY, FundamentalsCache
+
+
+class FakeFetcher:
+    """假的上游：每次呼叫回傳遞增的 pe_ratio，可用 gate 讓呼叫停住"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = set()
+
+    def __call__(self, ticker, market):
+        self.calls.append((ticker, market))
+        self.gate.wait(5)
+        if ticker in self.fail:
+            raise ValueError("上游失敗")
+        return {"pe_ratio": float(len(self.calls)), "sector": "Technology"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(fundamentals_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    fetcher = FakeFetcher()
+    cache = FundamentalsCache(fetcher, path=str(tmp_path / "fundamentals.sqlite"))
+    yield cache, fetcher
+    fetcher.gate.set()
+    cache._background.shutdown(wait=True)
+
+
+def test_miss_fetches_once_then_hits(cache, clock):
+    cache, fetcher = cache
+    assert cache.get("aapl", "us") == {"pe_ratio": 1.0, "sector": "Technology"}
+    clock[0] += DAY - 1
+    assert cache.get("AAPL", "us")["pe_ratio"] == 1.0
+    assert fetcher.calls == [("aapl", "us")]
+    assert cache.stats() == {"hits": 1, "stale": 0, "misses": 1}
+
+
+def test_stale_field_returns_old_value_and_refreshes_in_background(cache, clock):
+    cache, fetcher = cache
+    cache.get("AAPL", "us")
+    clock[0] += DAY + 1  # pe_ratio（1 天）過期，sector（90 天）仍有效
+    assert cache.is_stale("AAPL", "us")
+    assert cache.get("AAPL", "us")["pe_ratio"] == 1.0  # 先回傳舊值
+    cache._background.shutdown(wait=True)
+    assert len(fetcher.calls) == 2
+    assert cache.get("AAPL", "us")["pe_ratio"] == 2.0
+    assert cache.stats()["stale"] == 1
+
+
+def test_concurrent_stale_reads_refresh_once(cache, clock):
+    cache, fetcher = cache
+    cache.get("AAPL", "us")
+    clock[0] += DAY + 1
+    fetcher.gate.clear()
+    for _ in range(5):
+        cache.get("AAPL", "us")
+    fetcher.gate.set()
+    cache._background.shutdown(wait=True)
+    assert len(fetcher.calls) == 2
+
+
+def test_custom_field_ttls(tmp_path, clock):
+    fetcher = FakeFetcher()
+    cache = FundamentalsCache(fetcher, path=str(tmp_path / "f.sqlite"), field_ttls={"pe_ratio": 10})
+    cache.get("2330", "tw")
+    clock[0] += 11
+    assert cache.is_stale("2330", "tw")  # pe_ratio 自訂 10 秒
+    clock[0] -= 11
+    assert not cache.is_stale("2330", "tw")
+    cache._background.shutdown(wait=True)
+
+
+def test_bulk_refresh_skips_fresh_and_reports_failures(cache, clock):
+    cache, fetcher = cache
+    cache.get("AAPL", "us")
+    fetcher.fail.add("BAD")
+    summary = cache.bulk_refresh([("AAPL", "us"), ("MSFT", "us"), ("BAD", "us")], max_workers=2)
+    assert (summary["refreshed"], summary["skipped"]) == (1, 1)
+    assert list(summary["failed"]) == ["BAD"]
+    assert cache.get("MSFT", "us")["sector"] == "Technology"
+
+    summary = cache.bulk_refresh([("AAPL", "us"), ("MSFT", "us")], only_stale=False)
+    assert (summary["refreshed"], summary["skipped"]) == (2, 0)
@@ -0,0 +1,66 @@
+# tests/test_indicator_engine.py
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_engine import IndicatorEngine
+from stock_utils import compute_technical_indicators
+
+COLUMNS = ("MA_5", "MA_20", "MA_60", "RSI_14", "BB_Middle", "BB_Upper", "BB_Lower")
+
+
+def _closes() -> np.ndarray:
+    """隨機漫步，中間有缺值、連續缺值與長段固定價格（漲跌停鎖死、停牌）"""
+    rng = np.random.default_rng(7)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 160)))
+    closes[[3, 40, 41, 42, 90]] = np.nan
+    closes[60:85] = closes[59]
+    closes[120:128] = 57.0
+    return closes
+
+
+def _assert_step_matches(latest: dict, closes: np.ndarray):
+    expected = compute_technical_indicators(pd.DataFrame({"Close": closes})).iloc[-1]
+    for column in COLUMNS:
+        assert latest[column] == pytest.approx(expected[column], rel=1e-12, abs=1e-9, nan_ok=True), \
+            (len(closes), column)
+
+
+def test_update_matches_full_recompute_at_every_step():
+    closes = _closes()
+    engine = IndicatorEngine()
+    for i, close in enumerate(closes):
+        latest = engine.update("2330", close)
+        _assert_step_matches(latest, closes[:i + 1])
+
+
+def test_revise_replaces_last_bar():
+    closes = _closes()[:50]
+    engine = IndicatorEngine()
+    engine.seed("2330", closes)
+    revised = closes.copy()
+    for price in (closes[-1] * 1.05, np.nan, closes[-1]):
+        revised[-1] = price
+        _assert_step_matches(engine.revise("2330", price), revised)
+
+
+def test_snapshot_round_trip_continues_identically():
+    closes = _closes()
+    engine = IndicatorEngine()
+    engine.seed("2330", closes[:100])
+    engine.seed("AAPL", closes[:10])
+
+    restored = IndicatorEngine()
+    restored.restore(json.loads(json.dumps(engine.snapshot())))
+    assert sorted(restored.tickers()) == ["2330", "AAPL"]
+    for close in closes[100:]:
+        assert restored.update("2330", close) == pytest.approx(engine.update("2330", close), nan_ok=True)
+    _assert_step_matches(restored.latest("2330"), closes)
+
+
+def test_restore_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        IndicatorEngine().restore({"version": -1, "tickers": {}})
@@ -0,0 +1,123 @@
+# tests/test_indicator_kernels.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import synthetic_ohlcv
+from indicator_kernels import (ATR_WINDOW, EMA_SPANS, INDICATORS, KDJ_INIT, KDJ_WINDOW, MACD_FAST, MACD_SIGNAL,
+                               MACD_SLOW, compute_into)
+
+
+# ---- pandas 參考算法（開頭缺值輸出 NaN，之後的缺值沿用前值） ----
+def _ewm(x: pd.Series, alpha: float) -> pd.Series:
+    return x.ffill().ewm(alpha=alpha, adjust=False).mean()
+
+
+def _smooth(x: pd.Series, init: float) -> pd.Series:
+    # 以 init 為前值的 1/3 平滑：在第一筆有效值前補一筆 init
+    valid = x.dropna()
+    if valid.empty:
+        return x
+    tail = x.loc[valid.index[0]:].ffill()
+    padded = pd.concat([pd.Series([init]), tail], ignore_index=True)
+    return padded.ewm(alpha=1 / 3, adjust=False).mean().iloc[1:].set_axis(tail.index).reindex(x.index)
+
+
+def reference(df: pd.DataFrame) -> dict:
+    close = df["Close"]
+    out = {f"EMA_{s}": _ewm(close, 2 / (s + 1)) for s in EMA_SPANS}
+
+    macd = _ewm(close, 2 / (MACD_FAST + 1)) - _ewm(close, 2 / (MACD_SLOW + 1))
+    signal = _ewm(macd, 2 / (MACD_SIGNAL + 1))
+    out.update({"MACD": macd, "MACD_Signal": signal, "MACD_Hist": macd - signal})
+
+    low = df["Low"].rolling(KDJ_WINDOW, min_periods=1).min()
+    high = df["High"].rolling(KDJ_WINDOW, min_periods=1).max()
+    span = high - low
+    rsv = ((close - low) / span * 100).where(span != 0, KDJ_INIT)
+    k = _smooth(rsv, KDJ_INIT)
+    d = _smooth(k, KDJ_INIT)
+    out.update({"KDJ_K": k, "KDJ_D": d, "KDJ_J": 3 * k - 2 * d})
+
+    prev_close = close.shift()
+    tr = pd.concat([df["High"] - df["Low"], (df["High"] - prev_close).abs(),
+                    (df["Low"] - prev_close).abs()], axis=1).max(axis=1)
+    out[f"ATR_{ATR_WINDOW}"] = _ewm(tr, 1 / ATR_WINDOW)
+
+    filled = close.ffill()
+    step = (np.sign(filled.diff()).fillna(0) * df["Volume"].fillna(0)).where(filled.notna())
+    out["OBV"] = step.cumsum()
+    return out
+
+
+def _panel(rows: int = 300) -> pd.DataFrame:
+    return synthetic_ohlcv("ZZK", rows).drop(columns="Date").astype(float)
+
+
+def _leading(df):
+    df.iloc[:12] = np.nan
+
+
+def _middle(df):
+    df.iloc[100:104] = np.nan
+
+
+def _scattered(df):
+    df.loc[50, "Close"] = np.nan
+    df.loc[60, ["High", "Low"]] = np.nan
+    df.loc[70, "Volume"] = np.nan
+    df.loc[200:202, "Close"] = np.nan
+
+
+def _flat(df):
+    df.loc[150:170, ["Open", "High", "Low", "Close"]] = 42.0  # 區間內最高等於最低
+
+
+CASES = {
+    "clean": lambda df: None,
+    "leading_nan": _leading,
+    "middle_nan": _middle,
+    "scattered_nan": _scattered,
+    "leading_and_middle": lambda df: (_leading(df), _middle(df), _scattered(df)),
+    "flat": _flat,
+}
+
+
+def _kernels(df: pd.DataFrame) -> dict:
+    columns = {c: df[c].to_numpy() for c in df}
+    outputs = {c: np.full(len(df), -1.0) for spec in INDICATORS.values() for c in spec.outputs}
+    compute_into(columns, outputs, INDICATORS)
+    return outputs
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_kernels_match_pandas(case):
+    df = _panel()
+    CASES[case](df)
+    outputs = _kernels(df)
+    for column, expected in reference(df).items():
+        np.testing.assert_allclose(outputs[column], expected.to_numpy(), rtol=1e-9, atol=1e-9, err_msg=column)
+
+
+@pytest.mark.parametrize("rows", [0, 1, 2])
+def test_short_series(rows):
+    df = _panel(300).iloc[:rows].reset_index(drop=True)
+    outputs = _kernels(df)
+    for column, expected in reference(df).items():
+        np.testing.assert_allclose(outputs[column], expected.to_numpy(), rtol=1e-12, err_msg=column)
+
+
+def test_all_missing_series_is_nan():
+    df = _panel(30)
+    df[:] = np.nan
+    for column, values in _kernels(df).items():
+        assert np.isnan(values).all(), column
+
+
+def test_long_ema_stays_accurate():
+    # 區塊閉式解在長序列（多個區塊）上的誤差
+    df = synthetic_ohlcv("ZZLONG", 20000).drop(columns="Date").astype(float)
+    outputs = _kernels(df)
+    for column in ("EMA_12", "EMA_26", "ATR_14"):
+        np.testing.assert_allclose(outputs[column], reference(df)[column].to_numpy(), rtol=1e-12, err_msg=column)
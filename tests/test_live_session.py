@@ -0,0 +1,166 @@
+# tests/test_live_session.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bars import INDICATOR_COLUMNS, Bars
+from live_session import NO_UPDATE, LiveSession
+from stock_utils import compute_indicators_inplace, compute_technical_indicators
+
+TZ = "Asia/Taipei"
+
+
+def _frame(dates, closes) -> pd.DataFrame:
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame({"Date": dates, "Open": closes, "High": closes * 1.01, "Low": closes * 0.99,
+                         "Close": closes, "Volume": 1000.0})
+
+
+class FakeStore:
+    """取代 price_store：poll 依序回傳預先排入的 K 棒（不含指標欄位），記錄呼叫參數"""
+
+    def __init__(self):
+        self.deltas = []
+        self.calls = []
+
+    def push(self, dates, closes):
+        self.deltas.append(Bars.from_frame(_frame(dates, closes), extra_columns=()))
+
+    def poll(self, symbol, since, interval="1d"):
+        self.calls.append((symbol, since, interval))
+        return self.deltas.pop(0) if self.deltas else None
+
+
+def _session(closes, end=None, period="1y", **kwargs):
+    end = end or pd.Timestamp.now(tz=TZ).normalize() - pd.Timedelta(days=1)
+    dates = pd.bdate_range(end=end, periods=len(closes), tz=TZ)
+    bars = Bars.from_frame(_frame(dates, closes))
+    compute_indicators_inplace(bars)
+    state = {"ticker": "2330", "market": "tw", "period": period, "interval": "1d", "bars": bars,
+             "intent": "basic"}
+    store = FakeStore()
+    return LiveSession(state, refresh_seconds=kwargs.pop("refresh_seconds", 0), store=store, **kwargs), store
+
+
+def _closes(n=80, seed=11):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def _next_dates(live, n):
+    return pd.bdate_range(live.last_bar + pd.Timedelta(days=1), periods=n)
+
+
+def _assert_matches_recompute(live, closes):
+    """最後一列的增量指標與整段重算相同"""
+    expected = compute_technical_indicators(pd.DataFrame({"Close": closes})).iloc[-1]
+    latest = live.bars.row(-1)
+    for column in INDICATOR_COLUMNS:
+        assert latest[column] == pytest.approx(expected[column], rel=1e-14, abs=1e-12, nan_ok=True), column
+
+
+def test_new_bars_are_appended():
+    closes = _closes()
+    live, store = _session(closes)
+    last = live.last_bar
+    store.push([last, *_next_dates(live, 2)], [closes[-1], 101.0, 102.0])
+
+    update = live.poll()
+    assert (update.added, update.revised) == (2, False)
+    assert store.calls == [("2330.TW", last, "1d")]
+    assert len(live.bars) == len(closes) + 2
+    assert live.state["current_price"] == 102.0
+    assert live.state["previous_close"] == 101.0
+    _assert_matches_recompute(live, [*closes, 101.0, 102.0])
+
+
+def test_last_bar_quote_is_revised():
+    closes = _closes()
+    live, store = _session(closes)
+    store.push([live.last_bar], [closes[-1] * 1.03])
+
+    update = live.poll()
+    assert (update.added, update.revised) == (0, True)
+    assert len(live.bars) == len(closes)
+    assert live.bars["Close"][-1] == closes[-1] * 1.03
+    _assert_matches_recompute(live, [*closes[:-1], closes[-1] * 1.03])
+
+
+def test_unchanged_and_older_bars_are_skipped():
+    closes = _closes()
+    live, store = _session(closes)
+    before = live.bars.row(-1)
+    dates = live.bars.date_index()
+    store.push(dates[-3:], closes[-3:] * [0.5, 0.5, 1.0])  # 較舊的 K 棒不影響，最後一根未變動
+    store.deltas.append(None)  # 本機沒有這檔股票
+
+    assert live.poll() is NO_UPDATE
+    assert live.poll() is NO_UPDATE
+    assert live.bars.row(-1) == before
+    assert len(live.bars) == len(closes)
+
+
+def test_poll_waits_for_refresh_interval():
+    live, store = _session(_closes(), refresh_seconds=3600)
+    assert live.poll() is NO_UPDATE
+    assert store.calls == []
+    live.poll(force=True)
+    assert len(store.calls) == 1
+
+
+def test_trim_keeps_period_window():
+    closes = _closes(120)
+    live, store = _session(closes, period="1mo")
+    assert len(live.bars) == len(closes)  # 建立時不切窗
+    dates = live.bars.date_index().append(_next_dates(live, 1))
+    store.push(dates[-1:], [closes[-1]])
+    live.poll()
+    start = pd.Timestamp.now(tz="UTC") - pd.DateOffset(months=1)
+    assert list(live.bars.date_index()) == [d for d in dates if d >= start]
+    assert live.state["data_points"] == len(live.bars)
+    assert live.state["period_high"] == np.nanmax(live.bars["Close"])
+
+
+def test_trim_keeps_latest_bar():
+    closes = _closes(40)
+    live, store = _session(closes, end=pd.Timestamp("2020-06-01", tz=TZ), period="5d")
+    store.push(_next_dates(live, 1), [closes[-1]])
+    live.poll()
+    assert len(live.bars) == 1
+    assert live.state["previous_close"] == live.state["current_price"]
+
+
+def test_signal_change_is_reported():
+    closes = _closes()
+    live, store = _session(closes)
+    before = list(live.signals)
+
+    store.push([live.last_bar], [closes[-1] + 1e-6])  # 報價小幅變動，訊號不變
+    assert live.poll() == (0, True, False)
+    store.push([live.last_bar], [closes[-1] * 0.8])  # 同一根 K 棒跌破布林下軌
+    assert live.poll().signals_changed is True
+    assert "跌破布林下軌" in live.signals and live.signals != before
+    store.push([live.last_bar], [closes[-1] * 0.79])
+    assert live.poll().signals_changed is False
+
+
+def test_incremental_indicators_track_full_recompute():
+    rng = np.random.default_rng(5)
+    closes = list(_closes(70))
+    live, store = _session(np.asarray(closes), period="max")
+    for step in range(200):
+        date = _next_dates(live, 1)[0]
+        price = closes[-1] * np.exp(rng.normal(0, 0.02))
+        if step % 3 == 0:  # 盤中報價：同一根 K 棒修正
+            store.push([live.last_bar], [price])
+            closes[-1] = price
+        elif step % 17 == 0:
+            store.push([date], [np.nan])  # 停牌
+            closes.append(np.nan)
+        else:
+            store.push([date], [price])
+            closes.append(price)
+        live.poll()
+        _assert_matches_recompute(live, closes)
+    assert len(live.bars) == len(closes)
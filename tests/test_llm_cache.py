@@ -0,0 +1,51 @@
+# tests/test_llm_cache.py
+
+import pytest
+
+import llm_cache as llm_cache_module
+from llm_cache import LLMResponseCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手動前進的 time.time()"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_ignores_noise():
+    base = make_key("2330", 593.0, 1.234, "摘要", {"pe_ratio": 25.00001, "sector": "Tech"})
+    assert make_key("2330", 593.001, 1.2341, "摘要", {"sector": "Tech", "pe_ratio": 25.0}) == base
+    assert make_key("2330", 594.0, 1.234, "摘要", {"pe_ratio": 25.0, "sector": "Tech"}) != base
+    assert make_key("2330", 593.0, 1.234, "摘要", {"pe_ratio": float("nan")}) == \
+        make_key("2330", 593.0, 1.234, "摘要", {"pe_ratio": None})
+
+
+def test_expired_entry_misses(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.set("k", "回應")
+    clock[0] += 59
+    assert cache.get("k") == "回應"
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 0}  # 過期項目已刪除
+
+
+def test_least_recently_used_is_evicted(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", "A")
+    clock[0] += 1
+    cache.set("b", "B")
+    clock[0] += 1
+    assert cache.get("a") == "A"  # a 最近被讀取
+    clock[0] += 1
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    LLMResponseCache(path).set("k", "回應")
+    assert LLMResponseCache(path).get("k") == "回應"
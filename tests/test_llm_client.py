@@ -0,0 +1,71 @@
+# tests/test_llm_client.py
+
+import socket
+
+import pytest
+
+import utils
+from benchmarks.fakes import FakeLLM, StubOllamaServer
+from llm_client import OllamaClient
+
+
+@pytest.fixture
+def stub():
+    with StubOllamaServer(FakeLLM()) as server:
+        yield server
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_stream_yields_tokens_in_order(stub):
+    client = OllamaClient(stub.url, model="test")
+    tokens = list(client.stream("hello"))
+    assert len(tokens) > 1
+    assert "".join(tokens).strip() == "".join(FakeLLM().stream("hello")).strip()
+    assert client.generate("hello") == "".join(tokens).strip()
+
+
+def test_connection_is_reused(stub):
+    client = OllamaClient(stub.url, model="test", max_concurrency=1)
+    for _ in range(5):
+        client.generate("hello")
+    assert stub.requests == 5
+    assert len(stub.connections) == 1
+    client.close()
+
+
+def _use_client(monkeypatch, client):
+    monkeypatch.setattr(utils, "get_client", lambda: client)
+    monkeypatch.setattr(utils, "_call_ollama_subprocess", lambda prompt, model: "fallback")
+
+
+def test_falls_back_when_connection_refused(monkeypatch):
+    _use_client(monkeypatch, OllamaClient(f"http://127.0.0.1:{_closed_port()}", connect_timeout=0.5))
+    assert utils.call_chatglm("hello") == "fallback"
+
+
+def test_falls_back_on_connect_timeout(monkeypatch):
+    client = OllamaClient("http://127.0.0.1:1")
+
+    def timeout():
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(client, "_new_connection", timeout)
+    _use_client(monkeypatch, client)
+    assert utils.call_chatglm("hello") == "fallback"
+    # 連線失敗不會佔住並行名額
+    assert client._slots.acquire(blocking=False)
+
+
+def test_read_timeout_does_not_fall_back(monkeypatch):
+    # 服務已連上但遲遲沒有回應：不再以 ollama run 重跑一次
+    with StubOllamaServer(FakeLLM(first_token_latency=1.0)) as server:
+        client = OllamaClient(server.url, read_timeout=0.2)
+        _use_client(monkeypatch, client)
+        with pytest.raises(TimeoutError):
+            utils.call_chatglm("hello")
+    assert client._slots.acquire(blocking=False)
@@ -0,0 +1,143 @@
+# tests/test_llm_queue.py
+
+import threading
+import time
+
+import pytest
+
+from llm_queue import LLMQueue, LLMQueueFullError, LLMQueueTimeout
+
+
+class Model:
+    """假的模型：記錄開始產生的順序；prompt 為 "block" 時等到 release() 才回傳"""
+
+    def __init__(self):
+        self.started = []
+        self.gate = threading.Event()
+
+    def __call__(self, prompt):
+        self.started.append(prompt)
+        if prompt == "block":
+            self.gate.wait(5)
+        yield prompt
+        yield "!"
+
+    def release(self):
+        self.gate.set()
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+@pytest.fixture
+def model():
+    model = Model()
+    yield model
+    model.release()
+
+
+def _busy_queue(model, **kwargs) -> LLMQueue:
+    """唯一的工作執行緒正在處理 "block" 的佇列"""
+    q = LLMQueue(workers=1, generate=model, **kwargs)
+    q.submit("block")
+    _wait_until(lambda: q.running == 1)
+    return q
+
+
+def test_result_and_stream(model):
+    q = LLMQueue(workers=1, max_pending=4, batch_size=1, generate=model)
+    assert q.submit("你好").result() == "你好!"
+    assert list(q.stream("嗨", priority="batch")) == ["嗨", "!"]
+    with pytest.raises(ValueError):
+        q.submit("x", priority="urgent")
+
+
+def test_interactive_runs_before_batch(model):
+    q = _busy_queue(model, max_pending=8, batch_size=1)
+    jobs = [q.submit("b1", priority="batch"), q.submit("i1"), q.submit("b2", priority="batch"), q.submit("i2")]
+    assert q.stats()["pending"] == {"interactive": 2, "batch": 2}
+    model.release()
+    assert [job.result() for job in jobs] == ["b1!", "i1!", "b2!", "i2!"]
+    assert model.started == ["block", "i1", "i2", "b1", "b2"]
+
+
+def test_interactive_evicts_newest_batch_job(model):
+    q = _busy_queue(model, max_pending=2, batch_size=1)
+    b1 = q.submit("b1", priority="batch")
+    b2 = q.submit("b2", priority="batch")
+    i1 = q.submit("i1")
+    with pytest.raises(LLMQueueFullError):
+        b2.result()  # 被擠出的 batch 工作
+    with pytest.raises(LLMQueueFullError):
+        q.submit("b3", priority="batch")  # batch 工作不能擠掉任何工作
+    i2 = q.submit("i2")
+    with pytest.raises(LLMQueueFullError):
+        b1.result()
+    with pytest.raises(LLMQueueFullError):
+        q.submit("i3")  # 佇列全是互動工作時直接拒絕
+    model.release()
+    assert (i1.result(), i2.result()) == ("i1!", "i2!")
+    assert model.started == ["block", "i1", "i2"]
+
+
+def test_deadline_times_out_and_frees_slot(model):
+    q = _busy_queue(model, max_pending=1, batch_size=1)
+    job = q.submit("late", deadline=0.05)
+    started = time.monotonic()
+    with pytest.raises(LLMQueueTimeout):
+        job.result()
+    assert time.monotonic() - started < 1
+    assert job.cancelled
+    # 逾時的工作不佔佇列空間，也不會送給模型
+    fresh = q.submit("fresh")
+    model.release()
+    assert fresh.result() == "fresh!"
+    assert "late" not in model.started
+
+
+def test_batch_jobs_run_together(model):
+    barrier = threading.Barrier(3, timeout=2)
+
+    def together(prompt):
+        barrier.wait()  # 三個工作必須同時執行才能通過
+        yield prompt
+
+    q = _busy_queue(model, max_pending=8, batch_size=3)
+    jobs = [q.submit(f"b{i}", priority="batch", generate=together) for i in range(3)]
+    model.release()
+    assert [job.result() for job in jobs] == ["b0", "b1", "b2"]
+
+
+def test_generation_error_reaches_caller():
+    def broken(prompt):
+        raise ConnectionError("模型服務中斷")
+        yield  # pragma: no cover
+
+    q = LLMQueue(workers=1, generate=broken)
+    with pytest.raises(ConnectionError):
+        q.submit("x").result()
+
+
+def test_closing_stream_stops_generation():
+    produced = []
+    closed = threading.Event()
+
+    def endless(prompt):
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield str(i)
+                time.sleep(0.001)
+        finally:
+            closed.set()
+
+    q = LLMQueue(workers=1, generate=endless)
+    tokens = q.stream("x")
+    assert next(tokens) == "0"
+    tokens.close()
+    assert closed.wait(2)
+    assert len(produced) < 1000
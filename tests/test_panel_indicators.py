@@ -0,0 +1,54 @@
+# tests/test_panel_indicators.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from bars import INDICATOR_COLUMNS
+from indicator_engine import BB_WINDOW
+from panel_indicators import compute_panel_indicators, rolling_mean_std
+from stock_utils import compute_technical_indicators
+
+
+def _walk(rng, rows: int, cols: int = 1) -> np.ndarray:
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (rows, cols)), axis=0))
+
+
+def test_flat_run_in_long_series_has_zero_std():
+    rng = np.random.default_rng(0)
+    close = _walk(rng, 3000)
+    close[2000:2100] = close[1999]  # 停牌或漲跌停鎖死
+    middle, std = rolling_mean_std(close, BB_WINDOW)
+    flat = slice(2000 + BB_WINDOW - 1, 2100)
+    assert (std[flat] == 0).all()
+    assert (middle[flat] == close[1999]).all()
+
+    # 其餘視窗與逐窗直接計算的標準差比較（pandas 的累加寫法在長序列上同樣有誤差）
+    exact = sliding_window_view(close[:, 0], BB_WINDOW).std(axis=1, ddof=1)
+    moving = exact > 1e-9
+    np.testing.assert_allclose(std[BB_WINDOW - 1:, 0][moving], exact[moving], rtol=1e-12)
+    mean = sliding_window_view(close[:, 0], BB_WINDOW).mean(axis=1)
+    np.testing.assert_allclose(middle[BB_WINDOW - 1:, 0], mean, rtol=1e-14)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_panel_matches_per_stock_indicators(seed):
+    rng = np.random.default_rng(seed)
+    close = _walk(rng, 400, 6)
+    close[:rng.integers(1, 300), 1] = np.nan  # 較晚上市
+    close[:390, 2] = np.nan  # 資料不足 BB_WINDOW 筆
+    close[rng.random(400) < 0.05, 3] = np.nan  # 停牌
+    close[:, 4] *= np.exp(np.linspace(0, 5, 400))  # 價格由 100 漲到上萬
+    close[:, 5] = np.nan
+    panel = compute_panel_indicators(close)
+    for n in range(close.shape[1]):
+        valid = np.flatnonzero(~np.isnan(close[:, n]))
+        if not len(valid):
+            assert all(np.isnan(panel[c][:, n]).all() for c in INDICATOR_COLUMNS)
+            continue
+        listed = close[valid[0]:, n]
+        expected = compute_technical_indicators(pd.DataFrame({"Close": listed}))
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(panel[column][valid[0]:, n], expected[column], rtol=1e-9, atol=1e-8,
+                                       err_msg=f"{column} 第 {n} 欄")
@@ -0,0 +1,98 @@
+# tests/test_prewarm.py
+
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import prewarm
+from prewarm import PrewarmScheduler, popular_tickers
+from query_stats import QueryStats
+
+UTC = ZoneInfo("UTC")
+
+
+def _at(text: str, tz: str = "Asia/Taipei") -> datetime:
+    return datetime.fromisoformat(text).replace(tzinfo=ZoneInfo(tz))
+
+
+@pytest.fixture
+def stats(tmp_path, monkeypatch):
+    stats = QueryStats(str(tmp_path / "query_stats.sqlite"))
+    monkeypatch.setattr(prewarm, "query_stats", stats)
+    return stats
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """以假的 run_prewarm 記錄執行的市場"""
+    calls = []
+
+    def fake_run(market, top_k, agent=None):
+        calls.append(market)
+        return {"market": market, "warmed": top_k, "failed": {}, "llm": agent is not None, "seconds": 0.0}
+
+    monkeypatch.setattr(prewarm, "run_prewarm", fake_run)
+    return calls
+
+
+def test_popular_tickers_fills_from_master(stats):
+    for _ in range(3):
+        stats.record("2454", "tw")
+    stats.record("AAPL", "us")
+    tickers = popular_tickers("tw", 5)
+    assert tickers[0] == "2454" and len(tickers) == 5 == len(set(tickers))
+    assert all(prewarm.resolver.lookup("tw", t) is not None for t in tickers[1:])
+
+
+def test_due_after_close_on_weekdays(stats):
+    scheduler = PrewarmScheduler()
+    # 2026-10-16 為週五
+    assert scheduler.due(_at("2026-10-16 14:29")) == []
+    assert scheduler.due(_at("2026-10-16 14:30")) == [("tw", "2026-10-16")]
+    # 美股收盤後台北已是週六，只有美股到期
+    assert scheduler.due(_at("2026-10-16 16:30", "America/New_York")) == [("us", "2026-10-16")]
+    assert scheduler.due(_at("2026-10-17 15:00")) == []  # 週六
+
+
+def test_run_pending_runs_each_market_once_per_day(stats, runs):
+    scheduler = PrewarmScheduler(top_k=7)
+    summaries = scheduler.run_pending(_at("2026-10-16 15:00"))
+    assert runs == ["tw"] and summaries[0]["warmed"] == 7
+    assert stats.last_run("tw") == "2026-10-16"
+    assert scheduler.run_pending(_at("2026-10-16 18:00")) == []
+    scheduler.run_pending(_at("2026-10-16 17:00", "America/New_York"))
+    assert runs == ["tw", "us"]
+    assert set(scheduler.last_summary) == {"tw", "us"}
+    scheduler.run_pending(_at("2026-10-19 14:30"))  # 下一個交易日
+    assert runs == ["tw", "us", "tw"]
+
+
+def test_startup_catches_up_missed_run(stats, runs):
+    # 今天的預熱時間已過且尚未執行，啟動後立即補做
+    PrewarmScheduler(markets=["tw"]).run_pending(_at("2026-10-16 22:00"))
+    assert runs == ["tw"]
+
+
+def test_next_run_skips_weekends():
+    scheduler = PrewarmScheduler()
+    # 週五台股預熱後，下一次是同一天美股收盤（美東夏令時間 UTC-4）
+    assert scheduler.next_run(_at("2026-10-16 15:00")) == datetime(2026, 10, 16, 20, 30, tzinfo=UTC)
+    # 週五美股預熱後，下一次是週一台股收盤
+    assert scheduler.next_run(_at("2026-10-16 17:00", "America/New_York")) == \
+        datetime(2026, 10, 19, 6, 30, tzinfo=UTC)
+    assert PrewarmScheduler(markets=["us"]).next_run(_at("2026-10-17 12:00")) == \
+        datetime(2026, 10, 19, 20, 30, tzinfo=UTC)
+
+
+def test_start_and_stop(stats, runs, monkeypatch):
+    monkeypatch.setattr(PrewarmScheduler, "due", lambda self, now=None: [("tw", "2026-10-16")])
+    scheduler = PrewarmScheduler().start()
+    assert scheduler.start() is scheduler
+    deadline = time.monotonic() + 2
+    while not runs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    assert not scheduler._thread.is_alive()
+    assert runs == ["tw"]  # 執行後等待下一次排程
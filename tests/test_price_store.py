@@ -0,0 +1,101 @@
+# tests/test_price_store.py
+
+import pandas as pd
+
+from bar_archive import BarArchive
+from price_store import PriceStore, period_to_offset
+
+
+class CountingUpstream:
+    """假的上游：只有最近 n 個交易日的資料（例如新上市），記錄每次呼叫的參數"""
+
+    def __init__(self, n: int = 200):
+        dates = pd.bdate_range(end=pd.Timestamp.now(tz="Asia/Taipei").normalize(), periods=n)
+        self.frame = pd.DataFrame({"Open": 10.0, "High": 11.0, "Low": 9.0, "Close": 10.0, "Volume": 1000.0},
+                                  index=pd.DatetimeIndex(dates, name="Date"))
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, symbol, period=None, start=None, interval="1d"):
+        self.calls.append("delta" if start is not None else period)
+        if self.fail:
+            return pd.DataFrame()
+        if start is not None:
+            return self.frame[self.frame.index >= pd.Timestamp(start, tz="Asia/Taipei")]
+        offset = period_to_offset(period)
+        if offset is None:
+            return self.frame
+        return self.frame[self.frame.index >= pd.Timestamp.now(tz="Asia/Taipei") - offset]
+
+
+def test_short_history_is_not_refetched_for_longer_periods(tmp_path):
+    upstream = CountingUpstream()
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    assert len(store.history("6488.TWO", period="10y")) == 200
+    for period in ("10y", "max", "5y"):
+        assert len(store.history("6488.TWO", period=period)) == 200
+    assert upstream.calls == ["10y", "delta", "delta", "delta"]
+
+
+def test_max_period_takes_delta_path(tmp_path):
+    upstream = CountingUpstream()
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    store.history("2330.TW", period="max")
+    store.history("2330.TW", period="max")
+    store.history("2330.TW", period="1mo")
+    assert upstream.calls == ["max", "delta", "delta"]
+
+
+def test_covering_download_is_not_marked_complete(tmp_path):
+    upstream = CountingUpstream(n=1000)
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    store.history("2330.TW", period="1y")
+    store.history("2330.TW", period="2y")  # 本機只有一年，上游還有更早的資料
+    assert upstream.calls == ["1y", "2y"]
+
+
+def test_failed_download_falls_back_to_window(tmp_path):
+    upstream = CountingUpstream(n=1000)
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    store.history("2330.TW", period="1y")
+    upstream.fail = True
+    df = store.history("2330.TW", period="2y")
+    assert not df.empty
+    assert df["Date"].min() >= pd.Timestamp.now(tz="Asia/Taipei") - pd.DateOffset(years=2)
+
+
+def test_adjusted_store_from_older_version_is_refetched(tmp_path):
+    upstream = CountingUpstream()
+    BarArchive(str(tmp_path)).write("2330.TW", upstream.frame.reset_index())  # 舊版（還原價格，沒有 tag）
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    assert store.load("2330.TW") is None
+    assert len(store.history("2330.TW", period="1y")) == 200
+    assert upstream.calls == ["1y"]
+
+
+def test_poll_returns_bars_since_last_known(tmp_path):
+    upstream = CountingUpstream(n=30)
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=3600)
+    assert store.poll("2330.TW", pd.Timestamp.now(tz="UTC")) is None  # 本機沒有資料時不連網
+    assert upstream.calls == []
+
+    store.history("2330.TW", period="1y")
+    last = upstream.frame.index[-1]
+    upstream.frame.loc[last, "Close"] = 10.5  # 盤中報價變動
+    upstream.frame.loc[last + pd.Timedelta(days=1)] = [10.5, 11.0, 10.0, 10.8, 500.0]
+
+    delta = store.poll("2330.TW", last)
+    assert upstream.calls == ["1y", "delta"]  # 不受 refresh_seconds 限制
+    assert list(delta.date_index()) == [last, last + pd.Timedelta(days=1)]
+    assert delta["Close"].tolist() == [10.5, 10.8]
+    assert "MA_5" not in delta
+    assert store.load("2330.TW")["Close"].tolist()[-2:] == [10.5, 10.8]
+
+
+def test_poll_keeps_local_bars_when_upstream_fails(tmp_path):
+    upstream = CountingUpstream(n=30)
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    store.history("2330.TW", period="1y")
+    upstream.fail = True
+    last = upstream.frame.index[-1]
+    assert store.poll("2330.TW", last)["Close"].tolist() == [10.0]
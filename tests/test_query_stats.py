@@ -0,0 +1,91 @@
+# tests/test_query_stats.py
+
+import threading
+import time
+
+import pytest
+
+from query_stats import QueryStats
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return QueryStats(str(tmp_path / "query_stats.sqlite"), flush_seconds=3600)
+
+
+def _days_ago(n: int) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(time.time() - n * 86400))
+
+
+def test_record_buffers_until_flush(stats):
+    stats.record("2330", "tw")
+    stats.record("2330", "tw")
+    assert stats._conn is None  # 查詢時不寫入資料庫
+    assert stats.top("tw", 5) == ["2330"]  # top 會先寫入累計的次數
+    assert stats._conn.execute("SELECT count FROM query_counts").fetchall() == [(2,)]
+
+
+def test_record_flushes_after_interval(tmp_path):
+    stats = QueryStats(str(tmp_path / "query_stats.sqlite"), flush_seconds=0)
+    stats.record("aapl", "us")
+    assert stats._conn.execute("SELECT ticker, count FROM query_counts").fetchall() == [("AAPL", 1)]
+
+
+def test_record_ignores_unknown_market(stats):
+    stats.record("2330", "unknown")
+    stats.record("", "tw")
+    assert stats.top("tw", 5) == []
+
+
+def test_top_orders_by_count_and_filters_market(stats):
+    for ticker, n in [("2330", 3), ("2454", 5), ("2317", 3)]:
+        for _ in range(n):
+            stats.record(ticker, "tw")
+    stats.record("AAPL", "us")
+    assert stats.top("tw", 5) == ["2454", "2317", "2330"]  # 次數相同時依代號排序
+    assert stats.top("tw", 1) == ["2454"]
+    assert stats.top("us", 5) == ["AAPL"]
+
+
+def test_counts_accumulate_across_flushes(stats):
+    stats.record("2330", "tw")
+    stats.flush()
+    stats.record("2330", "tw")
+    stats.flush()
+    assert stats._conn.execute("SELECT count FROM query_counts").fetchall() == [(2,)]
+
+
+def test_top_window_and_prune(stats):
+    stats.record("2330", "tw")
+    stats.flush()
+    conn = stats._conn
+    conn.executemany("INSERT INTO query_counts VALUES ('tw', ?, ?, ?)",
+                     [("2454", _days_ago(20), 100), ("2317", _days_ago(120), 100)])
+    conn.commit()
+    assert stats.top("tw", 5) == ["2330"]
+    assert stats.top("tw", 5, days=30) == ["2454", "2330"]
+    stats.prune(days=90)
+    assert stats.top("tw", 5, days=365) == ["2454", "2330"]
+
+
+def test_mark_run(stats):
+    assert stats.last_run("tw") is None
+    stats.mark_run("tw", "2026-10-15")
+    stats.mark_run("tw", "2026-10-16")
+    stats.mark_run("tw", "2026-10-16")
+    assert stats.last_run("tw") == "2026-10-16"
+    assert stats.last_run("us") is None
+
+
+def test_concurrent_records_are_not_lost(stats):
+    def hammer():
+        for _ in range(500):
+            stats.record("2330", "tw")
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats.flush()
+    assert stats._conn.execute("SELECT count FROM query_counts").fetchall() == [(4000,)]
@@ -0,0 +1,132 @@
+# tests/test_screener.py
+
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_store import PriceStore
+from screener import SignalIndex
+
+
+class FakeUpstream:
+    """假的上游：固定的日線資料，可在測試中加入新 K 棒"""
+
+    def __init__(self, closes):
+        dates = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=7), periods=len(closes))
+        self.frame = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes,
+                                   "Volume": 1000.0}, index=pd.DatetimeIndex(dates, name="Date"))
+
+    def add_bar(self, close: float) -> pd.Timestamp:
+        date = self.frame.index[-1] + pd.Timedelta(days=1)
+        self.frame.loc[date] = [close, close, close, close, 1000.0]
+        return date
+
+    def __call__(self, symbol, period=None, start=None, interval="1d"):
+        if start is not None:
+            return self.frame[self.frame.index >= pd.Timestamp(start)]
+        return self.frame
+
+
+@pytest.fixture
+def watched(tmp_path):
+    rng = np.random.default_rng(3)
+    upstream = FakeUpstream(100 + np.cumsum(rng.normal(0, 0.5, 80)))
+    store = PriceStore(root=str(tmp_path), downloader=upstream, refresh_seconds=0)
+    index = SignalIndex(path=None, store=store)
+    index.watch()
+    yield upstream, store, index
+    index.unwatch()
+
+
+def test_new_bar_updates_query_without_rebuild(watched):
+    upstream, store, index = watched
+    store.history("2330.TW", period="6mo")
+    assert index.query(where=["Close<BB_Lower"]).empty
+
+    date = upstream.add_bar(50.0)
+    store.history("2330.TW", period="6mo")  # 增量補抓只寫入新的 K 棒
+
+    hits = index.query(where=["Close<BB_Lower"])
+    assert list(hits["ticker"]) == ["2330"]
+    row = index.get("2330", "tw")
+    assert row["Close"] == 50.0
+    assert pd.Timestamp(row["date"]) == date
+
+
+def test_refetched_old_bars_do_not_rewind(watched):
+    upstream, store, index = watched
+    store.history("AAPL", period="6mo")
+    latest = index.get("AAPL", "us")
+    store.save("AAPL", upstream(None).reset_index().iloc[:-5])
+    assert index.get("AAPL", "us") == latest
+
+
+def test_unwatch_stops_updates(watched):
+    upstream, store, index = watched
+    store.history("2330.TW", period="6mo")
+    index.unwatch()
+    upstream.add_bar(50.0)
+    store.history("2330.TW", period="6mo")
+    assert index.get("2330", "tw")["Close"] != 50.0
+
+
+LATEST = {"Close": 10.0, "MA_5": 10.0, "RSI_14": 50.0}
+
+
+def _save_one(path: str, ticker: str):
+    index = SignalIndex(path)
+    index.seed(ticker, "tw", np.full(30, 10.0), "2024-01-02")
+    index.save()
+
+
+def test_concurrent_saves_keep_every_writer(tmp_path):
+    path = str(tmp_path / "screener.parquet")
+    tickers = [str(1000 + i) for i in range(6)]
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_save_one, args=(path, t)) for t in tickers]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    index = SignalIndex(path)
+    assert sorted(t for _, t in index._rows) == tickers
+    assert sorted(index.engine.tickers()) == [f"tw:{t}" for t in tickers]
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def test_save_keeps_newer_rows_from_disk(tmp_path):
+    path = str(tmp_path / "screener.parquet")
+    stale = SignalIndex(path)  # 在其他行程更新之前載入
+    stale.upsert("2330", "tw", LATEST, "2024-01-02")
+    stale.upsert("AAPL", "us", LATEST, "2024-01-05")
+
+    other = SignalIndex(path)
+    other.upsert("2330", "tw", {**LATEST, "Close": 12.0}, "2024-01-03")
+    other.upsert("AAPL", "us", {**LATEST, "Close": 12.0}, "2024-01-04")
+    other.upsert("0050", "tw", LATEST, "2024-01-03")
+    other.save()
+    stale.save()
+
+    saved = SignalIndex(path)
+    assert len(saved) == 3
+    assert saved.get("2330", "tw")["Close"] == 12.0  # 磁碟上較新
+    assert saved.get("AAPL", "us")["Close"] == 10.0  # 本行程較新
+    assert saved.get("0050", "tw") is not None  # 只在磁碟上
+
+
+def test_corrupt_state_file_is_ignored(tmp_path):
+    path = str(tmp_path / "screener.parquet")
+    index = SignalIndex(path)
+    index.seed("2330", "tw", np.full(30, 10.0), "2024-01-02")
+    index.save()
+    with open(tmp_path / "screener.state.json", "w", encoding="utf-8") as f:
+        f.write('{"version": 1, "tickers": {"tw:23')  # 寫到一半的檔案
+
+    loaded = SignalIndex(path)
+    assert loaded.get("2330", "tw")["Close"] == 10.0
+    assert loaded.engine.tickers() == []
+    loaded.save()  # 損毀的狀態檔不影響存檔
+    assert SignalIndex(path).engine.tickers() == []
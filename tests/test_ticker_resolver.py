@@ -0,0 +1,48 @@
+# tests/test_ticker_resolver.py
+
+import pytest
+
+from ticker_resolver import TickerResolver, normalize, resolver
+
+
+@pytest.mark.parametrize("query, market, ticker, method", [
+    ("2330", "tw", "2330", "code"),
+    ("6488.TWO", "tw", "6488", "code"),
+    ("AAPL", "us", "AAPL", "exact"),
+    ("brk-b", "us", "BRK.B", "exact"),
+    ("台積", "tw", "2330", "exact"),
+    ("Ford", "us", "F", "exact"),
+    ("福特汽車", "us", "F", "exact"),
+    ("Micro", "us", "MSFT", "prefix"),
+    ("Nvidi", "us", "NVDA", "prefix"),
+    ("nvidai", "us", "NVDA", "fuzzy"),
+    ("我想看聯發科", "tw", "2454", "text"),
+    ("我想看2330", "tw", "2330", "text"),
+])
+def test_resolve(query, market, ticker, method):
+    result = resolver.resolve(query)
+    assert (result.market, result.ticker, result.method) == (market, ticker, method)
+
+
+def test_unknown_codes_keep_market_by_format():
+    assert resolver.resolve("9999").market == "tw"
+    assert resolver.resolve("9999.TWO").exchange == "TPEx"
+    assert resolver.resolve("ZZZZ")[:2] == ("us", "ZZZZ")
+
+
+def test_long_digit_runs_are_not_codes():
+    # 7 位數字不能被截成 6 位的台股代號
+    assert resolver.resolve("1234567").market == "unknown"
+    assert resolver.resolve("看看1234567").market == "unknown"
+    assert resolver.resolve("").market == "unknown"
+
+
+def test_yahoo_round_trip():
+    for ticker, market, symbol in [("2330", "tw", "2330.TW"), ("6488", "tw", "6488.TWO"),
+                                   ("BRK.B", "us", "BRK-B"), ("AAPL", "us", "AAPL")]:
+        assert resolver.yahoo_symbol(ticker, market) == symbol
+        assert TickerResolver.from_yahoo(symbol) == (ticker, market)
+
+
+def test_normalize():
+    assert normalize("Brk-B ") == normalize("brk.b") == "brkb"
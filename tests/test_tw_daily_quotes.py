@@ -0,0 +1,53 @@
+# tests/test_tw_daily_quotes.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore
+from screener import SignalIndex
+from tw_daily_quotes import DailyQuote, ingest_daily_quotes, parse_daily_quotes
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+TWSE_CSV = os.path.join(FIXTURES, "twse_20240102.csv")  # Big5，代號為 ="0050"
+TPEX_CSV = os.path.join(FIXTURES, "tpex_20240102.csv")  # UTF-8（BOM），「資料日期:113/01/02」
+
+
+def test_parse_twse_csv():
+    quotes = list(parse_daily_quotes(TWSE_CSV))
+    assert quotes == [
+        DailyQuote("2024-01-02", "0050", "twse", "元大台灣50", 130.5, 131.2, 130.1, 131.0, 12345678.0),
+        DailyQuote("2024-01-02", "2330", "twse", "台積電", 590.0, 593.0, 589.0, 593.0, 30123456.0),
+    ]  # 指數表略過，1101 當日無成交（--）略過
+
+
+def test_parse_tpex_csv():
+    quotes = list(parse_daily_quotes(TPEX_CSV))
+    assert quotes == [
+        DailyQuote("2024-01-02", "006201", "tpex", "元大富櫃50", 18.55, 18.6, 18.45, 18.5, 152000.0),
+        DailyQuote("2024-01-02", "6488", "tpex", "環球晶", 515.0, 522.0, 514.0, 520.0, 1234567.0),
+    ]  # 8069 當日無成交（----）略過
+
+
+def test_ingest_writes_exchange_bars(tmp_path):
+    store = PriceStore(root=str(tmp_path))
+    stats = ingest_daily_quotes([TWSE_CSV, TPEX_CSV], store=store)
+    assert (stats["files"], stats["days"], stats["symbols"], stats["failed"]) == (2, 1, 4, {})
+
+    df = store.load("2330.TW")
+    assert list(df["Date"]) == [pd.Timestamp("2024-01-02", tz="Asia/Taipei")]
+    np.testing.assert_array_equal(df[["Open", "High", "Low", "Close", "Volume"]].to_numpy(),
+                                  [[590.0, 593.0, 589.0, 593.0, 30123456.0]])
+    assert store.load("6488.TWO")["Close"].tolist() == [520.0]
+    assert store.load("1101.TW") is None
+
+
+def test_ingest_updates_signal_index(tmp_path):
+    store = PriceStore(root=str(tmp_path / "prices"))
+    path = str(tmp_path / "screener.parquet")
+    ingest_daily_quotes([TWSE_CSV, TPEX_CSV], store=store, index=SignalIndex(path, store=store))
+    index = SignalIndex(path, store=store)
+    assert len(index) == 4
+    row = index.get("6488", "tw")
+    assert (row["Close"], pd.Timestamp(row["date"])) == (520.0, pd.Timestamp("2024-01-02"))
@@ -0,0 +1,273 @@
+# ticker_resolver.py
+"""
+離線股票代號解析：由本機股票主檔（台股 / 美股代號、中英文名稱、別名）
+將使用者輸入（2330、6488.TWO、台積電、Apple、「我想看聯發科」）解析為市場與代號
+
+主檔為專案內的 symbols.csv；DATA_DIR/symbols.csv 存在時一併載入（可放完整的上市櫃清單，
+相同代號以後者為準）
+"""
+
+import csv
+import difflib
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import DATA_DIR
+
+BUILTIN_MASTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbols.csv")
+USER_MASTER = os.path.join(DATA_DIR, "symbols.csv")
+
+_TW_SUFFIXED = re.compile(r"(\d{4,6}[A-Z]?)\.(TWO|TW)")
+_TW_CODE = re.compile(r"\d{4,6}[A-Z]?")
+_US_CODE = re.compile(r"[A-Z]{1,5}(?:[.-][A-Z])?")
+# 數字代號前後不能緊接其他數字（1234567 不是台股代號）
+_TOKENS = re.compile(r"(?<!\d)\d{4,6}(?!\d)[A-Za-z]?(?:\.TWO|\.TW)?|[A-Za-z][A-Za-z.\-&']*|[一-鿿]+")
+_PUNCT = re.compile(r"[\s.\-&',()]")
+FUZZY_CUTOFF = 0.6
+_MAX_SUBSTRING = 12  # 自由文字中搜尋名稱時，中文片段的最大長度
+
+
+def normalize(text: str) -> str:
+    """全形轉半形、不分大小寫、去除空白與標點"""
+    return _PUNCT.sub("", unicodedata.normalize("NFKC", text).casefold())
+
+
+class SymbolEntry(NamedTuple):
+    code: str
+    market: str
+    exchange: str
+    name: str
+    name_en: str
+    aliases: tuple
+    rank: int  # 主檔中的順序，同分時排前面的優先
+
+
+class Resolution(NamedTuple):
+    market: str  # "tw" / "us" / "unknown"
+    ticker: str
+    name: Optional[str] = None
+    exchange: Optional[str] = None
+    method: Optional[str] = None  # "code" / "exact" / "prefix" / "text" / "fuzzy"
+
+    @property
+    def symbol(self) -> str:
+        """Yahoo Finance 代號"""
+        if self.market == "tw":
+            if "." in self.ticker:
+                return self.ticker
+            return f"{self.ticker}.TWO" if self.exchange == "TPEx" else f"{self.ticker}.TW"
+        return self.ticker.replace(".", "-")
+
+
+class TickerResolver:
+    """
+    記憶體內的代號索引
+    - 完全比對：代號、名稱、別名（正規化後）的 dict
+    - 前綴比對：排序後的名稱鍵，二分搜尋
+    - 模糊比對：字元（中文）/ 雙字母（英文）的倒排索引挑出候選，再以 difflib 計分
+    """
+
+    def __init__(self, entries: List[SymbolEntry]):
+        self.entries = entries
+        self._by_code: Dict[tuple, SymbolEntry] = {}
+        self._exact: Dict[str, SymbolEntry] = {}
+        self._postings: Dict[str, List[str]] = {}
+        for entry in entries:
+            self._by_code[(entry.market, entry.code)] = entry
+        # 代號優先，名稱與別名不覆蓋已存在的鍵
+        for entry in entries:
+            self._exact.setdefault(normalize(entry.code), entry)
+        for entry in entries:
+            for text in (entry.name, entry.name_en, *entry.aliases):
+                key = normalize(text) if text else ""
+                if key:
+                    self._exact.setdefault(key, entry)
+        self._keys = sorted(k for k, e in self._exact.items() if k != normalize(e.code))
+        for key in self._keys:
+            for gram in set(self._grams(key)):
+                self._postings.setdefault(gram, []).append(key)
+
+    @classmethod
+    def from_files(cls, paths=(BUILTIN_MASTER, USER_MASTER)) -> "TickerResolver":
+        rows = {}
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    code = (row.get("code") or "").strip().upper()
+                    market = (row.get("market") or "").strip().lower()
+                    if code and market in ("tw", "us"):
+                        rows[(market, code)] = row
+        entries = [
+            SymbolEntry(
+                code=code,
+                market=market,
+                exchange=(row.get("exchange") or ("TWSE" if market == "tw" else "US")).strip(),
+                name=(row.get("name") or "").strip(),
+                name_en=(row.get("name_en") or "").strip(),
+                aliases=tuple(a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()),
+                rank=rank,
+            )
+            for rank, ((market, code), row) in enumerate(rows.items())
+        ]
+        return cls(entries)
+
+    @staticmethod
+    def _grams(key: str) -> list:
+        if key.isascii():
+            padded = f" {key} "
+            return [padded[i:i + 2] for i in range(len(padded) - 1)]
+        return list(key)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _result(self, entry: SymbolEntry, method: str) -> Resolution:
+        return Resolution(entry.market, entry.code, entry.name or entry.name_en, entry.exchange, method)
+
+    def lookup(self, market: str, code: str) -> Optional[SymbolEntry]:
+        return self._by_code.get((market, code.upper()))
+
+    def yahoo_symbol(self, ticker: str, market: str) -> str:
+        """
+        股票代號轉為 Yahoo Finance 代號：上櫃股票加 .TWO、其他台股加 .TW，美股 BRK.B -> BRK-B
+        """
+        ticker = ticker.strip().upper()
+        if market != "tw":
+            return ticker.replace(".", "-")
+        if ticker.endswith((".TW", ".TWO")):
+            return ticker
+        entry = self._by_code.get(("tw", ticker))
+        return f"{ticker}.TWO" if entry is not None and entry.exchange == "TPEx" else f"{ticker}.TW"
+
+    @staticmethod
+    def from_yahoo(symbol: str) -> Tuple[str, str]:
+        """
+        yahoo_symbol 的反向：2330.TW、6488.TWO -> (代號, "tw")，BRK-B -> ("BRK.B", "us")
+        """
+        symbol = symbol.strip().upper()
+        code, dot, suffix = symbol.rpartition(".")
+        if dot and suffix in ("TW", "TWO"):
+            return code, "tw"
+        return symbol.replace("-", "."), "us"
+
+    # ---- 解析 ----
+    def _code(self, text: str) -> Optional[Resolution]:
+        """代號格式（不查主檔也能判斷市場）"""
+        upper = text.upper()
+        match = _TW_SUFFIXED.fullmatch(upper)
+        if match:
+            code, suffix = match.groups()
+            entry = self._by_code.get(("tw", code))
+            if entry is not None:
+                return self._result(entry, "code")
+            # 主檔沒有的代號保留後綴，抓資料時才知道是上市還是上櫃
+            return Resolution("tw", upper, None, "TPEx" if suffix == "TWO" else "TWSE", "code")
+        if _TW_CODE.fullmatch(upper):
+            entry = self._by_code.get(("tw", upper))
+            return self._result(entry, "code") if entry else Resolution("tw", upper, method="code")
+        return None
+
+    def _prefix(self, key: str, limit: int = 64) -> Optional[SymbolEntry]:
+        i = bisect_left(self._keys, key)
+        best = None
+        for k in self._keys[i:i + limit]:
+            if not k.startswith(key):
+                break
+            entry = self._exact[k]
+            if best is None or entry.rank < best.rank:
+                best = entry
+        return best
+
+    def _fuzzy(self, key: str, candidates: int = 20) -> Optional[SymbolEntry]:
+        counts = Counter()
+        for gram in set(self._grams(key)):
+            counts.update(self._postings.get(gram, ()))
+        best, best_score = None, FUZZY_CUTOFF
+        for k, _ in counts.most_common(candidates):
+            score = difflib.SequenceMatcher(None, key, k).ratio()
+            entry = self._exact[k]
+            if score > best_score or (score == best_score and best is not None and entry.rank < best.rank):
+                best, best_score = entry, score
+        return best
+
+    def _scan(self, text: str) -> Optional[Resolution]:
+        """自由文字：依序找名稱 / 代號、台股代號、大寫的美股代號"""
+        tokens = _TOKENS.findall(text)
+        for token in tokens:
+            if "一" <= token[0] <= "鿿":
+                # 中文片段：由長到短找出包含的名稱
+                run = token[:_MAX_SUBSTRING]
+                for size in range(len(run), 1, -1):
+                    for start in range(len(run) - size + 1):
+                        entry = self._exact.get(run[start:start + size])
+                        if entry is not None:
+                            return self._result(entry, "text")
+            else:
+                entry = self._exact.get(normalize(token))
+                if entry is not None:
+                    return self._result(entry, "text")
+        for token in tokens:
+            result = self._code(token)
+            if result is not None:
+                return result
+        for token in tokens:
+            if token.isupper() and _US_CODE.fullmatch(token):
+                return Resolution("us", token, method="code")
+        return None
+
+    def resolve(self, query: str) -> Resolution:
+        """
+        解析使用者輸入，無法辨識時 market 為 "unknown"
+        """
+        text = unicodedata.normalize("NFKC", query).strip()
+        if not text:
+            return Resolution("unknown", "")
+
+        result = self._code(text)
+        if result is not None:
+            return result
+        key = normalize(text)
+        entry = self._exact.get(key)
+        if entry is not None:
+            return self._result(entry, "exact")
+
+        # 像美股代號的輸入直接當作代號；首字大寫其餘小寫（如 Nvidi）視為名稱，先做名稱比對
+        looks_like_name = len(text) >= 4 and text[0].isupper() and text[1:].islower()
+        if _US_CODE.fullmatch(text.upper()) and not looks_like_name:
+            return Resolution("us", text.upper(), method="code")
+
+        if len(key) >= 2:
+            entry = self._prefix(key)
+            if entry is not None:
+                return self._result(entry, "prefix")
+        result = self._scan(text)
+        if result is not None:
+            return result
+        if len(key) >= 2:
+            entry = self._fuzzy(key)
+            if entry is not None:
+                return self._result(entry, "fuzzy")
+        if _US_CODE.fullmatch(text.upper()):
+            return Resolution("us", text.upper(), method="code")
+        return Resolution("unknown", text.upper())
+
+
+# 模組層級共用實例
+resolver = TickerResolver.from_files()
+
+
+def main():
+    for query in sys.argv[1:] or ["2330", "6488.TWO", "台積電", "Apple", "我想看聯發科", "nvidai"]:
+        result = resolver.resolve(query)
+        print(f"{query} -> {result.market} {result.ticker}（{result.name or '-'}，{result.symbol}，{result.method}）")
+
+
+if __name__ == "__main__":
+    main()
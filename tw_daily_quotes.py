@@ -0,0 +1,375 @@
+# tw_daily_quotes.py
+"""
+台股全市場每日收盤行情匯入
+讀取證交所（上市）與櫃買中心（上櫃）的「每日收盤行情（全部）」檔案（民國年日期，CSV 或 JSON），
+一次讀完一個交易日的全部股票寫入本機價格資料庫，回補歷史時每天一個檔案，不必逐檔向 Yahoo 要資料
+
+支援的格式：
+- 證交所 MI_INDEX（JSON：tables / fieldsN、dataN；CSV：Big5 編碼、代號為 ="0050"）
+- 證交所 OpenAPI STOCK_DAY_ALL（JSON 陣列，Date 為 1130102）
+- 櫃買中心每日收盤行情（JSON：aaData 或 tables；CSV：「資料日期:113/01/02」）
+- 櫃買中心 OpenAPI（JSON 陣列，SecuritiesCompanyCode）
+交易所價格為未還原權息的原始價格，與本機價格資料庫的基準相同（yfinance 以 auto_adjust=False 下載）
+
+python tw_daily_quotes.py data/tw_daily/twse/20240102.json data/tw_daily/tpex/20240102.csv
+python tw_daily_quotes.py --download --start 2024-01-01 --end 2024-03-31
+"""
+
+import argparse
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_DIR
+from fetch_gateway import gateway
+from metrics import metrics
+from price_store import price_store
+from screener import SignalIndex
+from stock_utils import convert_tw_date
+from ticker_resolver import USER_MASTER, resolver
+
+DAILY_DIR = os.path.join(DATA_DIR, "tw_daily")
+TW_TZ = "Asia/Taipei"
+
+# 下載網址（{date} 為西元 YYYYMMDD，{roc_date} 為民國 113/01/02）
+DOWNLOAD_URLS = {
+    "twse": "https://www.twse.com.tw/rwd/zh/afterTrading/MI_INDEX?date={date}&type=ALLBUT0999&response=json",
+    "tpex": ("https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_result.php"
+             "?l=zh-tw&o=json&d={roc_date}"),
+}
+SUFFIXES = {"twse": ".TW", "tpex": ".TWO"}
+
+# 欄位名稱（各格式）對應到統一的欄位
+_HEADERS = {
+    "code": ("證券代號", "代號", "股票代號", "Code", "SecuritiesCompanyCode"),
+    "name": ("證券名稱", "名稱", "股票名稱", "Name", "CompanyName"),
+    "open": ("開盤價", "開盤", "OpeningPrice", "Open"),
+    "high": ("最高價", "最高", "HighestPrice", "High"),
+    "low": ("最低價", "最低", "LowestPrice", "Low"),
+    "close": ("收盤價", "收盤", "ClosingPrice", "Close"),
+    "volume": ("成交股數", "TradeVolume", "TradingShares"),
+    "date": ("日期", "Date"),
+}
+_HEADER_FIELDS = {header: field for field, headers in _HEADERS.items() for header in headers}
+# 櫃買中心舊版 aaData 沒有欄位名稱，欄位順序固定
+_TPEX_AADATA_COLUMNS = ("代號", "名稱", "收盤", "漲跌", "開盤", "最高", "最低", "均價", "成交股數")
+
+_CODE = re.compile(r"\d{4,6}[A-Z]?")
+_ROC_IN_TEXT = re.compile(r"(\d{2,3})\s*[/年]\s*(\d{1,2})\s*[/月]\s*(\d{1,2})")
+
+
+class DailyQuote(NamedTuple):
+    date: str  # 西元 YYYY-MM-DD
+    code: str
+    exchange: str  # "twse" / "tpex"
+    name: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+def _number(text) -> float:
+    """'1,234.50' -> 1234.5；'--'、'X' 等無成交標記為 NaN"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    try:
+        return float(str(text).replace(",", "").strip())
+    except ValueError:
+        return np.nan
+
+
+def _roc_date_in(text: str) -> Optional[str]:
+    """在標題等文字中找民國年日期，回傳西元 YYYY-MM-DD"""
+    match = _ROC_IN_TEXT.search(text or "")
+    return convert_tw_date("/".join(match.groups())) if match else None
+
+
+def _western_date(text: str) -> Optional[str]:
+    """'20240102' -> '2024-01-02'"""
+    text = str(text or "").strip()
+    return f"{text[:4]}-{text[4:6]}-{text[6:8]}" if re.fullmatch(r"\d{8}", text) else None
+
+
+def _mapping(header: Iterable[str]) -> Optional[dict]:
+    """表頭 -> {統一欄位: 欄位位置}；不是個股行情表時回傳 None"""
+    mapping = {}
+    for i, name in enumerate(header):
+        field = _HEADER_FIELDS.get(str(name).strip())
+        if field is not None and field not in mapping:
+            mapping[field] = i
+    required = {"code", "open", "high", "low", "close"}
+    return mapping if required <= mapping.keys() else None
+
+
+def _quote(row, mapping: dict, date: Optional[str], exchange: str) -> Optional[DailyQuote]:
+    def get(field):
+        i = mapping.get(field)
+        return row[i] if i is not None and i < len(row) else None
+
+    code = str(get("code") or "").strip().lstrip("=").strip('"').strip()
+    if not _CODE.fullmatch(code):
+        return None
+    if "date" in mapping:
+        date = convert_tw_date(get("date")) or date
+    close = _number(get("close"))
+    if date is None or np.isnan(close):
+        return None  # 當日無成交
+    volume = _number(get("volume"))
+    return DailyQuote(date, code, exchange, str(get("name") or "").strip(), _number(get("open")),
+                      _number(get("high")), _number(get("low")), close, 0.0 if np.isnan(volume) else volume)
+
+
+def _detect_exchange(text: str) -> str:
+    return "tpex" if any(marker in text for marker in ("上櫃", "櫃買", "aaData", "SecuritiesCompanyCode")) else "twse"
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    """UTF-8（含 BOM）或 Big5（證交所 CSV）"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    try:
+        # 只檢查開頭（最後一個字元可能被截斷）
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "cp950"
+    return open(path, encoding=encoding, errors="replace", newline="")
+
+
+def _parse_csv(f, date: Optional[str], exchange: Optional[str]) -> Iterator[DailyQuote]:
+    mapping = None
+    for row in csv.reader(f):
+        if not row:
+            continue
+        if mapping is None:
+            found = _mapping(row)
+            if found is not None:
+                mapping = found
+                continue
+            line = ",".join(row)
+            date = date or _roc_date_in(line)
+            exchange = exchange or ("tpex" if _detect_exchange(line) == "tpex" else None)
+            continue
+        quote = _quote(row, mapping, date, exchange or "twse")
+        if quote is not None:
+            yield quote
+
+
+def _json_tables(doc: dict) -> Iterator[tuple]:
+    """回傳 (表頭, 資料, 標題)"""
+    for table in doc.get("tables") or ():
+        yield table.get("fields") or (), table.get("data") or (), table.get("title") or ""
+    for key in doc:
+        match = re.fullmatch(r"fields(\d*)", key)
+        if match and f"data{match.group(1)}" in doc:
+            yield doc[key], doc[f"data{match.group(1)}"], doc.get(f"subtitle{match.group(1)}") or ""
+    if "aaData" in doc:
+        yield _TPEX_AADATA_COLUMNS, doc["aaData"], ""
+
+
+def _parse_json(doc, date: Optional[str], exchange: Optional[str]) -> Iterator[DailyQuote]:
+    if isinstance(doc, list):
+        # OpenAPI：每筆一個物件，各自帶有日期
+        exchange = exchange or (_detect_exchange(",".join(doc[0])) if doc else "twse")
+        for item in doc:
+            mapping = _mapping(item.keys())
+            if mapping is not None:
+                quote = _quote(list(item.values()), mapping, date, exchange)
+                if quote is not None:
+                    yield quote
+        return
+    date = (date or _western_date(doc.get("date")) or convert_tw_date(doc.get("reportDate") or "") or None)
+    if date is not None and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", date):
+        date = None
+    for header, data, title in _json_tables(doc):
+        mapping = _mapping(header)
+        if mapping is None:
+            continue
+        table_date = date or _roc_date_in(title)
+        table_exchange = exchange or _detect_exchange(",".join(doc) + title)
+        for row in data:
+            quote = _quote(row, mapping, table_date, table_exchange)
+            if quote is not None:
+                yield quote
+
+
+def parse_daily_quotes(path: str, date: Optional[str] = None, exchange: Optional[str] = None) -> Iterator[DailyQuote]:
+    """
+    逐筆讀取一個全市場每日收盤行情檔（CSV 逐行讀取，不載入整個檔案）
+    date 為西元 YYYY-MM-DD，未指定時由檔案內容（民國年標題、reportDate 等）取得；
+    exchange 未指定時依內容判斷（櫃買中心的格式為 tpex）
+    休市日、查無資料的檔案不回傳任何資料
+    """
+    with _open_text(path) as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first in ("{", "["):
+            # 交易所的 JSON 為單一文件（一天約 1MB），整份解析
+            yield from _parse_json(json.loads(first + f.read()), date, exchange)
+        else:
+            yield from _parse_csv(_prepend(first, f), date, exchange)
+
+
+def _prepend(first: str, f) -> Iterator[str]:
+    rest = f.readline()
+    yield first + rest
+    yield from f
+
+
+def update_symbol_master(quotes: Iterable[DailyQuote], path: str = USER_MASTER) -> int:
+    """
+    將股票主檔沒有的代號（含上市 / 上櫃別與名稱）加入 DATA_DIR/symbols.csv，回傳新增筆數
+    上櫃股票加入後才會以 .TWO 查詢（下次啟動時生效）
+    """
+    rows = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = {(row["market"], row["code"]): row for row in csv.DictReader(f)}
+    added = 0
+    for quote in quotes:
+        if ("tw", quote.code) in rows or resolver.lookup("tw", quote.code) is not None:
+            continue
+        rows[("tw", quote.code)] = {"code": quote.code, "market": "tw",
+                                    "exchange": "TPEx" if quote.exchange == "tpex" else "TWSE",
+                                    "name": quote.name, "name_en": "", "aliases": ""}
+        added += 1
+    if added:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["code", "market", "exchange", "name", "name_en", "aliases"],
+                                    extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows.values())
+        os.replace(tmp_path, path)
+    return added
+
+
+def ingest_daily_quotes(paths: Iterable[str], store=price_store, codes: Optional[Iterable[str]] = None,
+                        update_master: bool = False, index: Optional[SignalIndex] = None) -> dict:
+    """
+    匯入多個每日行情檔，依股票彙整後每檔只寫入一次（台股 .TW / 上櫃 .TWO，日線）
+    與本機既有資料合併，重疊的日期以交易所資料為準；回傳統計資訊
+    update_master 為 True 時一併將新代號加入使用者股票主檔
+    提供 index（篩選索引）時以新 K 棒增量更新各股票，最後存檔一次
+    """
+    started = time.time()
+    wanted = {c.upper() for c in codes} if codes is not None else None
+    rows = defaultdict(list)
+    files = 0
+    for path in paths:
+        files += 1
+        for quote in parse_daily_quotes(path):
+            if wanted is None or quote.code in wanted:
+                rows[quote.code + SUFFIXES[quote.exchange]].append(quote)
+
+    # 與 yfinance 台股日線相同：台北時間午夜；每個交易日只轉換一次
+    days = sorted({quote.date for quotes in rows.values() for quote in quotes})
+    day_index = dict(zip(days, pd.DatetimeIndex(days).tz_localize(TW_TZ)))
+    failed = {}
+    for symbol, quotes in rows.items():
+        values = np.array([quote[4:] for quote in quotes], dtype=np.float64)
+        df = pd.DataFrame(values, columns=["Open", "High", "Low", "Close", "Volume"])
+        df.insert(0, "Date", pd.DatetimeIndex([day_index[quote.date] for quote in quotes]))
+        try:
+            store.merge(symbol, df, "1d")
+        except Exception as e:
+            failed[symbol] = str(e)
+            continue
+        if index is not None:
+            index.on_bars(symbol, "1d", df)
+
+    if index is not None:
+        index.save()
+    added = update_symbol_master(quotes[-1] for quotes in rows.values()) if update_master else 0
+    written = len(rows) - len(failed)
+    metrics.inc("tw_daily_ingested_total", written, result="ok")
+    metrics.inc("tw_daily_ingested_total", len(failed), result="failed")
+    return {
+        "files": files,
+        "days": len(days),
+        "symbols": written,
+        "failed": failed,
+        "master_added": added,
+        "seconds": time.time() - started,
+    }
+
+
+def download_daily_quotes(exchange: str, date, directory: str = DAILY_DIR) -> Optional[str]:
+    """
+    下載一個交易日的全市場行情檔到 directory/{exchange}/YYYYMMDD.json，回傳檔案路徑
+    已下載過的日期不重新下載；週末直接跳過（回傳 None）
+    """
+    day = pd.Timestamp(date)
+    if day.weekday() >= 5:
+        return None
+    path = os.path.join(directory, exchange, f"{day:%Y%m%d}.json")
+    if os.path.exists(path):
+        return path
+    url = DOWNLOAD_URLS[exchange].format(date=f"{day:%Y%m%d}", roc_date=f"{day.year - 1911}/{day:%m/%d}")
+    gateway.throttle(f"{exchange}_daily")
+    metrics.inc("upstream_calls_total", source=f"{exchange}_daily")
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(request, timeout=30) as resp:
+        body = resp.read()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯入證交所 / 櫃買中心全市場每日收盤行情")
+    parser.add_argument("files", nargs="*", help="每日行情檔（CSV 或 JSON）")
+    parser.add_argument("--download", action="store_true", help="先下載 --start 到 --end 的每日行情檔")
+    parser.add_argument("--start", help="起始日期（西元，例如 2024-01-01）")
+    parser.add_argument("--end", help="結束日期（預設今天）")
+    parser.add_argument("--exchange", choices=list(DOWNLOAD_URLS), action="append", help="交易所（預設兩者）")
+    parser.add_argument("--codes", nargs="*", help="只匯入這些股票代號")
+    parser.add_argument("--update-master", action="store_true", help="將新代號與名稱加入 DATA_DIR/symbols.csv")
+    parser.add_argument("--no-index", action="store_true", help="不更新訊號篩選索引")
+    args = parser.parse_args()
+
+    files = list(args.files)
+    if args.download:
+        if not args.start:
+            parser.error("--download 需要 --start")
+        for day in pd.date_range(args.start, args.end or pd.Timestamp.now(tz=TW_TZ).date(), freq="D"):
+            for exchange in args.exchange or list(DOWNLOAD_URLS):
+                try:
+                    path = download_daily_quotes(exchange, day)
+                except Exception as e:
+                    print(f"下載 {exchange} {day:%Y-%m-%d} 失敗：{e}")
+                    continue
+                if path:
+                    files.append(path)
+    if not files:
+        parser.error("請指定行情檔或使用 --download")
+
+    summary = ingest_daily_quotes(files, codes=args.codes, update_master=args.update_master,
+                                  index=None if args.no_index else SignalIndex())
+    print(f"匯入 {summary['files']} 個檔案、{summary['days']} 個交易日、{summary['symbols']} 檔股票，"
+          f"耗時 {summary['seconds']:.1f} 秒")
+    if summary["master_added"]:
+        print(f"股票主檔新增 {summary['master_added']} 檔")
+    for symbol, error in summary["failed"].items():
+        print(f"  {symbol}：{error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import subprocess
+from typing import Iterator
 
-def call_chatglm(prompt: str, model: str = "EntropyYue/chatglm3") -> str:
+from config import LLM_MODEL
+from llm_client import LLMConnectError, get_client
+from metrics import metrics
+
+
+def _call_ollama_subprocess(prompt: str, model: str) -> str:
+    metrics.inc("upstream_calls_total", source="ollama_subprocess")
     proc = subprocess.Popen(
         ["ollama", "run", model],
         stdin=subprocess.PIPE,
@@ -11,4 +18,30 @@ def call_chatglm(prompt: str, model: str = "EntropyYue/chatglm3") -> str:
     out, err = proc.communicate(prompt)
     if proc.returncode != 0:
         raise RuntimeError(f"Ollama 執行失敗: {err}")
-    return out.strip()
\ No newline at end of file
+    return out.strip()
+
+
+def stream_chatglm(prompt: str, model: str = LLM_MODEL) -> Iterator[str]:
+    """
+    逐段產生模型回應；優先使用常駐的 Ollama HTTP 服務，
+    連不上服務時退回 `ollama run` 子程序（一次回傳全部內容）
+    已連上但等候回應逾時（服務忙碌）時直接拋出，不再以子程序重跑一次
+    """
+    with metrics.timer("call_duration_seconds", op="llm"):
+        started = False
+        try:
+            metrics.inc("upstream_calls_total", source="ollama_http")
+            for token in get_client().stream(prompt, model=model):
+                started = True
+                yield token
+            return
+        except LLMConnectError as e:
+            # 連線被拒、連線逾時、主機無法連線；已開始輸出時不再重試
+            if started:
+                raise
+            print(f"Ollama 服務無法連線，改用 ollama run：{e}")
+        yield _call_ollama_subprocess(prompt, model)
+
+
+def call_chatglm(prompt: str, model: str = LLM_MODEL) -> str:
+    return "".join(stream_chatglm(prompt, model=model)).strip()